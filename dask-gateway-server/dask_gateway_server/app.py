@@ -13,8 +13,19 @@ from tornado import web
 from tornado.log import LogFormatter
 from tornado.gen import IOLoop
 from tornado.platform.asyncio import AsyncIOMainLoop
-from tornado.httpclient import AsyncHTTPClient, HTTPRequest
-from traitlets import Unicode, Bool, Type, Bytes, Float, default, validate, List
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest, HTTPError
+from traitlets import (
+    CaselessStrEnum,
+    Unicode,
+    Bool,
+    Type,
+    Bytes,
+    Float,
+    Integer,
+    default,
+    validate,
+    List,
+)
 from traitlets.config import Application, catch_config_error
 
 from . import __version__ as VERSION
@@ -22,6 +33,8 @@ from . import handlers
 from .managers import ClusterManager
 from .auth import Authenticator
 from .objects import (
+    CLUSTER_POOL_USER,
+    Adaptive,
     DataManager,
     WorkerStatus,
     ClusterStatus,
@@ -30,7 +43,8 @@ from .objects import (
     is_in_memory_db,
 )
 from .proxy import SchedulerProxy, WebProxy
-from .utils import cleanup_tmpdir, cancel_task, TaskPool, get_ip
+from .tls import KeypairPool, KEY_TYPES
+from .utils import cleanup_tmpdir, cancel_task, TaskPool, LatencyStats, get_ip
 
 
 # Override default values for logging
@@ -244,6 +258,93 @@ class DaskGateway(Application):
         """,
     )
 
+    check_cluster_concurrency = Integer(
+        100,
+        help="""
+        Max number of clusters to check concurrently on gateway restart.
+
+        Limits the number of simultaneous connections made to cluster
+        schedulers when checking their status.
+        """,
+        min=1,
+        config=True,
+    )
+
+    check_clusters_in_background = Bool(
+        False,
+        help="""
+        If True, the gateway starts serving requests immediately on restart,
+        while active clusters are checked in the background.
+
+        Running clusters that haven't been checked yet are reported with
+        status ``STARTED``, and requests waiting on a cluster to start will
+        wait until its check completes.
+        """,
+        config=True,
+    )
+
+    scale_debounce = Float(
+        0.1,
+        min=0,
+        help="""
+        Time (in seconds) to wait for further scale requests for a cluster
+        before applying them.
+
+        Scale requests for a cluster are coalesced, so only the most recently
+        requested number of workers is applied. Waiting briefly lets rapid
+        requests (e.g. from a widget or autoscaler) be applied as a single
+        change.
+        """,
+        config=True,
+    )
+
+    adaptive_period = Float(
+        3,
+        min=0,
+        help="""
+        Time (in seconds) between adaptive scaling checks.
+
+        Each check gets the current load of every cluster with adaptive
+        scaling enabled from its scheduler, and scales the cluster if needed.
+        """,
+        config=True,
+    )
+
+    adaptive_target_duration = Float(
+        5,
+        min=0,
+        help="""
+        The desired time (in seconds) for a cluster's current workload to
+        complete.
+
+        Used by the scheduler to recommend a number of workers for adaptive
+        scaling. Smaller values scale up more aggressively.
+        """,
+        config=True,
+    )
+
+    adaptive_wait_count = Integer(
+        3,
+        min=1,
+        help="""
+        Number of consecutive adaptive scaling checks that must recommend
+        fewer workers before a cluster is scaled down.
+
+        Clusters are scaled up as soon as more workers are recommended.
+        """,
+        config=True,
+    )
+
+    adaptive_cooldown = Float(
+        30,
+        min=0,
+        help="""
+        Minimum time (in seconds) after adaptively scaling a cluster before it
+        can be adaptively scaled down.
+        """,
+        config=True,
+    )
+
     db_url = Unicode(
         "sqlite:///:memory:",
         help="""
@@ -293,6 +394,19 @@ class DaskGateway(Application):
         False, help="If True, all database operations will be logged", config=True
     )
 
+    db_lazy_load = Bool(
+        False,
+        help="""
+        If True, only active clusters are loaded from the database on startup.
+
+        Records of stopped/failed clusters are kept for
+        ``db_cluster_max_age``, and loading them all can make startup slow for
+        gateways with a long history. When enabled, these records are instead
+        loaded on demand (e.g. when a user lists their stopped clusters).
+        """,
+        config=True,
+    )
+
     db_cleanup_period = Float(
         600,
         help="""
@@ -316,6 +430,85 @@ class DaskGateway(Application):
         config=True,
     )
 
+    db_background_writes = Bool(
+        True,
+        help="""
+        If True, database writes are done in a background thread.
+
+        This keeps slow database commits off the event loop. In-memory state
+        is still updated immediately, and any writes needed for recovery
+        (e.g. backend state during cluster/worker startup) are waited on
+        before proceeding.
+        """,
+        config=True,
+    )
+
+    db_write_batch_interval = Float(
+        0,
+        help="""
+        Max time (in seconds) to wait when batching database writes.
+
+        When ``db_background_writes`` is enabled, worker and cluster inserts
+        and updates are coalesced into batches, each committed in a single
+        transaction. If 0 (default), a batch holds all writes made in a single
+        event loop iteration. Larger values trade increased write latency for
+        fewer transactions.
+        """,
+        min=0,
+        config=True,
+    )
+
+    tls_key_type = CaselessStrEnum(
+        KEY_TYPES,
+        default_value="rsa-2048",
+        help="""
+        The key algorithm to use for per-cluster TLS credentials.
+
+        Valid options are:
+
+        - ``rsa-2048``: RSA with a 2048 bit key. Supported everywhere.
+        - ``ecdsa-p256``: ECDSA on the NIST P-256 curve. Much faster to
+          generate and handshake with than RSA.
+        - ``ed25519``: Ed25519 keys. Fastest, but requires OpenSSL >= 1.1.1
+          for the gateway, schedulers, workers, and clients.
+
+        Note that some backends reuse these credentials outside of dask (e.g.
+        the YARN application master), and may only support ``rsa-2048``.
+        """,
+        config=True,
+    )
+
+    tls_cert_validity_days = Float(
+        365,
+        min=1,
+        help="""
+        The number of days the per-cluster TLS certificates are valid for.
+        """,
+        config=True,
+    )
+
+    tls_keypair_pool_size = Integer(
+        10,
+        min=0,
+        help="""
+        Number of pre-generated TLS keypairs to keep ready for new clusters.
+
+        Generating credentials for a new cluster is expensive. Keeping a pool
+        of keypairs (refilled in the background) keeps this work out of the
+        request path. Set to 0 to always generate credentials on demand.
+        """,
+        config=True,
+    )
+
+    tls_keypair_pool_workers = Integer(
+        1,
+        min=1,
+        help="""
+        Max number of threads to use for refilling the TLS keypair pool.
+        """,
+        config=True,
+    )
+
     temp_dir = Unicode(
         help="""
         Path to a directory to use to store temporary runtime files.
@@ -436,13 +629,31 @@ class DaskGateway(Application):
             temp_dir=self.temp_dir,
             api_url=self.api_url,
         )
+        self.cluster_claim_latency = LatencyStats()
+        self.cluster_cold_start_latency = LatencyStats()
+        # Clusters with adaptive scaling enabled, and the task scaling them
+        self.adaptive_clusters = {}
+        self.adaptive_task = None
 
     def init_authenticator(self):
         self.authenticator = self.authenticator_class(parent=self, log=self.log)
 
     def init_database(self):
+        self.keypair_pool = KeypairPool(
+            size=self.tls_keypair_pool_size,
+            workers=self.tls_keypair_pool_workers,
+            key_type=self.tls_key_type,
+            validity_days=self.tls_cert_validity_days,
+            log=self.log,
+        )
         self.db = DataManager(
-            url=self.db_url, echo=self.db_debug, encrypt_keys=self.db_encrypt_keys
+            url=self.db_url,
+            echo=self.db_debug,
+            encrypt_keys=self.db_encrypt_keys,
+            keypair_pool=self.keypair_pool,
+            background_writes=self.db_background_writes,
+            write_batch_interval=self.db_write_batch_interval,
+            log=self.log,
         )
 
     def init_tornado_application(self):
@@ -458,10 +669,17 @@ class DaskGateway(Application):
 
     async def start_async(self):
         self.init_signal()
+        self.start_keypair_pool()
         await self.start_scheduler_proxy()
         await self.start_web_proxy()
         await self.load_database_state()
         await self.start_tornado_application()
+        # Pooled clusters register with the api, so start after the server
+        if self.cluster_manager.cluster_pool_size:
+            self.start_cluster_pool()
+
+    def start_keypair_pool(self):
+        self.task_pool.create_background_task(self.keypair_pool.run())
 
     async def start_scheduler_proxy(self):
         await self.scheduler_proxy.start()
@@ -470,7 +688,7 @@ class DaskGateway(Application):
         await self.web_proxy.start()
 
     async def load_database_state(self):
-        self.db.load_database_state()
+        self.db.load_database_state(active_only=self.db_lazy_load)
 
         active_clusters = list(self.db.active_clusters())
         if active_clusters:
@@ -480,29 +698,148 @@ class DaskGateway(Application):
                 len(active_clusters),
             )
 
-            tasks = (self.check_cluster(c) for c in active_clusters)
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+            tasks = self.check_clusters(active_clusters)
+            if self.check_clusters_in_background:
+                for c, t in zip(active_clusters, tasks):
+                    # Requests waiting on startup will wait for the check. The
+                    # shield prevents `stop_cluster` cancelling the check.
+                    c._start_future = asyncio.shield(t)
+            else:
+                await asyncio.gather(*tasks)
 
-            n_clusters = 0
-            for c, r in zip(active_clusters, results):
-                if isinstance(r, Exception):
-                    self.log.error(
-                        "Error while checking status of cluster %d", c, exc_info=r
-                    )
-                elif r:
-                    n_clusters += 1
+        self.task_pool.create_background_task(self.cleanup_database())
+        if self.cluster_manager.orphan_cleanup_period:
+            self.task_pool.create_background_task(self.cleanup_orphans())
 
-            self.log.info(
-                "All clusters have been checked, there are %d active clusters",
-                n_clusters,
+    def start_cluster_pool(self):
+        if not self.cluster_manager.supports_cluster_pool:
+            self.log.warning(
+                "%s doesn't support a cluster pool, ignoring cluster_pool_size",
+                type(self.cluster_manager).__name__,
             )
+            return
+        # Clusters in the pool are owned by a reserved user until claimed. Any
+        # pooled clusters left running by a previous gateway are reused.
+        self.cluster_pool_user = self.db.get_or_create_user(CLUSTER_POOL_USER)
+        self.cluster_pool_wakeup = asyncio.Event()
+        self.task_pool.create_background_task(self.maintain_cluster_pool())
+
+    async def maintain_cluster_pool(self):
+        """Keep ``cluster_pool_size`` unclaimed clusters started"""
+        manager = self.cluster_manager
+        user = self.cluster_pool_user
+        while True:
+            now = timestamp()
+            ttl = int(manager.cluster_pool_idle_timeout * 1000)
+            cutoff = now - ttl
+            pooled = []
+            for c in list(user.clusters.values()):
+                if not c.is_active():
+                    # Stopped clusters are removed by the database cleanup
+                    continue
+                elif (
+                    ttl and c.status == ClusterStatus.RUNNING and c.start_time < cutoff
+                ):
+                    self.log.debug("Replacing idle pooled cluster %s", c.name)
+                    # Mark as stopping now, so the cluster can't be claimed
+                    self.db.update_cluster(c, status=ClusterStatus.STOPPING)
+                    self.schedule_stop_cluster(c)
+                else:
+                    pooled.append(c)
+
+            n_start = manager.cluster_pool_size - len(pooled)
+            if n_start > 0:
+                self.log.debug("Starting %d clusters for the cluster pool", n_start)
+                pooled.extend(self.start_new_cluster(user) for _ in range(n_start))
+
+            # Sleep until the next pooled cluster expires or a cluster is
+            # claimed, checking at least every 10 seconds for failed starts
+            timeout = 10
+            if ttl:
+                for c in pooled:
+                    if c.status == ClusterStatus.RUNNING:
+                        expires = (c.start_time + ttl - now) / 1000
+                        timeout = max(min(timeout, expires), 0)
+            self.cluster_pool_wakeup.clear()
+            try:
+                await asyncio.wait_for(self.cluster_pool_wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
 
-        self.task_pool.create_background_task(self.cleanup_database())
+    def claim_pooled_cluster(self, user):
+        """Assign a running cluster from the pool to ``user``.
+
+        Returns the cluster, or None if no pooled clusters are ready.
+        """
+        pool_user = getattr(self, "cluster_pool_user", None)
+        if pool_user is None or user is pool_user:
+            return None
+        start = IOLoop.current().time()
+        for cluster in pool_user.clusters.values():
+            # Only claim clusters that have finished starting successfully
+            f = cluster._start_future
+            if cluster.status == ClusterStatus.RUNNING and f.done():
+                if not f.cancelled() and f.exception() is None and f.result():
+                    break
+        else:
+            return None
+        self.db.assign_cluster(cluster, user)
+        self.cluster_pool_wakeup.set()
+        self.cluster_claim_latency.add(IOLoop.current().time() - start)
+        self.log.info("Assigned pooled cluster %s to user %s", cluster.name, user.name)
+        return cluster
+
+    def check_clusters(self, clusters):
+        """Check the status of clusters after a restart.
+
+        At most ``check_cluster_concurrency`` clusters are checked at a time,
+        with progress logged after each batch.
+
+        Returns a list of tasks, one per cluster, each resulting in True if
+        the cluster is still active.
+        """
+        semaphore = asyncio.Semaphore(self.check_cluster_concurrency)
+        batch_size = self.check_cluster_concurrency
+        n_total = len(clusters)
+        n_checked = n_active = 0
+
+        async def check(cluster):
+            nonlocal n_checked, n_active
+            async with semaphore:
+                try:
+                    # Cluster may have been stopped while waiting
+                    active = cluster.is_active() and await self.check_cluster(cluster)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as exc:
+                    self.log.error(
+                        "Error while checking status of cluster %s",
+                        cluster.name,
+                        exc_info=exc,
+                    )
+                    active = False
+            n_checked += 1
+            n_active += active
+            if n_checked == n_total:
+                self.log.info(
+                    "All clusters have been checked, there are %d active clusters",
+                    n_active,
+                )
+            elif n_checked % batch_size == 0:
+                self.log.info(
+                    "Checked %d/%d clusters, %d active so far",
+                    n_checked,
+                    n_total,
+                    n_active,
+                )
+            return active
+
+        return [self.task_pool.create_task(check(c)) for c in clusters]
 
     async def cleanup_database(self):
         while True:
             try:
-                n = self.db.cleanup_expired(self.db_cluster_max_age)
+                n = await self.db.cleanup_expired(self.db_cluster_max_age)
             except Exception as exc:
                 self.log.error(
                     "Error while cleaning expired database records", exc_info=exc
@@ -511,18 +848,133 @@ class DaskGateway(Application):
                 self.log.debug("Removed %d expired clusters from the database", n)
             await asyncio.sleep(self.db_cleanup_period)
 
+    async def cleanup_orphans(self):
+        while True:
+            await asyncio.sleep(self.cluster_manager.orphan_cleanup_period)
+            # Clusters that are stopping are still cleaning up their resources
+            active = {
+                c.name
+                for u in self.db.username_to_user.values()
+                for c in u.clusters.values()
+                if c.status < ClusterStatus.STOPPED
+            }
+            try:
+                n = await self.cluster_manager.cleanup_orphans(active)
+            except Exception as exc:
+                self.log.error(
+                    "Error while cleaning up orphaned resources", exc_info=exc
+                )
+            else:
+                self.log.debug("Removed %d orphaned resources", n)
+
+    async def adaptive_scaling(self):
+        """Periodically scale all clusters with adaptive scaling enabled"""
+        while self.adaptive_clusters:
+            await asyncio.sleep(self.adaptive_period)
+            clusters = [
+                c
+                for c in self.adaptive_clusters.values()
+                if c.status == ClusterStatus.RUNNING
+            ]
+            results = await asyncio.gather(
+                *(self.adapt(c) for c in clusters), return_exceptions=True
+            )
+            # Failures are logged per cluster, so one bad cluster doesn't stop
+            # adaptive scaling for the others
+            for c, res in zip(clusters, results):
+                if isinstance(res, Exception):
+                    self.log.warning(
+                        "Failed to adaptively scale cluster %s", c.name, exc_info=res
+                    )
+
+    async def adapt(self, cluster):
+        """Scale a cluster based on its current load"""
+        adaptive = cluster.adaptive
+        try:
+            load = await self.get_cluster_load(cluster)
+        except Exception as exc:
+            if isinstance(exc, HTTPError) and exc.code == 404:
+                self.log.warning(
+                    "Cluster %s doesn't support adaptive scaling, disabling",
+                    cluster.name,
+                )
+                self.adapt_cluster(cluster, active=False)
+            else:
+                self.log.warning(
+                    "Failed to get load for cluster %s", cluster.name, exc_info=exc
+                )
+            return
+
+        if cluster.adaptive is not adaptive or cluster.status != ClusterStatus.RUNNING:
+            # Adaptive scaling changed while the load was being fetched
+            return
+
+        current = len(cluster.active_workers)
+        target = adaptive.clamp(load["target"])
+        now = IOLoop.current().time()
+        if target < current:
+            # Only scale down if consistently recommended, and not too soon
+            # after a previous scaling
+            adaptive.scale_down_count += 1
+            if adaptive.scale_down_count < self.adaptive_wait_count or (
+                adaptive.last_scaled is not None
+                and now - adaptive.last_scaled < self.adaptive_cooldown
+            ):
+                return
+        adaptive.scale_down_count = 0
+        if target == current:
+            return
+
+        self.log.debug(
+            "Adaptively scaling cluster %s from %d to %d workers "
+            "[tasks: %d, occupancy: %.1f, memory: %d]",
+            cluster.name,
+            current,
+            target,
+            load["tasks"],
+            load["occupancy"],
+            load["memory"],
+        )
+        adaptive.last_scaled = now
+        await self.scale(cluster, target)
+
+    def adapt_cluster(self, cluster, minimum=0, maximum=None, active=True):
+        """Enable or disable adaptive scaling for a cluster.
+
+        If enabled, the cluster is immediately scaled to within ``minimum``
+        and ``maximum`` workers.
+        """
+        if not active:
+            cluster.adaptive = None
+            self.adaptive_clusters.pop(cluster.name, None)
+            return
+
+        self.log.debug(
+            "Enabling adaptive scaling for cluster %s [minimum: %d, maximum: %s]",
+            cluster.name,
+            minimum,
+            maximum,
+        )
+        cluster.adaptive = Adaptive(minimum=minimum, maximum=maximum)
+        self.adaptive_clusters[cluster.name] = cluster
+        if self.adaptive_task is None or self.adaptive_task.done():
+            self.adaptive_task = self.task_pool.create_background_task(
+                self.adaptive_scaling()
+            )
+
+        current = len(cluster.active_workers)
+        target = cluster.adaptive.clamp(current)
+        if target != current:
+            cluster.adaptive.last_scaled = IOLoop.current().time()
+            self.task_pool.create_task(self.scale(cluster, target))
+
     async def check_cluster(self, cluster):
         if cluster.status == ClusterStatus.RUNNING:
-            client = AsyncHTTPClient()
-            url = "%s/api/status" % cluster.api_address
-            req = HTTPRequest(
-                url, method="GET", headers={"Authorization": "token %s" % cluster.token}
-            )
             try:
-                resp = await asyncio.wait_for(
-                    client.fetch(req), timeout=self.check_cluster_timeout
+                workers = await asyncio.wait_for(
+                    self.get_cluster_workers(cluster),
+                    timeout=self.check_cluster_timeout,
                 )
-                workers = json.loads(resp.body.decode("utf8", "replace"))["workers"]
                 running = True
             except asyncio.CancelledError:
                 raise
@@ -534,9 +986,18 @@ class DaskGateway(Application):
             running = False
             workers = []
 
+        if not cluster.is_active():
+            # Cluster was stopped during the check, nothing left to do
+            return False
+
         if running:
             # Cluster is running, update our state to match
             await self.add_cluster_to_proxies(cluster)
+            if not cluster.is_active():
+                # Stopped while the routes were being added, make sure they're
+                # not left behind
+                await self.remove_cluster_from_proxies(cluster)
+                return False
 
             # Update our set of workers to match
             actual_workers = set(workers)
@@ -555,6 +1016,42 @@ class DaskGateway(Application):
 
         return running
 
+    async def get_cluster_workers(self, cluster):
+        """Get the names of all workers currently connected to a cluster"""
+
+        async def fetch(path):
+            req = HTTPRequest(
+                cluster.api_address + path,
+                method="GET",
+                headers={"Authorization": "token %s" % cluster.token},
+            )
+            resp = await AsyncHTTPClient().fetch(req)
+            return json.loads(resp.body.decode("utf8", "replace"))
+
+        # Only called once per cluster on restart, so there's no previous
+        # version to request changes since, always get the full listing
+        try:
+            msg = await fetch("/api/workers")
+        except HTTPError as exc:
+            if exc.code != 404:
+                raise
+            # Scheduler predates the `/api/workers` endpoint
+            msg = await fetch("/api/status")
+            return msg["workers"]
+        return [w["name"] for w in msg["workers"] if w["status"] != "closed"]
+
+    async def get_cluster_load(self, cluster):
+        """Get the current load on a cluster, for adaptive scaling"""
+        url = "%s/api/adaptive?target_duration=%s" % (
+            cluster.api_address,
+            self.adaptive_target_duration,
+        )
+        req = HTTPRequest(
+            url, method="GET", headers={"Authorization": "token %s" % cluster.token}
+        )
+        resp = await AsyncHTTPClient().fetch(req)
+        return json.loads(resp.body.decode("utf8", "replace"))
+
     async def start_tornado_application(self):
         private_url = urlparse(self.private_url)
         self.http_server = self.tornado_application.listen(
@@ -621,9 +1118,33 @@ class DaskGateway(Application):
         else:
             self.log.info("Leaving any active clusters running")
 
+        if hasattr(self, "cluster_manager"):
+            try:
+                await self.cluster_manager.close()
+            except Exception as exc:
+                self.log.error("Failed to close cluster manager", exc_info=exc)
+
         if hasattr(self, "task_pool"):
             await self.task_pool.close(timeout=timeout)
 
+        if hasattr(self, "keypair_pool"):
+            self.log.debug(
+                "TLS keypair pool had %d hits and %d misses",
+                self.keypair_pool.hits,
+                self.keypair_pool.misses,
+            )
+
+        if hasattr(self, "cluster_pool_user"):
+            self.log.info(
+                "Cluster pool claims: %r, cold starts: %r",
+                self.cluster_claim_latency,
+                self.cluster_cold_start_latency,
+            )
+
+        # Wait for any pending database writes
+        if hasattr(self, "db"):
+            await self.db.close()
+
         # Shutdown the proxies
         if hasattr(self, "scheduler_proxy"):
             self.scheduler_proxy.stop()
@@ -645,10 +1166,10 @@ class DaskGateway(Application):
         # Walk through the startup process, saving state as updates occur
         async for state in self.cluster_manager.start_cluster(cluster.info):
             self.log.debug("State update for cluster %s", cluster.name)
-            self.db.update_cluster(cluster, state=state)
+            await self.db.update_cluster(cluster, state=state)
 
         # Move cluster to started
-        self.db.update_cluster(cluster, status=ClusterStatus.STARTED)
+        await self.db.update_cluster(cluster, status=ClusterStatus.STARTED)
 
     async def start_cluster(self, cluster):
         """Start the cluster.
@@ -718,17 +1239,33 @@ class DaskGateway(Application):
             "/" + cluster.name, cluster.scheduler_address
         )
 
+    async def remove_cluster_from_proxies(self, cluster):
+        await self.web_proxy.delete_route("/gateway/clusters/" + cluster.name)
+        await self.scheduler_proxy.delete_route("/" + cluster.name)
+
     def start_new_cluster(self, user):
+        cluster = self.claim_pooled_cluster(user)
+        if cluster is not None:
+            return cluster
         cluster = self.db.create_cluster(user)
         f = self.task_pool.create_task(self.start_cluster(cluster))
-        f.add_done_callback(partial(self._monitor_start_cluster, cluster=cluster))
+        f.add_done_callback(
+            partial(
+                self._monitor_start_cluster,
+                cluster=cluster,
+                start=IOLoop.current().time(),
+            )
+        )
         cluster._start_future = f
         return cluster
 
-    def _monitor_start_cluster(self, future, cluster=None):
+    def _monitor_start_cluster(self, future, cluster=None, start=None):
         try:
             if future.result():
-                # Startup succeeded, nothing to do
+                # Startup succeeded, record the latency of user requests
+                if cluster.user.name != CLUSTER_POOL_USER:
+                    latency = IOLoop.current().time() - start
+                    self.cluster_cold_start_latency.add(latency)
                 return
         except asyncio.CancelledError:
             # Startup cancelled, cleanup is handled separately
@@ -748,22 +1285,36 @@ class DaskGateway(Application):
 
         # Move cluster to stopping
         self.db.update_cluster(cluster, status=ClusterStatus.STOPPING)
+        self.adapt_cluster(cluster, active=False)
 
         # Remove routes from proxies if already set
-        await self.web_proxy.delete_route("/gateway/clusters/" + cluster.name)
-        await self.scheduler_proxy.delete_route("/" + cluster.name)
+        await self.remove_cluster_from_proxies(cluster)
 
-        # Shutdown individual workers if no bulk shutdown supported
+        # Shutdown workers if no bulk shutdown supported
+        workers = list(cluster.active_workers)
         if not self.cluster_manager.supports_bulk_shutdown:
-            tasks = (self.stop_worker(cluster, w) for w in cluster.active_workers)
-            await asyncio.gather(*tasks, return_exceptions=True)
+            if len(workers) > 1 and self.cluster_manager.supports_bulk_stop:
+                await self.stop_workers(cluster, workers)
+            else:
+                tasks = (self.stop_worker(cluster, w) for w in workers)
+                await asyncio.gather(*tasks, return_exceptions=True)
+        else:
+            # Workers are stopped along with the cluster, but any pending
+            # starts need to be cancelled first
+            await asyncio.gather(*(cancel_task(w._start_future) for w in workers))
 
         # Shutdown the cluster
         await self.cluster_manager.stop_cluster(cluster.info, cluster.state)
 
         # Update the cluster status
         status = ClusterStatus.FAILED if failed else ClusterStatus.STOPPED
-        self.db.update_cluster(cluster, status=status, stop_time=timestamp())
+        stop_time = timestamp()
+        if self.cluster_manager.supports_bulk_shutdown:
+            for w in workers:
+                self.db.update_worker(
+                    w, status=WorkerStatus.STOPPED, stop_time=stop_time
+                )
+        self.db.update_cluster(cluster, status=status, stop_time=stop_time)
         cluster.pending.clear()
 
         self.log.debug("Cluster %s stopped", cluster.name)
@@ -772,46 +1323,133 @@ class DaskGateway(Application):
         self.task_pool.create_task(self.stop_cluster(cluster, failed=failed))
 
     async def scale(self, cluster, total):
-        """Scale cluster to total workers"""
-        async with cluster.lock:
+        """Scale cluster to total workers.
+
+        Scale requests are coalesced per cluster, only the most recently
+        requested total is applied. Returns once this or a later request has
+        been applied.
+        """
+        cluster.scale_target = total
+        if cluster._scale_future is None or cluster._scale_future.done():
+            cluster._scale_future = self.task_pool.create_task(self._scale(cluster))
+        await asyncio.shield(cluster._scale_future)
+
+    async def _scale(self, cluster):
+        while cluster.scale_target is not None:
+            if self.scale_debounce:
+                # Wait for any following requests
+                await asyncio.sleep(self.scale_debounce)
+            total = cluster.scale_target
+            cluster.scale_target = None
+            if cluster.status != ClusterStatus.RUNNING:
+                return
             delta = total - len(cluster.active_workers)
             if delta == 0:
-                return
+                continue
             self.log.debug(
                 "Scaling cluster %s to %d workers, a delta of %d",
                 cluster.name,
                 total,
                 delta,
             )
-            if delta > 0:
-                await self.scale_up(cluster, delta)
-            else:
-                await self.scale_down(cluster, -delta)
+            try:
+                if delta > 0:
+                    await self.scale_up(cluster, delta)
+                else:
+                    await self.scale_down(cluster, -delta)
+            except Exception as exc:
+                if cluster.scale_target is None:
+                    raise
+                # Superseded by a later request, which may still succeed
+                self.log.warning(
+                    "Failed to scale cluster %s to %d workers",
+                    cluster.name,
+                    total,
+                    exc_info=exc,
+                )
 
     async def scale_up(self, cluster, n_start):
-        for _ in range(n_start):
-            w = self.db.create_worker(cluster)
-            w._start_future = self.task_pool.create_task(self.start_worker(cluster, w))
+        workers = [self.db.create_worker(cluster) for _ in range(n_start)]
+        if n_start > 1 and self.cluster_manager.supports_bulk_start:
+            bulk = self.task_pool.create_task(self.start_workers(cluster, workers))
+        else:
+            bulk = None
+        for w in workers:
+            w._start_future = self.task_pool.create_task(
+                self.start_worker(cluster, w, bulk=bulk)
+            )
             w._start_future.add_done_callback(
                 partial(self._monitor_start_worker, worker=w, cluster=cluster)
             )
 
-    async def _start_worker(self, cluster, worker):
-        self.log.debug("Starting worker %r for cluster %r", worker.name, cluster.name)
-
-        # Walk through the startup process, saving state as updates occur
-        async for state in self.cluster_manager.start_worker(
-            worker.name, cluster.info, cluster.state
+    async def _start_workers(self, cluster, workers, results):
+        by_name = {w.name: w for w in workers}
+        async for states in self.cluster_manager.start_workers(
+            list(by_name), cluster.info, cluster.state
         ):
-            self.db.update_worker(worker, state=state)
+            writes = []
+            for name, state in states.items():
+                worker = by_name[name]
+                if isinstance(state, Exception):
+                    results[name] = state
+                elif worker.status >= WorkerStatus.STOPPING:
+                    # Worker was stopped while starting, stop it again now
+                    # that we have the latest state
+                    self.task_pool.create_task(
+                        self.cluster_manager.stop_worker(
+                            name, state, cluster.info, cluster.state
+                        )
+                    )
+                else:
+                    writes.append(self.db.update_worker(worker, state=state))
+            await asyncio.gather(*writes)
+
+    async def start_workers(self, cluster, workers):
+        """Start many workers with a single call to
+        ``cluster_manager.start_workers``.
+
+        Returns a dict mapping the names of any failed workers to their
+        corresponding exception.
+        """
+        self.log.debug("Starting %d workers for cluster %r", len(workers), cluster.name)
+        results = {}
+        try:
+            await asyncio.wait_for(
+                self._start_workers(cluster, workers, results),
+                timeout=self.cluster_manager.worker_start_timeout,
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            for w in workers:
+                results.setdefault(w.name, exc)
+        return results
+
+    async def _start_worker(self, cluster, worker, bulk=None):
+        if bulk is not None:
+            # Worker is started as part of a batch, wait for it to complete
+            results = await asyncio.shield(bulk)
+            exc = results.get(worker.name)
+            if exc is not None:
+                raise exc
+        else:
+            self.log.debug(
+                "Starting worker %r for cluster %r", worker.name, cluster.name
+            )
+
+            # Walk through the startup process, saving state as updates occur
+            async for state in self.cluster_manager.start_worker(
+                worker.name, cluster.info, cluster.state
+            ):
+                await self.db.update_worker(worker, state=state)
 
         # Move worker to started
-        self.db.update_worker(worker, status=WorkerStatus.STARTED)
+        await self.db.update_worker(worker, status=WorkerStatus.STARTED)
 
-    async def start_worker(self, cluster, worker):
+    async def start_worker(self, cluster, worker, bulk=None):
         try:
             await asyncio.wait_for(
-                self._start_worker(cluster, worker),
+                self._start_worker(cluster, worker, bulk=bulk),
                 timeout=self.cluster_manager.worker_start_timeout,
             )
         except asyncio.TimeoutError:
@@ -890,7 +1528,12 @@ class DaskGateway(Application):
                 worker.name, worker.state, cluster.info, cluster.state
             )
         except Exception as exc:
-            self.log.error("Failed to shutdown worker %s for cluster %s", exc_info=exc)
+            self.log.error(
+                "Failed to shutdown worker %s for cluster %s",
+                worker.name,
+                cluster.name,
+                exc_info=exc,
+            )
 
         # Update the worker status
         status = WorkerStatus.FAILED if failed else WorkerStatus.STOPPED
@@ -901,6 +1544,51 @@ class DaskGateway(Application):
     def schedule_stop_worker(self, cluster, worker, failed=False):
         self.task_pool.create_task(self.stop_worker(cluster, worker, failed=failed))
 
+    async def stop_workers(self, cluster, workers, failed=False):
+        """Stop many workers with a single call to
+        ``cluster_manager.stop_workers``."""
+        self.log.debug("Stopping %d workers for cluster %s", len(workers), cluster.name)
+
+        # Cancel any pending starts
+        await asyncio.gather(*(cancel_task(w._start_future) for w in workers))
+
+        # Move workers to stopping
+        for w in workers:
+            self.db.update_worker(w, status=WorkerStatus.STOPPING)
+            cluster.pending.discard(w.name)
+
+        # Shutdown the workers
+        try:
+            errors = await self.cluster_manager.stop_workers(
+                {w.name: w.state for w in workers}, cluster.info, cluster.state
+            )
+        except Exception as exc:
+            errors = {w.name: exc for w in workers}
+        for name, exc in errors.items():
+            self.log.error(
+                "Failed to shutdown worker %s for cluster %s",
+                name,
+                cluster.name,
+                exc_info=exc,
+            )
+
+        # Update the worker statuses
+        status = WorkerStatus.FAILED if failed else WorkerStatus.STOPPED
+        stop_time = timestamp()
+        for w in workers:
+            self.db.update_worker(w, status=status, stop_time=stop_time)
+
+        self.log.debug("%d workers stopped for cluster %s", len(workers), cluster.name)
+
+    def schedule_stop_workers(self, cluster, workers, failed=False):
+        if len(workers) > 1 and self.cluster_manager.supports_bulk_stop:
+            self.task_pool.create_task(
+                self.stop_workers(cluster, workers, failed=failed)
+            )
+        else:
+            for w in workers:
+                self.schedule_stop_worker(cluster, w, failed=failed)
+
     def maybe_fail_worker(self, cluster, worker):
         # Ignore if cluster or worker isn't active (
         if (
@@ -922,8 +1610,7 @@ class DaskGateway(Application):
             self.log.debug(
                 "Stopping %d pending workers for cluster %s", len(to_stop), cluster.name
             )
-            for w in to_stop:
-                self.schedule_stop_worker(cluster, w)
+            self.schedule_stop_workers(cluster, to_stop)
             n_stop -= len(to_stop)
 
         if n_stop:
@@ -947,8 +1634,7 @@ class DaskGateway(Application):
             self.log.debug(
                 "Stopping %d running workers for cluster %s", len(to_stop), cluster.name
             )
-            for w in to_stop:
-                self.schedule_stop_worker(cluster, w)
+            self.schedule_stop_workers(cluster, to_stop)
 
 
 main = DaskGateway.launch_instance
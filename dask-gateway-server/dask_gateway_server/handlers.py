@@ -7,7 +7,7 @@ from urllib.parse import urlparse, unquote
 from tornado import web
 from tornado.log import app_log
 
-from .objects import ClusterStatus
+from .objects import CLUSTER_POOL_USER, ClusterStatus
 
 
 DASK_GATEWAY_COOKIE = "dask-gateway"
@@ -105,6 +105,9 @@ class BaseHandler(web.RequestHandler):
         username = self.authenticator.authenticate(self)
         if isawaitable(username):
             username = await username
+        if username == CLUSTER_POOL_USER:
+            # Reserved for unclaimed clusters in the cluster pool
+            raise web.HTTPError(403)
         user = self.gateway.db.get_or_create_user(username)
         self.set_secure_cookie(
             DASK_GATEWAY_COOKIE, user.cookie, expires_days=self.cookie_max_age_days
@@ -115,7 +118,11 @@ class BaseHandler(web.RequestHandler):
 
 
 def cluster_model(gateway, cluster, full=True):
-    if cluster.status == ClusterStatus.RUNNING:
+    status = cluster.status
+    if status == ClusterStatus.RUNNING and not cluster._start_future.done():
+        # Cluster is still being checked after a restart
+        status = ClusterStatus.STARTED
+    if status == ClusterStatus.RUNNING:
         scheduler = "gateway://%s/%s" % (
             urlparse(gateway.gateway_url).netloc,
             cluster.name,
@@ -129,12 +136,12 @@ def cluster_model(gateway, cluster, full=True):
         "name": cluster.name,
         "scheduler_address": scheduler,
         "dashboard_route": dashboard,
-        "status": cluster.status.name,
+        "status": status.name,
         "start_time": cluster.start_time,
         "stop_time": cluster.stop_time,
     }
     if full:
-        if cluster.status == ClusterStatus.RUNNING:
+        if status == ClusterStatus.RUNNING:
             tls_cert = cluster.tls_cert.decode()
             tls_key = cluster.tls_key.decode()
         else:
@@ -170,6 +177,8 @@ class ClustersHandler(BaseHandler):
                 except Exception as exc:
                     raise web.HTTPError(405, reason=str(exc))
                 select = lambda x: x.status in statuses
+                if any(s >= ClusterStatus.STOPPING for s in statuses):
+                    await self.gateway.db.load_user_history(self.dask_user)
             out = {
                 k: cluster_model(self.gateway, v, full=False)
                 for k, v in self.dask_user.clusters.items()
@@ -178,7 +187,7 @@ class ClustersHandler(BaseHandler):
             self.write(out)
             return
 
-        cluster = self.dask_user.clusters.get(cluster_name)
+        cluster = await self.gateway.db.get_cluster(self.dask_user, cluster_name)
         if cluster is None:
             raise web.HTTPError(404, reason="Cluster %s does not exist" % cluster_name)
 
@@ -241,7 +250,7 @@ class ClusterRegistrationHandler(BaseHandler):
 class ClusterScaleHandler(BaseHandler):
     @user_authenticated
     async def put(self, cluster_name):
-        cluster = self.dask_user.clusters.get(cluster_name)
+        cluster = await self.gateway.db.get_cluster(self.dask_user, cluster_name)
         if cluster is None:
             raise web.HTTPError(404, reason="Cluster %s does not exist" % cluster_name)
         elif cluster.status != ClusterStatus.RUNNING:
@@ -256,9 +265,44 @@ class ClusterScaleHandler(BaseHandler):
             total = self.json_data["worker_count"]
         except (TypeError, KeyError):
             raise web.HTTPError(405)
+        # Manually scaling disables adaptive scaling
+        self.gateway.adapt_cluster(cluster, active=False)
         await self.gateway.scale(cluster, total)
 
 
+class ClusterAdaptHandler(BaseHandler):
+    @user_authenticated
+    async def put(self, cluster_name):
+        cluster = await self.gateway.db.get_cluster(self.dask_user, cluster_name)
+        if cluster is None:
+            raise web.HTTPError(404, reason="Cluster %s does not exist" % cluster_name)
+        elif cluster.status != ClusterStatus.RUNNING:
+            raise web.HTTPError(
+                409,
+                reason=(
+                    "Cluster %s has status=%s, must be RUNNING to adapt"
+                    % (cluster_name, cluster.status.name)
+                ),
+            )
+        try:
+            minimum = self.json_data.get("minimum") or 0
+            maximum = self.json_data.get("maximum")
+            active = self.json_data.get("active", True)
+        except AttributeError:
+            raise web.HTTPError(405)
+        if not (
+            isinstance(minimum, int)
+            and minimum >= 0
+            and (maximum is None or isinstance(maximum, int) and maximum >= minimum)
+        ):
+            raise web.HTTPError(
+                405, reason="Invalid adaptive range [%r, %r]" % (minimum, maximum)
+            )
+        self.gateway.adapt_cluster(
+            cluster, minimum=minimum, maximum=maximum, active=bool(active)
+        )
+
+
 class ClusterWorkersHandler(BaseHandler):
     def get_cluster_and_worker(self, cluster_name, worker_name):
         self.check_cluster(cluster_name)
@@ -287,6 +331,35 @@ class ClusterWorkersHandler(BaseHandler):
         cluster, worker = self.get_cluster_and_worker(cluster_name, worker_name)
         self.gateway.maybe_fail_worker(cluster, worker)
 
+    @token_authenticated
+    async def post(self, cluster_name, worker_name):
+        """Register many workers added to/removed from cluster at once"""
+        # Only accept urls of the form /api/clusters/{cluster_name}/workers/
+        if worker_name:
+            raise web.HTTPError(405)
+        self.check_cluster(cluster_name)
+        try:
+            added = [msg["name"] for msg in self.json_data.get("added", ())]
+            removed = list(self.json_data.get("removed", ()))
+        except (TypeError, KeyError, AttributeError):
+            raise web.HTTPError(405)
+
+        # All changes are applied without yielding to the event loop, so other
+        # requests see either none or all of them
+        cluster = self.dask_cluster
+        unknown = [n for n in added + removed if n not in cluster.workers]
+
+        for name in added:
+            worker = cluster.workers.get(name)
+            if worker is not None and not worker._connect_future.done():
+                worker._connect_future.set_result(True)
+        for name in removed:
+            worker = cluster.workers.get(name)
+            if worker is not None:
+                self.gateway.maybe_fail_worker(cluster, worker)
+
+        self.write({"unknown": unknown})
+
 
 default_handlers = [
     (
@@ -294,6 +367,7 @@ default_handlers = [
         ClusterWorkersHandler,
     ),
     ("/api/clusters/([a-zA-Z0-9-_.]*)/workers", ClusterScaleHandler),
+    ("/api/clusters/([a-zA-Z0-9-_.]*)/adapt", ClusterAdaptHandler),
     ("/api/clusters/([a-zA-Z0-9-_.]*)/addresses", ClusterRegistrationHandler),
     ("/api/clusters/([a-zA-Z0-9-_.]*)", ClustersHandler),
 ]
@@ -151,6 +151,85 @@ class ClusterManager(LoggingConfigurable):
         """,
     )
 
+    supports_bulk_start = Bool(
+        False,
+        help="""
+        Whether ``start_workers`` is implemented.
+
+        If ``False`` (default), ``start_worker`` will be individually called
+        for each new worker. Otherwise when scaling up by more than one worker
+        ``start_workers`` will be called once with all the new workers. This
+        option makes sense for cluster backends that can submit many workers
+        more efficiently in one action (e.g. as a job array).
+        """,
+    )
+
+    supports_bulk_stop = Bool(
+        False,
+        help="""
+        Whether ``stop_workers`` is implemented.
+
+        If ``False`` (default), ``stop_worker`` will be individually called
+        for each worker being stopped. Otherwise when stopping more than one
+        worker ``stop_workers`` will be called once with all the workers. This
+        option makes sense for cluster backends that can stop many workers
+        more efficiently in one action, but (unlike ``supports_bulk_shutdown``)
+        need the worker states to do so.
+        """,
+    )
+
+    supports_cluster_pool = Bool(
+        False,
+        help="""
+        Whether clusters can be started before being assigned to a user.
+
+        Only cluster managers whose clusters don't depend on the requesting
+        user (e.g. they don't run as that user) may support this, see
+        ``cluster_pool_size``.
+        """,
+    )
+
+    cluster_pool_size = Integer(
+        0,
+        min=0,
+        help="""
+        The number of started clusters to keep in a warm pool.
+
+        New cluster requests are served from the pool if a pooled cluster is
+        running, skipping the cluster startup time. The pool is refilled in
+        the background after every claim. Only used by cluster managers that
+        set ``supports_cluster_pool``. Set to 0 to disable (default).
+        """,
+        config=True,
+    )
+
+    cluster_pool_idle_timeout = Float(
+        600,
+        min=0,
+        help="""
+        Time (in seconds) a cluster can sit unclaimed in the pool before it's
+        replaced with a new one. Set to 0 for no timeout.
+        """,
+        config=True,
+    )
+
+    orphan_cleanup_period = Float(
+        0,
+        min=0,
+        help="""
+        Time (in seconds) between checks for orphaned resources.
+
+        Orphaned resources are those left behind by clusters that are no
+        longer active in the gateway (e.g. if the gateway was restarted while
+        a cluster was stopping). Only used by cluster managers that implement
+        ``cleanup_orphans``. Note that any resources belonging to clusters
+        not known by this gateway are considered orphaned, so this should only
+        be enabled if this gateway is the only one managing resources in its
+        backend namespace. Set to 0 to disable (default).
+        """,
+        config=True,
+    )
+
     async def start_cluster(self, cluster_info):
         """Start a new cluster.
 
@@ -210,6 +289,34 @@ class ClusterManager(LoggingConfigurable):
         """
         raise NotImplementedError
 
+    async def start_workers(self, worker_names, cluster_info, cluster_state):
+        """Start many new workers at once.
+
+        Only called if ``supports_bulk_start`` is True.
+
+        Parameters
+        ----------
+        worker_names : list of str
+            The worker names, see ``start_worker`` for more information.
+        cluster_info : ClusterInfo
+            Information about the cluster.
+        cluster_state : dict
+            Any additional state returned from ``start_cluster``.
+
+        Yields
+        ------
+        worker_states : dict
+            A mapping of worker name to worker state (see ``start_worker``)
+            for any workers with state updates. Workers that failed to start
+            should map to an ``Exception`` instead. Startup may occur in
+            multiple stages, each yielding updates to be checkpointed. Once
+            this completes, all workers that haven't failed are considered
+            started. If an error is raised at any time, all workers are
+            considered failed, and the last yielded state for each worker will
+            be used when calling ``stop_worker``.
+        """
+        raise NotImplementedError
+
     async def stop_worker(self, worker_name, worker_state, cluster_info, cluster_state):
         """Remove a worker.
 
@@ -225,3 +332,51 @@ class ClusterManager(LoggingConfigurable):
             Any additional state returned from ``start_cluster``.
         """
         raise NotImplementedError
+
+    async def stop_workers(self, worker_states, cluster_info, cluster_state):
+        """Remove many workers at once.
+
+        Only called if ``supports_bulk_stop`` is True.
+
+        Parameters
+        ----------
+        worker_states : dict
+            A mapping of worker name to any additional worker state returned
+            from ``start_worker``.
+        cluster_info : ClusterInfo
+            Information about the cluster.
+        cluster_state : dict
+            Any additional state returned from ``start_cluster``.
+
+        Returns
+        -------
+        errors : dict
+            A mapping of worker name to ``Exception`` for any workers that
+            failed to stop.
+        """
+        raise NotImplementedError
+
+    async def cleanup_orphans(self, active_clusters):
+        """Cleanup any resources belonging to inactive clusters.
+
+        Called every ``orphan_cleanup_period`` seconds, if enabled.
+
+        Parameters
+        ----------
+        active_clusters : set of str
+            The names of all clusters that are still active.
+
+        Returns
+        -------
+        n_removed : int
+            The number of orphaned resources removed.
+        """
+        return 0
+
+    async def close(self):
+        """Cleanup any resources held by the cluster manager.
+
+        Called once on gateway shutdown, after any clusters to be stopped have
+        been stopped.
+        """
+        pass
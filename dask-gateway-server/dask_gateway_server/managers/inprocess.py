@@ -12,6 +12,9 @@ from .local import UnsafeLocalClusterManager
 class InProcessClusterManager(UnsafeLocalClusterManager):
     """A cluster manager that runs everything in the same process"""
 
+    # Workers are created in this process, there's no process startup to skip
+    supports_worker_pool = False
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.active_schedulers = {}
@@ -1,18 +1,213 @@
 import asyncio
+import fcntl
 import json
+import math
 import os
 import pwd
+import re
 import shutil
+import time
 from weakref import WeakValueDictionary
 
-from traitlets import Float, Unicode, default
+from traitlets import Bool, Float, Integer, Unicode, default
 
 from ..base import ClusterManager
+from .launcher import HEADER
 
 
 __all__ = ("JobQueueClusterManager",)
 
 
+def array_worker_name_script(index_var):
+    """Shell script to select a worker name for a job in a job array.
+
+    The worker names are passed in as a space-separated list in the
+    ``DASK_GATEWAY_WORKER_NAMES`` environment variable, and the environment
+    variable ``index_var`` holds the index of the job in the array.
+    """
+    return "\n".join(
+        [
+            "set -- $DASK_GATEWAY_WORKER_NAMES",
+            "shift $%s" % index_var,
+            "export DASK_GATEWAY_WORKER_NAME=$1",
+            "set --",
+        ]
+    )
+
+
+# Errors from the cancel command that indicate the job has already finished
+FINISHED_JOB_MESSAGES = ("Job has finished", "already completing or completed")
+
+
+def is_finished_job_error(msg):
+    return any(m in msg for m in FINISHED_JOB_MESSAGES)
+
+
+def parse_stop_errors(job_ids, stderr):
+    """Attribute errors in the output of a batched cancel command to the
+    individual jobs they refer to"""
+    job_ids = set(job_ids)
+    errors = {}
+    for line in stderr.splitlines():
+        if is_finished_job_error(line):
+            continue
+        for token in re.split(r"[\s:,]+", line):
+            if token in job_ids:
+                errors[token] = line.strip()
+    return errors
+
+
+class SubmitTemplate(object):
+    """A precomputed worker submit command for a cluster.
+
+    Built once from ``get_submit_cmd_env_stdin`` with a placeholder worker
+    name. Submitting each worker then only needs the worker name filled in.
+    """
+
+    PLACEHOLDER = "__DASK_GATEWAY_WORKER_NAME__"
+
+    __slots__ = ("cmd", "env", "stdin", "cmd_slots", "env_slots")
+
+    def __init__(self, cmd, env, stdin):
+        self.cmd = cmd
+        self.env = env
+        self.stdin = stdin
+        self.cmd_slots = [i for i, a in enumerate(cmd) if self.PLACEHOLDER in a]
+        self.env_slots = [k for k, v in env.items() if self.PLACEHOLDER in v]
+
+    def fill(self, worker_name):
+        cmd = list(self.cmd)
+        for i in self.cmd_slots:
+            cmd[i] = cmd[i].replace(self.PLACEHOLDER, worker_name)
+        env = dict(self.env)
+        for k in self.env_slots:
+            env[k] = env[k].replace(self.PLACEHOLDER, worker_name)
+        stdin = self.stdin
+        if stdin is not None and self.PLACEHOLDER in stdin:
+            stdin = stdin.replace(self.PLACEHOLDER, worker_name)
+        return cmd, env, stdin
+
+
+class FileRateLimiter(object):
+    """Limit the rate of an action across processes on the same host.
+
+    The time of the last action is stored in a file, and access to it is
+    serialized with ``flock``. Every process using the same file waits until
+    at least ``interval`` seconds have passed since the last action taken by
+    any of them.
+    """
+
+    def __init__(self, path, interval):
+        self.path = path
+        self.interval = interval
+
+    def _try_acquire(self):
+        """Returns the time to wait before trying again, or 0 on success"""
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0.01
+            try:
+                last = float(os.read(fd, 64) or 0)
+            except ValueError:
+                last = 0
+            now = time.time()
+            delay = last + self.interval - now
+            if delay > 0:
+                return delay
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, repr(now).encode())
+            return 0
+        finally:
+            os.close(fd)
+
+    async def acquire(self):
+        while True:
+            delay = self._try_acquire()
+            if not delay:
+                return
+            await asyncio.sleep(delay)
+
+
+class LauncherProcess(object):
+    """A long-running ``dask-gateway-jobqueue-launcher --daemon`` process.
+
+    Requests are sent as length-prefixed JSON messages over the process's
+    stdin, with responses read back from stdout. Only one request is in flight
+    at a time.
+    """
+
+    def __init__(self, cmd):
+        self.cmd = cmd
+        self.proc = None
+        self.lock = asyncio.Lock()
+        self.last_used = 0
+        # Set if a request was interrupted, the process may still send a
+        # response for it so it can't be used again
+        self.broken = False
+
+    @property
+    def running(self):
+        return (
+            self.proc is not None and self.proc.returncode is None and not self.broken
+        )
+
+    async def start(self):
+        # The daemon only writes to stderr on startup failures (e.g. from
+        # sudo), the output of any commands it runs is captured separately
+        self.proc = await asyncio.create_subprocess_exec(
+            *self.cmd,
+            env={},
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        self.last_used = asyncio.get_running_loop().time()
+
+    async def request(self, msg):
+        async with self.lock:
+            body = json.dumps(msg).encode("utf8")
+            try:
+                self.proc.stdin.write(HEADER.pack(len(body)) + body)
+                await self.proc.stdin.drain()
+                header = await self.proc.stdout.readexactly(HEADER.size)
+                (n,) = HEADER.unpack(header)
+                body = await self.proc.stdout.readexactly(n)
+            except (asyncio.IncompleteReadError, ConnectionError) as exc:
+                await self.close()
+                stderr = await self.proc.stderr.read()
+                raise Exception(
+                    "`dask-gateway-jobqueue-launcher` exited unexpectedly\n"
+                    "  returncode: %s\n"
+                    "  stderr: %s"
+                    % (self.proc.returncode, stderr.decode("utf8", "replace"))
+                ) from exc
+            except BaseException:
+                # Interrupted (e.g. cancelled) mid-request. The response may
+                # still arrive, so stop the process to keep later requests
+                # from reading it. A new launcher is started on next use.
+                self.broken = True
+                if self.proc.returncode is None:
+                    self.proc.kill()
+                raise
+            self.last_used = asyncio.get_running_loop().time()
+            return json.loads(body.decode("utf8"))
+
+    async def close(self, timeout=5):
+        if self.proc is None or self.proc.returncode is not None:
+            return
+        # Closing stdin signals the daemon to exit
+        self.proc.stdin.close()
+        try:
+            await asyncio.wait_for(self.proc.wait(), timeout)
+        except asyncio.TimeoutError:
+            self.proc.kill()
+            await self.proc.wait()
+
+
 class JobQueueClusterManager(ClusterManager):
     """A base cluster manager for deploying Dask on a jobqueue cluster."""
 
@@ -43,7 +238,104 @@ class JobQueueClusterManager(ClusterManager):
 
     status_poll_interval = Float(
         0.5,
-        help="The interval (in seconds) in which to poll for job statuses.",
+        help="""
+        The minimum interval (in seconds) in which to poll for job statuses.
+
+        The actual interval backs off from this as jobs remain queued, see
+        ``status_poll_backoff`` for more information.
+        """,
+        config=True,
+    )
+
+    status_poll_max_interval = Float(
+        10,
+        help="The maximum interval (in seconds) in which to poll for job statuses.",
+        config=True,
+    )
+
+    status_poll_backoff = Float(
+        0.1,
+        min=0,
+        help="""
+        How quickly to back off polling for job statuses.
+
+        Job statuses are polled every ``status_poll_backoff`` times the time
+        the most recently submitted job has been pending, scaled up further
+        with the log of the number of pending jobs. The interval is kept
+        within ``status_poll_interval`` and ``status_poll_max_interval``.
+        New jobs reset the interval, so jobs that start quickly are noticed
+        quickly, while polling of long queued jobs slows down.
+        """,
+        config=True,
+    )
+
+    status_rate_limit_file = Unicode(
+        "",
+        help="""
+        Path to a file used to rate limit job status checks across processes.
+
+        If set, all gateways on this host configured with the same file will
+        run at most one status check every ``status_rate_limit_interval``
+        seconds between them. By default no shared rate limit is applied.
+        """,
+        config=True,
+    )
+
+    status_rate_limit_interval = Float(
+        1.0,
+        help="""
+        The minimum interval (in seconds) between status checks made by all
+        gateways sharing ``status_rate_limit_file``.
+        """,
+        config=True,
+    )
+
+    use_launcher_daemon = Bool(
+        False,
+        help="""
+        Whether to use a long-running launcher process for each user.
+
+        By default, a new ``dask-gateway-jobqueue-launcher`` process is
+        spawned (via ``sudo``) for every job submitted or cancelled. If True,
+        a single launcher process is spawned per user and reused for all
+        actions, avoiding the process startup cost. Idle launchers are
+        stopped after ``launcher_idle_timeout`` seconds.
+        """,
+        config=True,
+    )
+
+    launcher_idle_timeout = Float(
+        300,
+        help="""
+        Time (in seconds) before stopping an idle launcher process.
+
+        Only used if ``use_launcher_daemon`` is True.
+        """,
+        config=True,
+    )
+
+    max_array_size = Integer(
+        1000,
+        min=1,
+        help="""
+        The max number of workers to submit in a single job array.
+
+        When scaling up by many workers at once, workers are submitted as job
+        arrays of at most this size.
+        """,
+        config=True,
+    )
+
+    max_cancel_batch_size = Integer(
+        500,
+        min=1,
+        help="""
+        The max number of jobs to cancel in a single cancel command.
+
+        When stopping many workers at once, their jobs are cancelled in
+        batches of at most this size, to keep the command line within the
+        system's argument length limits.
+        """,
         config=True,
     )
 
@@ -85,18 +377,44 @@ class JobQueueClusterManager(ClusterManager):
         """The full command (with args) to launch a dask scheduler"""
         return self.scheduler_cmd
 
-    def get_submit_cmd_env_stdin(self, cluster_info, worker_name=None):
+    def get_submit_cmd_env_stdin(
+        self, cluster_info, worker_name=None, worker_names=None
+    ):
         raise NotImplementedError
 
+    def get_worker_submit_cmd_env_stdin(self, cluster_info, worker_name):
+        """Get the submit command for a single worker.
+
+        Uses a submit template cached per cluster, so the command is only
+        fully constructed once per cluster.
+        """
+        if not hasattr(self, "submit_templates"):
+            self.submit_templates = {}
+        template = self.submit_templates.get(cluster_info.cluster_name)
+        if template is None:
+            template = SubmitTemplate(
+                *self.get_submit_cmd_env_stdin(
+                    cluster_info, worker_name=SubmitTemplate.PLACEHOLDER
+                )
+            )
+            self.submit_templates[cluster_info.cluster_name] = template
+        return template.fill(worker_name)
+
     def get_stop_cmd_env(self, job_id):
         raise NotImplementedError
 
+    def get_bulk_stop_cmd_env(self, job_ids):
+        raise NotImplementedError
+
     def get_status_cmd_env(self, job_ids):
         raise NotImplementedError
 
     def parse_job_id(self, stdout):
         raise NotImplementedError
 
+    def parse_array_job_ids(self, stdout, n):
+        raise NotImplementedError
+
     def parse_job_states(self, stdout):
         raise NotImplementedError
 
@@ -114,9 +432,53 @@ class JobQueueClusterManager(ClusterManager):
         key_path = os.path.join(staging_dir, "dask.pem")
         return cert_path, key_path
 
+    async def get_launcher(self, user):
+        """Get a running launcher process for a user, starting one if needed"""
+        if not hasattr(self, "launchers"):
+            self.launchers = {}
+            self.launcher_reaper = self.task_pool.create_background_task(
+                self.reap_idle_launchers()
+            )
+        launcher = self.launchers.get(user)
+        if launcher is None or not launcher.running:
+            self.log.debug("Starting launcher process for user %s", user)
+            launcher = LauncherProcess(
+                ["sudo", "-nHu", user, self.dask_gateway_jobqueue_launcher, "--daemon"]
+            )
+            self.launchers[user] = launcher
+            await launcher.start()
+        return launcher
+
+    async def reap_idle_launchers(self):
+        """Stop any launcher processes that have been idle too long"""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                await asyncio.sleep(self.launcher_idle_timeout / 2)
+                cutoff = loop.time() - self.launcher_idle_timeout
+                for user, launcher in list(self.launchers.items()):
+                    if launcher.last_used < cutoff and not launcher.lock.locked():
+                        self.log.debug("Stopping idle launcher for user %s", user)
+                        del self.launchers[user]
+                        await launcher.close()
+        finally:
+            launchers = list(self.launchers.values())
+            self.launchers.clear()
+            await asyncio.gather(*(p.close() for p in launchers))
+
     async def do_as_user(self, user, action, **kwargs):
-        cmd = ["sudo", "-nHu", user, self.dask_gateway_jobqueue_launcher]
         kwargs["action"] = action
+        if self.use_launcher_daemon:
+            launcher = await self.get_launcher(user)
+            result = await launcher.request(kwargs)
+        else:
+            result = await self.do_as_user_once(user, kwargs)
+        if not result["ok"]:
+            raise Exception(result["error"])
+        return result["returncode"], result["stdout"], result["stderr"]
+
+    async def do_as_user_once(self, user, kwargs):
+        cmd = ["sudo", "-nHu", user, self.dask_gateway_jobqueue_launcher]
         proc = await asyncio.create_subprocess_exec(
             *cmd,
             env={},
@@ -135,23 +497,21 @@ class JobQueueClusterManager(ClusterManager):
                 "  stdout: %s\n"
                 "  stderr: %s" % (proc.returncode, stdout, stderr)
             )
-        result = json.loads(stdout)
-        if not result["ok"]:
-            raise Exception(result["error"])
-        return result["returncode"], result["stdout"], result["stderr"]
+        return json.loads(stdout)
 
     async def start_job(self, cluster_info, worker_name=None):
-        cmd, env, stdin = self.get_submit_cmd_env_stdin(
-            cluster_info, worker_name=worker_name
-        )
-        if not worker_name:
+        if worker_name:
+            cmd, env, stdin = self.get_worker_submit_cmd_env_stdin(
+                cluster_info, worker_name
+            )
+            staging_dir = files = None
+        else:
+            cmd, env, stdin = self.get_submit_cmd_env_stdin(cluster_info)
             staging_dir = self.get_staging_directory(cluster_info)
             files = {
                 "dask.pem": cluster_info.tls_key.decode("utf8"),
                 "dask.crt": cluster_info.tls_cert.decode("utf8"),
             }
-        else:
-            staging_dir = files = None
 
         code, stdout, stderr = await self.do_as_user(
             user=cluster_info.username,
@@ -174,6 +534,25 @@ class JobQueueClusterManager(ClusterManager):
             )
         return self.parse_job_id(stdout)
 
+    async def start_array_job(self, cluster_info, worker_names):
+        cmd, env, stdin = self.get_submit_cmd_env_stdin(
+            cluster_info, worker_names=worker_names
+        )
+        code, stdout, stderr = await self.do_as_user(
+            user=cluster_info.username, action="start", cmd=cmd, env=env, stdin=stdin
+        )
+        if code != 0:
+            raise Exception(
+                (
+                    "Failed to submit job array to batch system\n"
+                    "  exit_code: %d\n"
+                    "  stdout: %s\n"
+                    "  stderr: %s"
+                )
+                % (code, stdout, stderr)
+            )
+        return self.parse_array_job_ids(stdout, len(worker_names))
+
     async def stop_job(self, cluster_info, job_id, worker_name=None):
         cmd, env = self.get_stop_cmd_env(job_id)
 
@@ -189,48 +568,135 @@ class JobQueueClusterManager(ClusterManager):
             env=env,
             staging_dir=staging_dir,
         )
-        if code != 0 and "Job has finished" not in stderr:
+        if code != 0 and not is_finished_job_error(stderr):
             raise Exception(
-                "Failed to stop job_id %s" % (job_id, cluster_info.cluster_name)
+                "Failed to stop job_id %s for cluster %s\n"
+                "  exit_code: %d\n"
+                "  stdout: %s\n"
+                "  stderr: %s"
+                % (job_id, cluster_info.cluster_name, code, stdout, stderr)
             )
 
+    async def stop_jobs(self, cluster_info, job_ids):
+        """Stop many worker jobs, batching them into as few cancel commands as
+        possible.
+
+        Returns a dict mapping job id to ``Exception`` for any jobs that
+        failed to stop.
+        """
+        errors = {}
+        for i in range(0, len(job_ids), self.max_cancel_batch_size):
+            chunk = job_ids[i : i + self.max_cancel_batch_size]
+            cmd, env = self.get_bulk_stop_cmd_env(chunk)
+            try:
+                code, stdout, stderr = await self.do_as_user(
+                    user=cluster_info.username, action="stop", cmd=cmd, env=env
+                )
+            except Exception as exc:
+                errors.update((job_id, exc) for job_id in chunk)
+                continue
+            if code == 0:
+                continue
+            chunk_errors = parse_stop_errors(chunk, stderr)
+            if not chunk_errors and not is_finished_job_error(stderr):
+                # Failure couldn't be attributed to specific jobs, fail them all
+                msg = "exit_code: %d, stderr: %s" % (code, stderr)
+                chunk_errors = dict.fromkeys(chunk, msg)
+            for job_id, msg in chunk_errors.items():
+                errors[job_id] = Exception(
+                    "Failed to stop job_id %s for cluster %s: %s"
+                    % (job_id, cluster_info.cluster_name, msg)
+                )
+        return errors
+
+    def get_status_poll_interval(self):
+        """The interval to wait before the next job status check"""
+        if not self.job_track_times:
+            return self.status_poll_interval
+        now = asyncio.get_running_loop().time()
+        youngest = now - max(self.job_track_times.values())
+        interval = max(self.status_poll_interval, self.status_poll_backoff * youngest)
+        interval *= 1 + math.log10(len(self.job_track_times))
+        return min(interval, self.status_poll_max_interval)
+
+    async def check_job_states(self):
+        self.log.debug("Polling status of %d jobs", len(self.jobs_to_track))
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire()
+        cmd, env = self.get_status_cmd_env(list(self.jobs_to_track))
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            env=env,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await proc.communicate()
+        stdout = stdout.decode("utf8", "replace")
+        if proc.returncode != 0:
+            stderr = stderr.decode("utf8", "replace")
+            self.log.warning(
+                "Job status check failed with returncode %d, stderr: %s",
+                proc.returncode,
+                stderr,
+            )
+
+        try:
+            running, failed = self.parse_job_states(stdout)
+        except Exception as exc:
+            self.log.warning("Failed to parse job status output", exc_info=exc)
+            return
+
+        for job_id in running:
+            fut = self.jobs_to_track.pop(job_id, None)
+            if fut:
+                fut.set_result(True)
+        for job_id in failed:
+            fut = self.jobs_to_track.pop(job_id, None)
+            if fut:
+                fut.set_result(False)
+
     async def job_state_tracker(self):
+        loop = asyncio.get_running_loop()
+        last_check = next_check = 0
         while True:
-            if self.jobs_to_track:
-                self.log.debug("Polling status of %d jobs", len(self.jobs_to_track))
-                cmd, env = self.get_status_cmd_env(self.jobs_to_track)
-                proc = await asyncio.create_subprocess_exec(
-                    *cmd,
-                    env=env,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                )
-                stdout, stderr = await proc.communicate()
-                stdout = stdout.decode("utf8", "replace")
-                if proc.returncode != 0:
-                    stderr = stderr.decode("utf8", "replace")
-                    self.log.warning(
-                        "Job status check failed with returncode %d, stderr: %s",
-                        proc.returncode,
-                        stderr,
-                    )
-
-                running, failed = self.parse_job_states(stdout)
-
-                for job_id in running:
-                    fut = self.jobs_to_track.pop(job_id, None)
-                    if fut:
-                        fut.set_result(True)
-                for job_id in failed:
-                    fut = self.jobs_to_track.pop(job_id, None)
-                    if fut:
-                        fut.set_result(False)
-
-            await asyncio.sleep(self.status_poll_interval)
+            # Forget about any jobs no longer being tracked
+            for job_id in set(self.job_track_times).difference(self.jobs_to_track):
+                del self.job_track_times[job_id]
+
+            if not self.jobs_to_track:
+                self.job_tracker_wakeup.clear()
+                await self.job_tracker_wakeup.wait()
+                continue
+
+            delay = next_check - loop.time()
+            if delay > 0:
+                # Sleep until the next check, waking early on new jobs since
+                # they shorten the interval
+                self.job_tracker_wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.job_tracker_wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                else:
+                    interval = self.get_status_poll_interval()
+                    next_check = min(next_check, last_check + interval)
+                continue
+
+            await self.check_job_states()
+            last_check = loop.time()
+            next_check = last_check + self.get_status_poll_interval()
 
     def is_job_running(self, job_id):
         if not hasattr(self, "job_tracker"):
             self.jobs_to_track = WeakValueDictionary()
+            self.job_track_times = {}
+            self.job_tracker_wakeup = asyncio.Event()
+            if self.status_rate_limit_file:
+                self.rate_limiter = FileRateLimiter(
+                    self.status_rate_limit_file, self.status_rate_limit_interval
+                )
+            else:
+                self.rate_limiter = None
             self.job_tracker = self.task_pool.create_background_task(
                 self.job_state_tracker()
             )
@@ -238,6 +704,8 @@ class JobQueueClusterManager(ClusterManager):
         if job_id not in self.jobs_to_track:
             loop = asyncio.get_running_loop()
             fut = self.jobs_to_track[job_id] = loop.create_future()
+            self.job_track_times[job_id] = loop.time()
+            self.job_tracker_wakeup.set()
         else:
             fut = self.jobs_to_track[job_id]
         return fut
@@ -252,6 +720,8 @@ class JobQueueClusterManager(ClusterManager):
             )
 
     async def stop_cluster(self, cluster_info, cluster_state):
+        if hasattr(self, "submit_templates"):
+            self.submit_templates.pop(cluster_info.cluster_name, None)
         job_id = cluster_state.get("job_id")
         if job_id is None:
             return
@@ -266,8 +736,44 @@ class JobQueueClusterManager(ClusterManager):
                 % (job_id, worker_name)
             )
 
+    async def start_workers(self, worker_names, cluster_info, cluster_state):
+        job_ids = {}
+        for i in range(0, len(worker_names), self.max_array_size):
+            chunk = worker_names[i : i + self.max_array_size]
+            try:
+                if len(chunk) == 1:
+                    ids = [await self.start_job(cluster_info, worker_name=chunk[0])]
+                else:
+                    ids = await self.start_array_job(cluster_info, chunk)
+            except Exception as exc:
+                yield {name: exc for name in chunk}
+                continue
+            job_ids.update(zip(chunk, ids))
+            yield {name: {"job_id": job_id} for name, job_id in zip(chunk, ids)}
+
+        running = await asyncio.gather(*map(self.is_job_running, job_ids.values()))
+        failed = {
+            name: Exception(
+                "Job %s for worker %s failed, see logs for more information"
+                % (job_id, name)
+            )
+            for (name, job_id), ok in zip(job_ids.items(), running)
+            if not ok
+        }
+        if failed:
+            yield failed
+
     async def stop_worker(self, worker_name, worker_state, cluster_info, cluster_state):
         job_id = worker_state.get("job_id")
         if job_id is None:
             return
         await self.stop_job(cluster_info, job_id, worker_name=worker_name)
+
+    async def stop_workers(self, worker_states, cluster_info, cluster_state):
+        names = {}
+        for name, state in worker_states.items():
+            job_id = state.get("job_id")
+            if job_id is not None:
+                names[job_id] = name
+        errors = await self.stop_jobs(cluster_info, list(names))
+        return {names[job_id]: exc for job_id, exc in errors.items()}
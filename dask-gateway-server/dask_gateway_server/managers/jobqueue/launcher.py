@@ -1,9 +1,13 @@
 import json
 import os
 import shutil
+import struct
 import subprocess
 import sys
 
+# Messages in daemon mode are framed with a 4 byte big-endian length prefix
+HEADER = struct.Struct("!I")
+
 
 def finish(**kwargs):
     json.dump(kwargs, sys.stdout)
@@ -15,7 +19,8 @@ def run_command(cmd, env, stdin=None):
         stdin = stdin.encode("utf8")
         STDIN = subprocess.PIPE
     else:
-        STDIN = None
+        # Don't inherit our stdin, which may be in use by the daemon
+        STDIN = subprocess.DEVNULL
 
     proc = subprocess.Popen(
         cmd,
@@ -28,7 +33,7 @@ def run_command(cmd, env, stdin=None):
 
     stdout, stderr = proc.communicate(stdin)
 
-    finish(
+    return dict(
         ok=True,
         returncode=proc.returncode,
         stdout=stdout.decode("utf8", "replace"),
@@ -44,43 +49,80 @@ def start(cmd, env, stdin=None, staging_dir=None, files=None):
                 with open(os.path.join(staging_dir, name), "w") as f:
                     f.write(value)
         except Exception as exc:
-            finish(
+            return dict(
                 ok=False,
                 error="Error setting up staging directory %s: %s" % (staging_dir, exc),
             )
-            return
-    run_command(cmd, env, stdin=stdin)
+    return run_command(cmd, env, stdin=stdin)
 
 
 def stop(cmd, env, staging_dir=None):
-    if staging_dir:
-        if not os.path.exists(staging_dir):
-            return
+    if staging_dir and os.path.exists(staging_dir):
         try:
             shutil.rmtree(staging_dir)
         except Exception as exc:
-            finish(
+            return dict(
                 ok=False,
                 error="Error removing staging directory %s: %s" % (staging_dir, exc),
             )
-            return
-    run_command(cmd, env)
+    return run_command(cmd, env)
+
+
+def handle(kwargs):
+    action = kwargs.pop("action", None)
+    if action == "start":
+        return start(**kwargs)
+    elif action == "stop":
+        return stop(**kwargs)
+    else:
+        return dict(ok=False, error="Valid actions are 'start' and 'stop'")
+
+
+def read_message(stream):
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    (n,) = HEADER.unpack(header)
+    return json.loads(stream.read(n).decode("utf8"))
+
+
+def write_message(stream, msg):
+    body = json.dumps(msg).encode("utf8")
+    stream.write(HEADER.pack(len(body)) + body)
+    stream.flush()
+
+
+def daemon():
+    """Handle many requests over stdin/stdout, until stdin is closed"""
+    stdin = sys.stdin.buffer
+    stdout = sys.stdout.buffer
+    while True:
+        try:
+            kwargs = read_message(stdin)
+        except ValueError as exc:
+            write_message(stdout, dict(ok=False, error=str(exc)))
+            continue
+        if kwargs is None:
+            break
+        try:
+            result = handle(kwargs)
+        except Exception as exc:
+            result = dict(ok=False, error="Unexpected error: %s" % exc)
+        write_message(stdout, result)
 
 
 def main():
+    if "--daemon" in sys.argv[1:]:
+        daemon()
+        return
+
     try:
         kwargs = json.load(sys.stdin)
     except ValueError as exc:
         finish(ok=False, error=str(exc))
         return
 
-    action = kwargs.pop("action", None)
-    if action == "start":
-        start(**kwargs)
-    elif action == "stop":
-        stop(**kwargs)
-    else:
-        finish(ok=False, error="Valid actions are 'start' and 'stop'")
+    finish(**handle(kwargs))
 
 
 if __name__ == "__main__":
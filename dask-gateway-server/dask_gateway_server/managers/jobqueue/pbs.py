@@ -1,10 +1,11 @@
+import json
 import math
 import shutil
 import socket
 
 from traitlets import Unicode, Bool, default
 
-from .base import JobQueueClusterManager
+from .base import JobQueueClusterManager, array_worker_name_script
 
 
 __all__ = ("PBSClusterManager",)
@@ -70,6 +71,9 @@ class PBSClusterManager(JobQueueClusterManager):
         config=True,
     )
 
+    supports_bulk_start = True
+    supports_bulk_stop = True
+
     # The following fields are configurable only for just-in-case reasons. The
     # defaults should be sufficient for most users.
 
@@ -107,7 +111,9 @@ class PBSClusterManager(JobQueueClusterManager):
         else:
             return super().get_tls_paths(cluster_info)
 
-    def get_submit_cmd_env_stdin(self, cluster_info, worker_name=None):
+    def get_submit_cmd_env_stdin(
+        self, cluster_info, worker_name=None, worker_names=None
+    ):
         env = self.get_env(cluster_info)
 
         cmd = [self.submit_command]
@@ -124,7 +130,22 @@ class PBSClusterManager(JobQueueClusterManager):
             staging_dir = self.get_staging_directory(cluster_info)
             cmd.append("-Wstagein=.@%s:%s/*" % (self.gateway_hostname, staging_dir))
 
-        if worker_name:
+        if worker_names:
+            # PBS job arrays must have more than one subjob
+            assert len(worker_names) > 1
+            env["DASK_GATEWAY_WORKER_NAMES"] = " ".join(worker_names)
+            cmd.extend(["-J", "0-%d" % (len(worker_names) - 1)])
+            resources = self.format_resource_list(
+                self.worker_resource_list, self.worker_cores, self.worker_memory
+            )
+            script = "\n".join(
+                [
+                    array_worker_name_script("PBS_ARRAY_INDEX"),
+                    self.worker_setup,
+                    self.worker_command,
+                ]
+            )
+        elif worker_name:
             env["DASK_GATEWAY_WORKER_NAME"] = worker_name
             resources = self.format_resource_list(
                 self.worker_resource_list, self.worker_cores, self.worker_memory
@@ -147,23 +168,35 @@ class PBSClusterManager(JobQueueClusterManager):
     def get_stop_cmd_env(self, job_id):
         return [self.cancel_command, job_id], {}
 
+    def get_bulk_stop_cmd_env(self, job_ids):
+        return [self.cancel_command] + list(job_ids), {}
+
     def get_status_cmd_env(self, job_ids):
-        out = [self.status_command, "-x"]
+        out = [self.status_command, "-x", "-f", "-F", "json"]
+        if any("[" in job_id for job_id in job_ids):
+            # Include status of array subjobs
+            out.append("-t")
         out.extend(job_ids)
         return out, {}
 
     def parse_job_id(self, stdout):
         return stdout.strip()
 
+    def parse_array_job_ids(self, stdout, n):
+        # Array job ids are of the form `1234[].server`, subjobs are
+        # referenced as `1234[index].server`
+        job_id = self.parse_job_id(stdout)
+        return [job_id.replace("[]", "[%d]" % i) for i in range(n)]
+
     def parse_job_states(self, stdout):
-        lines = stdout.splitlines()[2:]
+        # `strict=False` allows control characters in strings, which some
+        # versions of PBS don't escape
+        jobs = json.loads(stdout, strict=False).get("Jobs", {}) if stdout else {}
         running = []
         failed = []
 
-        for l in lines:
-            parts = l.split()
-            job_id = parts[0]
-            status = parts[4]
+        for job_id, info in jobs.items():
+            status = info.get("job_state")
             if status == "R":
                 running.append(job_id)
             elif status not in ("Q", "H"):
@@ -4,7 +4,7 @@ import shutil
 
 from traitlets import Unicode, default
 
-from .base import JobQueueClusterManager
+from .base import JobQueueClusterManager, array_worker_name_script
 
 
 __all__ = ("SlurmClusterManager",)
@@ -30,6 +30,9 @@ class SlurmClusterManager(JobQueueClusterManager):
 
     account = Unicode("", help="Account string associated with each job.", config=True)
 
+    supports_bulk_start = True
+    supports_bulk_stop = True
+
     @default("submit_command")
     def _default_submit_command(self):
         return shutil.which("sbatch") or "sbatch"
@@ -42,7 +45,9 @@ class SlurmClusterManager(JobQueueClusterManager):
     def _default_status_command(self):
         return shutil.which("squeue") or "squeue"
 
-    def get_submit_cmd_env_stdin(self, cluster_info, worker_name=None):
+    def get_submit_cmd_env_stdin(
+        self, cluster_info, worker_name=None, worker_names=None
+    ):
         env = self.get_env(cluster_info)
 
         cmd = [self.submit_command, "--parsable"]
@@ -50,11 +55,25 @@ class SlurmClusterManager(JobQueueClusterManager):
         if self.partition:
             cmd.append("--partition=" + self.partition)
         if self.account:
-            cmd.account("--account=" + self.account)
+            cmd.append("--account=" + self.account)
         if self.qos:
-            cmd.extend("--qos=" + self.qos)
+            cmd.append("--qos=" + self.qos)
 
-        if worker_name:
+        if worker_names:
+            env["DASK_GATEWAY_WORKER_NAMES"] = " ".join(worker_names)
+            cmd.append("--array=0-%d" % (len(worker_names) - 1))
+            cpus = self.worker_cores
+            mem = slurm_format_memory(self.worker_memory)
+            log_file = "dask-worker-%A_%a.log"
+            script = "\n".join(
+                [
+                    "#!/bin/sh",
+                    array_worker_name_script("SLURM_ARRAY_TASK_ID"),
+                    self.worker_setup,
+                    self.worker_command,
+                ]
+            )
+        elif worker_name:
             env["DASK_GATEWAY_WORKER_NAME"] = worker_name
             cpus = self.worker_cores
             mem = slurm_format_memory(self.worker_memory)
@@ -85,19 +104,30 @@ class SlurmClusterManager(JobQueueClusterManager):
     def get_stop_cmd_env(self, job_id):
         return [self.cancel_command, job_id], {}
 
+    def get_bulk_stop_cmd_env(self, job_ids):
+        return [self.cancel_command] + list(job_ids), {}
+
     def get_status_cmd_env(self, job_ids):
-        cmd = [self.status_command, "-h", "--job=%s" % ",".join(job_ids), "-o", "%i %t"]
+        cmd = [self.status_command, "-h", "-r", "--job=%s" % ",".join(job_ids)]
+        cmd.extend(["-o", "%i|%t"])
         return cmd, {}
 
     def parse_job_id(self, stdout):
         return stdout.strip()
 
+    def parse_array_job_ids(self, stdout, n):
+        job_id = self.parse_job_id(stdout)
+        return ["%s_%d" % (job_id, i) for i in range(n)]
+
     def parse_job_states(self, stdout):
         running = []
         failed = []
 
         for l in stdout.splitlines():
-            job_id, state = l.split()
+            parts = l.strip().split("|")
+            if len(parts) != 2:
+                continue
+            job_id, state = parts
             if state in ("R", "CG"):
                 running.append(job_id)
             elif state not in ("PD", "CF"):
@@ -1,10 +1,15 @@
 import asyncio
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
-from traitlets import Float, List, Dict, Unicode, Instance, default
+from traitlets import Bool, Float, Integer, List, Dict, Unicode, Instance, default
 
 import kubernetes.client
 import kubernetes.config
+import kubernetes.watch
+from kubernetes.client.rest import ApiException
 from kubernetes.client.models import (
     V1Container,
     V1EnvVar,
@@ -38,9 +43,348 @@ def configure_kubernetes_clients():
         kubernetes.config.load_kube_config()
 
 
+def serialize_kube_object(obj):
+    """Serialize a ``kubernetes.client`` model to a JSON-compatible dict"""
+    # `sanitize_for_serialization` doesn't use any instance state, skip
+    # `__init__` to avoid creating any connection or thread pools
+    serializer = kubernetes.client.ApiClient.__new__(kubernetes.client.ApiClient)
+    return serializer.sanitize_for_serialization(obj)
+
+
+class WorkerPodTemplate(object):
+    """A precomputed, serialized worker pod for a cluster.
+
+    Built once from ``make_pod_spec`` with a placeholder worker name. Creating
+    each worker pod then only copies the few parts of the template that depend
+    on the worker name, skipping construction and serialization of the full
+    pod model.
+    """
+
+    PLACEHOLDER = "__DASK_GATEWAY_WORKER_NAME__"
+
+    __slots__ = ("pod", "env_index")
+
+    def __init__(self, pod):
+        self.pod = serialize_kube_object(pod)
+        env = self.pod["spec"]["containers"][0]["env"]
+        self.env_index = next(
+            i for i, e in enumerate(env) if e["name"] == "DASK_GATEWAY_WORKER_NAME"
+        )
+
+    def fill(self, worker_name):
+        """Create a worker pod (as a dict) from the template"""
+        template = self.pod
+        metadata = dict(template["metadata"])
+        metadata["name"] = "dask-gateway-worker-%s" % worker_name
+        metadata["labels"] = dict(metadata["labels"])
+        metadata["labels"]["worker-name"] = worker_name
+
+        container = dict(template["spec"]["containers"][0])
+        container["env"] = list(container["env"])
+        container["env"][self.env_index] = {
+            "name": "DASK_GATEWAY_WORKER_NAME",
+            "value": worker_name,
+        }
+
+        spec = dict(template["spec"])
+        spec["containers"] = [container] + spec["containers"][1:]
+
+        pod = dict(template)
+        pod["metadata"] = metadata
+        pod["spec"] = spec
+        return pod
+
+
+class KubeAPI(object):
+    """Makes requests using the synchronous kubernetes client.
+
+    Requests are run in a dedicated thread pool, with at most
+    ``max_concurrent_requests`` running at once.
+    """
+
+    def __init__(self, kube_client, namespace, max_concurrent_requests):
+        self.kube_client = kube_client
+        self.namespace = namespace
+        self.executor = ThreadPoolExecutor(max_concurrent_requests)
+
+    async def call(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        func = partial(getattr(self.kube_client, method), *args, **kwargs)
+        return await loop.run_in_executor(self.executor, func)
+
+    async def call_ignore_missing(self, method, *args, **kwargs):
+        try:
+            return await self.call(method, *args, **kwargs)
+        except Exception as exc:
+            # Both the sync and async clients set `status` on api errors
+            if getattr(exc, "status", None) != 404:
+                raise
+
+    async def create_pod(self, pod):
+        await self.call("create_namespaced_pod", self.namespace, pod)
+
+    async def delete_pod(self, name):
+        await self.call_ignore_missing("delete_namespaced_pod", name, self.namespace)
+
+    async def delete_pods(self, label_selector):
+        await self.call(
+            "delete_collection_namespaced_pod",
+            self.namespace,
+            label_selector=label_selector,
+        )
+
+    async def list_pods(self, label_selector):
+        resp = await self.call(
+            "list_namespaced_pod", self.namespace, label_selector=label_selector
+        )
+        return resp.items
+
+    async def create_secret(self, secret):
+        await self.call("create_namespaced_secret", self.namespace, secret)
+
+    async def delete_secret(self, name):
+        await self.call_ignore_missing(
+            "delete_namespaced_secret", name, self.namespace
+        )
+
+    async def list_secrets(self, label_selector):
+        resp = await self.call(
+            "list_namespaced_secret", self.namespace, label_selector=label_selector
+        )
+        return resp.items
+
+    async def close(self):
+        self.executor.shutdown(wait=False)
+
+
+class AsyncKubeAPI(KubeAPI):
+    """Makes requests using the ``kubernetes_asyncio`` client.
+
+    All requests share a single pool of persistent connections to the api
+    server, with at most ``max_concurrent_requests`` running at once.
+    """
+
+    def __init__(self, namespace, max_concurrent_requests):
+        self.namespace = namespace
+        self.max_concurrent_requests = max_concurrent_requests
+        self.semaphore = asyncio.Semaphore(max_concurrent_requests)
+        self.lock = asyncio.Lock()
+        self.kube_client = None
+
+    async def get_client(self):
+        async with self.lock:
+            if self.kube_client is None:
+                import kubernetes_asyncio.client
+                import kubernetes_asyncio.config
+
+                try:
+                    kubernetes_asyncio.config.load_incluster_config()
+                except kubernetes_asyncio.config.ConfigException:
+                    await kubernetes_asyncio.config.load_kube_config()
+
+                Configuration = kubernetes_asyncio.client.Configuration
+                if hasattr(Configuration, "get_default_copy"):
+                    config = Configuration.get_default_copy()
+                else:
+                    config = Configuration()
+                # Size the connection pool to match the concurrency limit
+                config.connection_pool_maxsize = self.max_concurrent_requests
+                api_client = kubernetes_asyncio.client.ApiClient(config)
+                self.kube_client = kubernetes_asyncio.client.CoreV1Api(api_client)
+        return self.kube_client
+
+    async def call(self, method, *args, **kwargs):
+        kube_client = await self.get_client()
+        # Models are built with the synchronous client, serialize them first
+        args = [
+            serialize_kube_object(a) if hasattr(a, "attribute_map") else a
+            for a in args
+        ]
+        async with self.semaphore:
+            return await getattr(kube_client, method)(*args, **kwargs)
+
+    async def close(self):
+        if self.kube_client is not None:
+            await self.kube_client.api_client.close()
+            self.kube_client = None
+
+
+class PodInformer(object):
+    """A local cache of pod phases in a namespace.
+
+    The cache is populated by an initial list, then kept up to date with a
+    single watch on all pods matching ``label_selector``. Coroutines may wait
+    on a pod reaching a phase using ``wait_for_pod`` without polling the
+    kubernetes api.
+
+    Parameters
+    ----------
+    kube_client : CoreV1Api
+        The kubernetes client.
+    namespace : str
+        The namespace to watch.
+    label_selector : str
+        A label selector for pods to watch.
+    log : Logger
+        A logger.
+    watch_timeout : float, optional
+        Timeout for a single watch request. Watches are restarted on timeout.
+    watch_factory : callable, optional
+        Creates a new ``kubernetes.watch.Watch``.
+    """
+
+    # Phases that are never transitioned out of
+    FINAL_PHASES = frozenset(["Succeeded", "Failed", "Deleted"])
+
+    def __init__(
+        self,
+        kube_client,
+        namespace,
+        label_selector,
+        log,
+        watch_timeout=300,
+        watch_factory=kubernetes.watch.Watch,
+    ):
+        self.kube_client = kube_client
+        self.namespace = namespace
+        self.label_selector = label_selector
+        self.log = log
+        self.watch_timeout = watch_timeout
+        self.watch_factory = watch_factory
+        self.pods = {}
+        self.waiters = {}
+        self.watch = None
+
+    def set_phase(self, name, phase):
+        if phase == "Deleted":
+            self.pods.pop(name, None)
+        else:
+            self.pods[name] = phase
+        if phase == "Running" or phase in self.FINAL_PHASES:
+            for fut in self.waiters.pop(name, ()):
+                if not fut.done():
+                    fut.set_result(phase)
+
+    def handle_event(self, event_type, pod):
+        if event_type == "DELETED":
+            phase = "Deleted"
+        else:
+            phase = pod.status.phase
+        self.set_phase(pod.metadata.name, phase)
+
+    async def wait_for_pod(self, name):
+        """Wait for a pod to be ``Running``, or to have stopped.
+
+        Returns the pod phase, one of ``Running``, ``Succeeded``, ``Failed``
+        or ``Deleted``.
+        """
+        phase = self.pods.get(name)
+        if phase == "Running" or phase in self.FINAL_PHASES:
+            return phase
+        fut = asyncio.get_running_loop().create_future()
+        waiters = self.waiters.setdefault(name, [])
+        waiters.append(fut)
+        try:
+            return await fut
+        finally:
+            if fut in waiters:
+                waiters.remove(fut)
+                if not waiters and self.waiters.get(name) is waiters:
+                    del self.waiters[name]
+
+    def _watch_pods(self, loop, resource_version):
+        self.watch = self.watch_factory()
+        for event in self.watch.stream(
+            self.kube_client.list_namespaced_pod,
+            self.namespace,
+            label_selector=self.label_selector,
+            resource_version=resource_version,
+            timeout_seconds=self.watch_timeout,
+        ):
+            if event["type"] == "ERROR":
+                # Most likely the resource version is too old, relist
+                return None
+            loop.call_soon_threadsafe(self.handle_event, event["type"], event["object"])
+            resource_version = event["object"].metadata.resource_version
+        return resource_version
+
+    def watch_pods(self, resource_version):
+        """Run a single watch request in a background thread.
+
+        A daemon thread is used rather than an executor, since a watch may
+        block for up to ``watch_timeout`` after being stopped and shouldn't
+        block process shutdown. Returns the latest resource version, or
+        ``None`` if pods need to be relisted.
+        """
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+
+        def set_result(res, exc):
+            if not fut.done():
+                if exc is not None:
+                    fut.set_exception(exc)
+                else:
+                    fut.set_result(res)
+
+        def run():
+            res = exc = None
+            try:
+                res = self._watch_pods(loop, resource_version)
+            except Exception as e:
+                exc = e
+            try:
+                loop.call_soon_threadsafe(set_result, res, exc)
+            except RuntimeError:
+                # Loop is closed
+                pass
+
+        threading.Thread(target=run, name="dask-gateway-pod-watch", daemon=True).start()
+        return fut
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        resource_version = None
+        try:
+            while True:
+                try:
+                    if resource_version is None:
+                        pods = await loop.run_in_executor(
+                            None,
+                            lambda: self.kube_client.list_namespaced_pod(
+                                self.namespace, label_selector=self.label_selector
+                            ),
+                        )
+                        for pod in pods.items:
+                            self.handle_event("ADDED", pod)
+                        # Pods deleted while not watching won't be in the list
+                        listed = {pod.metadata.name for pod in pods.items}
+                        for name in list(self.pods):
+                            if name not in listed:
+                                self.set_phase(name, "Deleted")
+                        resource_version = pods.metadata.resource_version
+                    resource_version = await self.watch_pods(resource_version)
+                except ApiException as exc:
+                    if exc.status != 410:
+                        self.log.warning("Error watching pods", exc_info=exc)
+                        await asyncio.sleep(1)
+                    resource_version = None
+                except Exception as exc:
+                    self.log.warning("Error watching pods", exc_info=exc)
+                    await asyncio.sleep(1)
+                    resource_version = None
+        finally:
+            if self.watch is not None:
+                self.watch.stop()
+
+
 class KubeClusterManager(ClusterManager):
     """A cluster manager for deploying Dask on a Kubernetes cluster."""
 
+    # All pods for a cluster are deleted in one call by label selector
+    supports_bulk_shutdown = True
+
+    supports_cluster_pool = True
+
     namespace = Unicode(
         "default",
         help="""
@@ -198,6 +542,30 @@ class KubeClusterManager(ClusterManager):
     def _default_scheduler_memory_limit(self):
         return self.scheduler_memory
 
+    use_async_client = Bool(
+        False,
+        help="""
+        Whether to use an asyncio-native kubernetes client for creating and
+        deleting objects.
+
+        By default the synchronous ``kubernetes`` client is used, with
+        requests run in a thread pool. If True, ``kubernetes_asyncio`` is
+        used instead (must be installed), sharing a single pool of
+        persistent connections to the api server.
+        """,
+        config=True,
+    )
+
+    max_concurrent_requests = Integer(
+        32,
+        min=1,
+        help="""
+        The maximum number of concurrent requests to the kubernetes api
+        server for creating and deleting objects.
+        """,
+        config=True,
+    )
+
     # Internal fields
     kube_client = Instance(kubernetes.client.CoreV1Api)
 
@@ -210,6 +578,42 @@ class KubeClusterManager(ClusterManager):
         """Get the absolute paths to the tls cert and key files."""
         return "/etc/dask-credentials/dask.crt", "/etc/dask-credentials/dask.pem"
 
+    @property
+    def kube_api(self):
+        """The client used for creating and deleting objects"""
+        if not hasattr(self, "_kube_api"):
+            if self.use_async_client:
+                self._kube_api = AsyncKubeAPI(
+                    self.namespace, self.max_concurrent_requests
+                )
+            else:
+                self._kube_api = KubeAPI(
+                    self.kube_client, self.namespace, self.max_concurrent_requests
+                )
+        return self._kube_api
+
+    async def close(self):
+        if hasattr(self, "_kube_api"):
+            await self._kube_api.close()
+
+    @property
+    def pod_informer(self):
+        """A shared ``PodInformer`` for all pods created by this manager"""
+        if not hasattr(self, "_pod_informer"):
+            self._pod_informer = PodInformer(
+                self.kube_client, self.namespace, self.get_selector_for(), self.log
+            )
+            self.task_pool.create_background_task(self._pod_informer.run())
+        return self._pod_informer
+
+    async def wait_for_pod_running(self, pod_name):
+        phase = await self.pod_informer.wait_for_pod(pod_name)
+        if phase != "Running":
+            raise Exception(
+                "Pod %s failed to start (phase %s), see logs for more information"
+                % (pod_name, phase)
+            )
+
     @property
     def worker_command(self):
         """The full command (with args) to launch a dask worker"""
@@ -226,6 +630,16 @@ class KubeClusterManager(ClusterManager):
         """The full command (with args) to launch a dask scheduler"""
         return [self.scheduler_cmd]
 
+    def get_selector_for(self, cluster_name=None):
+        """A label selector for all objects created by the gateway, optionally
+        restricted to a single cluster"""
+        selector = "app.kubernetes.io/name=%s" % self.common_labels.get(
+            "app.kubernetes.io/name", "dask-gateway"
+        )
+        if cluster_name is not None:
+            selector += ",cluster-name=%s" % cluster_name
+        return selector
+
     def get_labels_for(self, cluster_info, component, worker_name=None):
         labels = self.common_labels.copy()
         labels.update(
@@ -325,6 +739,24 @@ class KubeClusterManager(ClusterManager):
 
         return pod
 
+    def make_worker_pod(self, cluster_info, tls_secret, worker_name):
+        """Create a serialized worker pod.
+
+        Uses a pod template cached per cluster, so the full pod spec is only
+        constructed once per cluster.
+        """
+        if not hasattr(self, "worker_pod_templates"):
+            self.worker_pod_templates = {}
+        template = self.worker_pod_templates.get(cluster_info.cluster_name)
+        if template is None:
+            template = WorkerPodTemplate(
+                self.make_pod_spec(
+                    cluster_info, tls_secret, worker_name=WorkerPodTemplate.PLACEHOLDER
+                )
+            )
+            self.worker_pod_templates[cluster_info.cluster_name] = template
+        return template.fill(worker_name)
+
     async def start_cluster(self, cluster_info):
         tls_secret = self.make_secret_spec(cluster_info)
 
@@ -332,58 +764,68 @@ class KubeClusterManager(ClusterManager):
 
         self.log.debug("Creating secret %s", secret_name)
 
-        loop = asyncio.get_running_loop()
-        await loop.run_in_executor(
-            None, self.kube_client.create_namespaced_secret, self.namespace, tls_secret
-        )
+        await self.kube_api.create_secret(tls_secret)
         yield {"secret_name": secret_name}
 
         pod = self.make_pod_spec(cluster_info, secret_name)
 
         self.log.debug("Starting pod %s", pod.metadata.name)
 
-        await loop.run_in_executor(
-            None, self.kube_client.create_namespaced_pod, self.namespace, pod
-        )
+        await self.kube_api.create_pod(pod)
 
         yield {"secret_name": secret_name, "pod_name": pod.metadata.name}
 
-    async def stop_cluster(self, cluster_info, cluster_state):
-        loop = asyncio.get_running_loop()
+        await self.wait_for_pod_running(pod.metadata.name)
 
-        pod_name = cluster_state.get("pod_name")
-        if pod_name is not None:
-            await loop.run_in_executor(
-                None, self.kube_client.delete_namespaced_pod, pod_name, self.namespace
-            )
+    async def stop_cluster(self, cluster_info, cluster_state):
+        if hasattr(self, "worker_pod_templates"):
+            self.worker_pod_templates.pop(cluster_info.cluster_name, None)
+        # Delete the scheduler and all worker pods in one call
+        await self.kube_api.delete_pods(
+            self.get_selector_for(cluster_info.cluster_name)
+        )
 
         secret_name = cluster_state.get("secret_name")
         if secret_name is not None:
-            await loop.run_in_executor(
-                None,
-                self.kube_client.delete_namespaced_secret,
-                secret_name,
-                self.namespace,
-            )
+            await self.kube_api.delete_secret(secret_name)
+
+    async def cleanup_orphans(self, active_clusters):
+        selector = self.get_selector_for()
+        pods, secrets = await asyncio.gather(
+            self.kube_api.list_pods(selector), self.kube_api.list_secrets(selector)
+        )
+
+        def is_orphan(obj):
+            name = (obj.metadata.labels or {}).get("cluster-name")
+            return name is not None and name not in active_clusters
+
+        orphans = {p.metadata.labels["cluster-name"] for p in pods if is_orphan(p)}
+        for name in orphans:
+            self.log.info("Removing orphaned pods for cluster %s", name)
+            await self.kube_api.delete_pods(self.get_selector_for(name))
+
+        orphan_secrets = [s.metadata.name for s in secrets if is_orphan(s)]
+        for name in orphan_secrets:
+            self.log.info("Removing orphaned secret %s", name)
+            await self.kube_api.delete_secret(name)
+
+        return len(orphans) + len(orphan_secrets)
 
     async def start_worker(self, worker_name, cluster_info, cluster_state):
         secret_name = cluster_state["secret_name"]
 
-        pod = self.make_pod_spec(cluster_info, secret_name, worker_name)
+        pod = self.make_worker_pod(cluster_info, secret_name, worker_name)
+        pod_name = pod["metadata"]["name"]
 
-        self.log.debug("Starting pod %s", pod.metadata.name)
+        self.log.debug("Starting pod %s", pod_name)
 
-        loop = asyncio.get_running_loop()
-        await loop.run_in_executor(
-            None, self.kube_client.create_namespaced_pod, self.namespace, pod
-        )
+        await self.kube_api.create_pod(pod)
 
-        yield {"pod_name": pod.metadata.name}
+        yield {"pod_name": pod_name}
+
+        await self.wait_for_pod_running(pod_name)
 
     async def stop_worker(self, worker_name, worker_state, cluster_info, cluster_state):
         pod_name = worker_state.get("pod_name")
         if pod_name is not None:
-            loop = asyncio.get_running_loop()
-            await loop.run_in_executor(
-                None, self.kube_client.delete_namespaced_pod, pod_name, self.namespace
-            )
+            await self.kube_api.delete_pod(pod_name)
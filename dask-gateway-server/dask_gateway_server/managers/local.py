@@ -1,14 +1,17 @@
 import asyncio
 import errno
+import json
 import os
 import pwd
 import shutil
 import signal
 import sys
+from collections import deque
 
 from traitlets import List, Unicode, Integer, default
 
 from .base import ClusterManager
+from ..utils import cancel_task
 
 
 __all__ = ("LocalClusterManager", "UnsafeLocalClusterManager")
@@ -109,6 +112,27 @@ class LocalClusterManager(ClusterManager):
         config=True,
     )
 
+    # Whether workers can be started before being assigned to a cluster. Only
+    # possible if workers don't run as the requesting user, see
+    # ``worker_pool_size``.
+    supports_worker_pool = False
+
+    worker_pool_size = Integer(
+        0,
+        min=0,
+        help="""
+        The number of parked workers to keep in a warm pool.
+
+        Parked workers are worker processes that have started up, but wait to
+        be assigned to a cluster before connecting to its scheduler. New
+        workers are assigned from the pool when possible, skipping most of
+        the worker startup time. The pool is refilled in the background.
+        Only used if ``supports_worker_pool`` is set. Set to 0 to disable
+        (default).
+        """,
+        config=True,
+    )
+
     pid = Integer(0, help="The pid of the scheduler process")
 
     @default("clusters_directory")
@@ -233,6 +257,80 @@ class LocalClusterManager(ClusterManager):
                 os.close(fd)
         return proc.pid
 
+    async def start_parked_worker(self):
+        """Start a worker process that waits on stdin for a cluster"""
+        os.makedirs(self.clusters_directory, 0o700, exist_ok=True)
+        log_path = os.path.join(self.clusters_directory, "worker-pool.log")
+        env = dict(self.environment)
+        for key in self.inherited_environment:
+            if key in os.environ:
+                env[key] = os.environ[key]
+        fd = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *self.worker_command.split(),
+                "--parked",
+                cwd=self.clusters_directory,
+                start_new_session=True,
+                env=env,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=fd,
+                stderr=asyncio.subprocess.STDOUT,
+            )
+        finally:
+            os.close(fd)
+        return proc
+
+    def refill_worker_pool(self):
+        """Start parked workers in the background until the pool is full"""
+        if not self.supports_worker_pool or not self.worker_pool_size:
+            return
+        if not hasattr(self, "worker_pool"):
+            self.worker_pool = deque()
+            self.worker_pool_task = None
+        if self.worker_pool_task is None or self.worker_pool_task.done():
+            self.worker_pool_task = self.task_pool.create_background_task(
+                self._refill_worker_pool()
+            )
+
+    async def _refill_worker_pool(self):
+        while len(self.worker_pool) < self.worker_pool_size:
+            try:
+                proc = await self.start_parked_worker()
+            except Exception as exc:
+                self.log.warning("Failed to start parked worker", exc_info=exc)
+                return
+            self.worker_pool.append(proc)
+
+    async def assign_parked_worker(self, env, name, cluster_info):
+        """Assign a parked worker from the pool to a cluster.
+
+        Returns the worker's pid, or None if no parked workers are available.
+        """
+        self.refill_worker_pool()
+        pool = getattr(self, "worker_pool", ())
+        workdir = self.get_working_directory(cluster_info)
+        msg = {
+            "env": env,
+            "cwd": workdir,
+            "log_path": os.path.join(self.get_logs_directory(workdir), name + ".log"),
+        }
+        line = json.dumps(msg).encode("utf8") + b"\n"
+        while pool:
+            proc = pool.popleft()
+            if proc.returncode is not None:
+                continue
+            try:
+                proc.stdin.write(line)
+                await proc.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                continue
+            finally:
+                proc.stdin.close()
+            self.refill_worker_pool()
+            return proc.pid
+        return None
+
     async def stop_process(self, pid):
         methods = [
             ("SIGINT", signal.SIGINT, self.sigint_timeout),
@@ -252,6 +350,8 @@ class LocalClusterManager(ClusterManager):
 
     async def start_cluster(self, cluster_info):
         self.create_working_directory(cluster_info)
+        # Workers are needed once the cluster is up, start parking some now
+        self.refill_worker_pool()
         pid = await self.start_process(
             self.scheduler_command.split(),
             self.get_env(cluster_info),
@@ -270,9 +370,10 @@ class LocalClusterManager(ClusterManager):
         cmd = self.worker_command.split()
         env = self.get_env(cluster_info)
         env["DASK_GATEWAY_WORKER_NAME"] = worker_name
-        pid = await self.start_process(
-            cmd, env, "worker-%s" % worker_name, cluster_info
-        )
+        name = "worker-%s" % worker_name
+        pid = await self.assign_parked_worker(env, name, cluster_info)
+        if pid is None:
+            pid = await self.start_process(cmd, env, name, cluster_info)
         yield {"pid": pid}
 
     async def stop_worker(self, worker_name, worker_state, cluster_info, cluster_state):
@@ -281,6 +382,25 @@ class LocalClusterManager(ClusterManager):
             return
         await self.stop_process(pid)
 
+    async def close(self):
+        if not hasattr(self, "worker_pool"):
+            return
+        if self.worker_pool_task is not None:
+            await cancel_task(self.worker_pool_task)
+        pool = list(self.worker_pool)
+        self.worker_pool.clear()
+        # Closing stdin signals parked workers to exit
+        for proc in pool:
+            proc.stdin.close()
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(p.wait() for p in pool)), self.sigint_timeout
+            )
+        except asyncio.TimeoutError:
+            for proc in pool:
+                if proc.returncode is None:
+                    proc.kill()
+
 
 class UnsafeLocalClusterManager(LocalClusterManager):
     """A version of LocalClusterManager that doesn't set permissions.
@@ -289,6 +409,10 @@ class UnsafeLocalClusterManager(LocalClusterManager):
     same level of permission as the gateway.
     """
 
+    supports_cluster_pool = True
+
+    supports_worker_pool = True
+
     def make_preexec_fn(self, cluster_info):
         workdir = self.get_working_directory(cluster_info)
 
@@ -1,11 +1,37 @@
+import asyncio
+import hashlib
 import os
+import threading
+import uuid
+from collections import OrderedDict
 from contextlib import contextmanager
+from functools import partial
+from weakref import WeakValueDictionary
 
 import skein
 from tornado import gen
-from traitlets import Unicode, Dict, Instance, default
+from traitlets import Unicode, Dict, Float, Instance, Integer, default
 
 from .base import ClusterManager
+from ..utils import cancel_task
+
+
+def local_path(source):
+    """The local path for a resource source, or None if not a local file"""
+    if source.startswith("file://"):
+        return source[len("file://") :]
+    elif "://" in source:
+        return None
+    return source
+
+
+def sha256_file(path, blocksize=2 ** 20):
+    """Compute the sha256 hexdigest of a file's contents"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(partial(f.read, blocksize), b""):
+            h.update(block)
+    return h.hexdigest()
 
 
 class YarnClusterManager(ClusterManager):
@@ -59,6 +85,34 @@ class YarnClusterManager(ClusterManager):
         config=True,
     )
 
+    staging_cache_directory = Unicode(
+        "",
+        help="""
+        An HDFS directory in which to cache local files from ``localize_files``.
+
+        If set, local files are uploaded to this directory once per unique
+        content hash, and all applications then reference the uploaded copy as
+        a ``public`` resource. This avoids uploading large files (e.g.
+        conda-packed environments) for every cluster, and lets YARN nodes
+        share a single localized copy between applications.
+
+        Must be an HDFS path (e.g. ``hdfs:///dask-gateway/staging``). For
+        ``public`` resources to be used, the directory and all its parents
+        must be world readable and executable. If empty (default), no caching
+        is done.
+        """,
+        config=True,
+    )
+
+    hdfs_command = Unicode(
+        "hdfs",
+        help="""
+        The path to the ``hdfs`` executable, used for uploading files to
+        ``staging_cache_directory``.
+        """,
+        config=True,
+    )
+
     worker_setup = Unicode(
         "", help="Script to run before dask worker starts.", config=True
     )
@@ -67,8 +121,58 @@ class YarnClusterManager(ClusterManager):
         "", help="Script to run before dask scheduler starts.", config=True
     )
 
+    app_client_cache_max_size = Integer(
+        10,
+        help="""
+        The max size of the cache for application clients.
+
+        A larger cache will result in improved performance, but will also use
+        more resources (one open connection per cached application).
+        """,
+        config=True,
+    )
+
+    container_status_poll_interval = Float(
+        1.0,
+        help="""
+        The interval (in seconds) in which to poll for the states of starting
+        worker containers.
+
+        Container states are polled with a single request per application,
+        for all pending workers in that application.
+        """,
+        config=True,
+    )
+
+    worker_start_concurrency = Integer(
+        10,
+        min=1,
+        help="""
+        The max number of worker containers to request concurrently when
+        starting many workers at once.
+
+        Containers are requested in chunks of this size, with the state of
+        each chunk saved before the next is requested.
+        """,
+        config=True,
+    )
+
+    app_status_poll_interval = Float(
+        1.0,
+        help="""
+        The interval (in seconds) in which to poll for the states of starting
+        applications.
+
+        Application states are polled with a single request for all starting
+        applications.
+        """,
+        config=True,
+    )
+
     supports_bulk_shutdown = True
 
+    supports_bulk_start = True
+
     skein_client = Instance(klass="skein.Client", help="The skein client to use")
 
     @default("skein_client")
@@ -85,12 +189,159 @@ class YarnClusterManager(ClusterManager):
         )
 
     def _get_app_client(self, cluster_info, cluster_state):
-        # TODO: maybe keep an LRU cache of these?
-        return skein.ApplicationClient(
-            cluster_state["app_address"],
-            cluster_state["app_id"],
-            security=self._get_security(cluster_info),
-        )
+        """Get an application client for a cluster.
+
+        Clients are kept in an LRU cache, to avoid opening a new connection
+        for every request.
+        """
+        if not hasattr(self, "app_client_cache"):
+            self.app_client_cache = OrderedDict()
+        key = cluster_info.cluster_name
+        app = self.app_client_cache.get(key)
+        if app is None:
+            app = skein.ApplicationClient(
+                cluster_state["app_address"],
+                cluster_state["app_id"],
+                security=self._get_security(cluster_info),
+            )
+            self.app_client_cache[key] = app
+            if len(self.app_client_cache) > self.app_client_cache_max_size:
+                self.app_client_cache.popitem(last=False)
+        else:
+            self.app_client_cache.move_to_end(key)
+        return app
+
+    def _get_application_reports(self, app_ids):
+        """Get reports for all ``app_ids`` that are no longer starting.
+
+        Reports for all live applications are fetched in a single request.
+        Any application missing from those has completed, and is fetched
+        individually."""
+        live = {
+            r.id: r
+            for r in self.skein_client.get_applications(
+                states=["NEW", "NEW_SAVING", "SUBMITTED", "ACCEPTED", "RUNNING"]
+            )
+        }
+        out = {}
+        for app_id in app_ids:
+            report = live.get(app_id)
+            if report is None:
+                report = self.skein_client.application_report(app_id)
+            if str(report.state) in {"RUNNING", "FAILED", "KILLED", "FINISHED"}:
+                out[app_id] = report
+        return out
+
+    async def app_state_tracker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.apps_to_track:
+                self.app_tracker_wakeup.clear()
+                await self.app_tracker_wakeup.wait()
+                continue
+
+            await asyncio.sleep(self.app_status_poll_interval)
+
+            app_ids = list(self.apps_to_track)
+            if not app_ids:
+                continue
+            self.log.debug("Polling status of %d applications", len(app_ids))
+            try:
+                reports = await loop.run_in_executor(
+                    None, self._get_application_reports, app_ids
+                )
+            except Exception as exc:
+                self.log.warning("Failed to get application reports", exc_info=exc)
+                continue
+            for app_id, report in reports.items():
+                fut = self.apps_to_track.pop(app_id, None)
+                if fut is not None and not fut.done():
+                    fut.set_result(report)
+
+    def wait_for_application(self, app_id):
+        """Returns a future that resolves to the application report once the
+        application is running, or has completed."""
+        if not hasattr(self, "app_tracker"):
+            self.apps_to_track = WeakValueDictionary()
+            self.app_tracker_wakeup = asyncio.Event()
+            self.app_tracker = self.task_pool.create_background_task(
+                self.app_state_tracker()
+            )
+
+        fut = self.apps_to_track.get(app_id)
+        if fut is None:
+            loop = asyncio.get_running_loop()
+            fut = self.apps_to_track[app_id] = loop.create_future()
+            self.app_tracker_wakeup.set()
+        return fut
+
+    def _get_running_containers(self, app, container_ids):
+        """Split ``container_ids`` into those that are running, and those that
+        have stopped (or are unknown to the application master)"""
+        live = {
+            c.id: str(c.state)
+            for c in app.get_containers(
+                services=["dask.worker"], states=["WAITING", "REQUESTED", "RUNNING"]
+            )
+        }
+        running = [c for c in container_ids if live.get(c) == "RUNNING"]
+        failed = [c for c in container_ids if c not in live]
+        return running, failed
+
+    async def container_state_tracker(self, cluster_info, cluster_state):
+        """Resolve the pending container futures for a single cluster.
+
+        Runs until no containers are pending for the cluster."""
+        loop = asyncio.get_running_loop()
+        name = cluster_info.cluster_name
+        pending = self.pending_containers[name]
+        try:
+            while pending:
+                await asyncio.sleep(self.container_status_poll_interval)
+                # Only containers added before the request was sent are
+                # guaranteed to be known to the application master
+                container_ids = list(pending)
+                app = self._get_app_client(cluster_info, cluster_state)
+                try:
+                    running, failed = await loop.run_in_executor(
+                        None, self._get_running_containers, app, container_ids
+                    )
+                except Exception as exc:
+                    self.log.warning(
+                        "Failed to get container states for cluster %s",
+                        name,
+                        exc_info=exc,
+                    )
+                    continue
+                for container_ids, ok in [(running, True), (failed, False)]:
+                    for container_id in container_ids:
+                        fut = pending.pop(container_id, None)
+                        if fut is not None and not fut.done():
+                            fut.set_result(ok)
+        finally:
+            if self.container_trackers.get(name) is asyncio.current_task():
+                del self.container_trackers[name]
+                del self.pending_containers[name]
+
+    def is_container_running(self, container_id, cluster_info, cluster_state):
+        """Returns a future that resolves to True once the container is
+        running, or False if it fails to start."""
+        if not hasattr(self, "container_trackers"):
+            self.container_trackers = {}
+            self.pending_containers = {}
+
+        name = cluster_info.cluster_name
+        if name not in self.container_trackers:
+            self.pending_containers[name] = WeakValueDictionary()
+            self.container_trackers[name] = self.task_pool.create_background_task(
+                self.container_state_tracker(cluster_info, cluster_state)
+            )
+
+        pending = self.pending_containers[name]
+        fut = pending.get(container_id)
+        if fut is None:
+            fut = pending[container_id] = asyncio.get_running_loop().create_future()
+        return fut
 
     @contextmanager
     def temp_write_credentials(self, cluster_info):
@@ -121,6 +372,134 @@ class YarnClusterManager(ClusterManager):
                 if os.path.exists(path):
                     os.unlink(path)
 
+    def get_hdfs_env(self):
+        env = dict(os.environ)
+        if self.principal and self.keytab:
+            # Use a ticket cache private to the gateway
+            env["KRB5CCNAME"] = "FILE:" + os.path.join(self.temp_dir, "krb5cc_hdfs")
+        return env
+
+    async def run_command(self, cmd):
+        """Run ``cmd``, returning (returncode, stdout, stderr)"""
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            env=self.get_hdfs_env(),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await proc.communicate()
+        return (
+            proc.returncode,
+            stdout.decode("utf8", "replace"),
+            stderr.decode("utf8", "replace"),
+        )
+
+    async def hdfs(self, *args, check=True):
+        """Run ``hdfs dfs`` with ``args``, returning stdout"""
+        code, stdout, stderr = await self.run_command(
+            [self.hdfs_command, "dfs"] + list(args)
+        )
+        if check and code != 0:
+            raise Exception(
+                "Command `hdfs dfs %s` failed with returncode %d, stderr: %s"
+                % (" ".join(args), code, stderr)
+            )
+        return stdout if code == 0 else None
+
+    async def hdfs_login(self):
+        """Obtain a kerberos ticket for ``hdfs`` commands, if configured"""
+        if self.principal and self.keytab:
+            code, _, stderr = await self.run_command(
+                ["kinit", "-kt", self.keytab, self.principal]
+            )
+            if code != 0:
+                raise Exception("Failed to obtain kerberos ticket: %s" % stderr)
+
+    async def stage_file(self, path, type):
+        """Upload a local file to ``staging_cache_directory``, returning a
+        ``skein.File`` referencing the cached copy.
+
+        Files are stored by content hash, so each unique file is only uploaded
+        once, even across gateway restarts."""
+        digest = await asyncio.get_running_loop().run_in_executor(
+            None, sha256_file, path
+        )
+        root = self.staging_cache_directory.rstrip("/")
+        if "://" not in root:
+            root = "hdfs://" + root
+        directory = "%s/%s" % (root, digest)
+        target = "%s/%s" % (directory, os.path.basename(path))
+
+        stat = await self.hdfs("-stat", "%b %Y", target, check=False)
+        if stat is None:
+            self.log.info("Uploading %s to staging cache at %s", path, target)
+            temp = "%s.%s.tmp" % (target, uuid.uuid4().hex)
+            await self.hdfs("-mkdir", "-p", directory)
+            await self.hdfs("-chmod", "755", directory)
+            await self.hdfs("-put", path, temp)
+            await self.hdfs("-chmod", "644", temp)
+            # Renames are atomic, if another process uploaded the same file
+            # concurrently only one of them succeeds
+            if await self.hdfs("-mv", temp, target, check=False) is None:
+                await self.hdfs("-rm", "-f", temp, check=False)
+            stat = await self.hdfs("-stat", "%b %Y", target)
+        size, timestamp = stat.split()
+
+        # Providing the size and timestamp skips validating the file on submit
+        return skein.File(
+            source=target,
+            type=type,
+            visibility="public",
+            size=int(size),
+            timestamp=int(timestamp),
+        )
+
+    async def get_localize_files(self):
+        """Get the resources to localize for each container.
+
+        If ``staging_cache_directory`` is set, local files are replaced with
+        their cached copies, uploading them if needed."""
+        files = {
+            k: skein.File.from_dict(v) if isinstance(v, dict) else v
+            for k, v in self.localize_files.items()
+        }
+        if not self.staging_cache_directory:
+            return files
+
+        if not hasattr(self, "staging_cache"):
+            self.staging_cache = {}
+            self.staging_lock = asyncio.Lock()
+
+        async with self.staging_lock:
+            logged_in = False
+            for name, file in files.items():
+                if not isinstance(file, skein.File):
+                    file = skein.File(file)
+                path = local_path(file.source)
+                if path is None or not os.path.isfile(path):
+                    continue
+                # Files are only rehashed if they've changed
+                st = os.stat(path)
+                key = (path, str(file.type), st.st_size, st.st_mtime_ns)
+                cached = self.staging_cache.get(key)
+                if cached is None:
+                    try:
+                        if not logged_in:
+                            await self.hdfs_login()
+                            logged_in = True
+                        cached = await self.stage_file(path, file.type)
+                    except Exception as exc:
+                        self.log.warning(
+                            "Failed to cache %s in the staging directory, "
+                            "uploading it with the application instead",
+                            path,
+                            exc_info=exc,
+                        )
+                        continue
+                    self.staging_cache[key] = cached
+                files[name] = cached
+        return files
+
     def get_worker_args(self):
         return [
             "--nthreads",
@@ -139,12 +518,8 @@ class YarnClusterManager(ClusterManager):
         """The full command (with args) to launch a dask scheduler"""
         return self.scheduler_cmd
 
-    def _build_specification(self, cluster_info, cert_path, key_path):
-        files = {
-            k: skein.File.from_dict(v) if isinstance(v, dict) else v
-            for k, v in self.localize_files.items()
-        }
-
+    def _build_specification(self, cluster_info, cert_path, key_path, files):
+        files = dict(files)
         files["dask.crt"] = cert_path
         files["dask.pem"] = key_path
 
@@ -188,32 +563,38 @@ class YarnClusterManager(ClusterManager):
     async def start_cluster(self, cluster_info):
         loop = gen.IOLoop.current()
 
+        files = await self.get_localize_files()
+
         with self.temp_write_credentials(cluster_info) as (cert_path, key_path):
-            spec = self._build_specification(cluster_info, cert_path, key_path)
+            spec = self._build_specification(cluster_info, cert_path, key_path, files)
             app_id = await loop.run_in_executor(None, self.skein_client.submit, spec)
 
         yield {"app_id": app_id}
 
         # Wait for application to start
-        while True:
-            report = await loop.run_in_executor(
-                None, self.skein_client.application_report, app_id
+        report = await self.wait_for_application(app_id)
+        if str(report.state) != "RUNNING":
+            raise Exception(
+                "Application %s failed to start, check "
+                "application logs for more information" % app_id
             )
-            state = str(report.state)
-            if state in {"FAILED", "KILLED", "FINISHED"}:
-                raise Exception(
-                    "Application %s failed to start, check "
-                    "application logs for more information" % app_id
-                )
-            elif state == "RUNNING":
-                app_address = "%s:%d" % (report.host, report.port)
-                break
-            else:
-                await gen.sleep(1)
+        app_address = "%s:%d" % (report.host, report.port)
 
         yield {"app_id": app_id, "app_address": app_address}
 
     async def stop_cluster(self, cluster_info, cluster_state):
+        name = cluster_info.cluster_name
+        if hasattr(self, "app_client_cache"):
+            self.app_client_cache.pop(name, None)
+        if hasattr(self, "container_trackers"):
+            tracker = self.container_trackers.pop(name, None)
+            if tracker is not None:
+                await cancel_task(tracker)
+            pending = self.pending_containers.pop(name, {})
+            for fut in pending.values():
+                if not fut.done():
+                    fut.set_result(False)
+
         app_id = cluster_state.get("app_id")
         if app_id is None:
             return
@@ -221,24 +602,101 @@ class YarnClusterManager(ClusterManager):
             None, self.skein_client.kill_application, app_id
         )
 
-    def _start_worker(self, worker_name, cluster_info, cluster_state):
-        app = self._get_app_client(cluster_info, cluster_state)
+    def _start_worker(self, app, worker_name):
         return app.add_container(
             "dask.worker", env={"DASK_GATEWAY_WORKER_NAME": worker_name}
         )
 
     async def start_worker(self, worker_name, cluster_info, cluster_state):
+        app = self._get_app_client(cluster_info, cluster_state)
         container = await gen.IOLoop.current().run_in_executor(
-            None, self._start_worker, worker_name, cluster_info, cluster_state
+            None, self._start_worker, app, worker_name
         )
         yield {"container_id": container.id}
-        # TODO: wait for worker to start before returning. To reduce costs,
-        # should have a single periodic task per application that fetches
-        # container states for if there are pending workers and notifies the
-        # corresponding `start_worker` coroutine of any updates.
 
-    def _stop_worker(self, container_id, cluster_info, cluster_state):
+        if not await self.is_container_running(
+            container.id, cluster_info, cluster_state
+        ):
+            raise Exception(
+                "Container %s for worker %s failed, see logs for more information"
+                % (container.id, worker_name)
+            )
+
+    def _start_container(self, app, worker_name, created, cancelled):
+        container = self._start_worker(app, worker_name)
+        created[worker_name] = container.id
+        if cancelled.is_set():
+            # Startup was cancelled before this container could be saved
+            self._stop_worker(app, container.id)
+        return container
+
+    def _stop_containers(self, app, container_ids):
+        for container_id in container_ids:
+            try:
+                self._stop_worker(app, container_id)
+            except Exception as exc:
+                self.log.warning(
+                    "Failed to stop container %s", container_id, exc_info=exc
+                )
+
+    async def start_workers(self, worker_names, cluster_info, cluster_state):
+        # Containers are requested using a single application client, a chunk
+        # at a time. Each chunk's states are yielded before requesting the
+        # next, so created containers are saved (and can be stopped) early.
         app = self._get_app_client(cluster_info, cluster_state)
+        loop = gen.IOLoop.current()
+        created = {}
+        saved = set()
+        cancelled = threading.Event()
+        started = {}
+        n = self.worker_start_concurrency
+        try:
+            for i in range(0, len(worker_names), n):
+                chunk = worker_names[i : i + n]
+                results = await asyncio.gather(
+                    *(
+                        loop.run_in_executor(
+                            None, self._start_container, app, name, created, cancelled
+                        )
+                        for name in chunk
+                    ),
+                    return_exceptions=True,
+                )
+                states = {}
+                for name, res in zip(chunk, results):
+                    if isinstance(res, Exception):
+                        states[name] = res
+                    else:
+                        states[name] = {"container_id": res.id}
+                        started[name] = res.id
+                saved.update(chunk)
+                yield states
+        finally:
+            # If interrupted, any containers created but not yet saved are
+            # stopped, including those still being requested
+            cancelled.set()
+            orphans = [c for name, c in created.items() if name not in saved]
+            if orphans:
+                loop.run_in_executor(None, self._stop_containers, app, orphans)
+
+        results = await asyncio.gather(
+            *(
+                self.is_container_running(c, cluster_info, cluster_state)
+                for c in started.values()
+            )
+        )
+        failed = {
+            name: Exception(
+                "Container %s for worker %s failed, see logs for more information"
+                % (container_id, name)
+            )
+            for (name, container_id), ok in zip(started.items(), results)
+            if not ok
+        }
+        if failed:
+            yield failed
+
+    def _stop_worker(self, app, container_id):
         try:
             app.kill_container(container_id)
         except ValueError:
@@ -248,6 +706,7 @@ class YarnClusterManager(ClusterManager):
         container_id = worker_state.get("container_id")
         if container_id is None:
             return
+        app = self._get_app_client(cluster_info, cluster_state)
         return await gen.IOLoop.current().run_in_executor(
-            None, self._stop_worker, container_id, cluster_info, cluster_state
+            None, self._stop_worker, app, container_id
         )
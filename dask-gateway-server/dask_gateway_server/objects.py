@@ -2,8 +2,14 @@ import asyncio
 import base64
 import enum
 import json
+import logging
+import queue
+import threading
 import time
 import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import partial
 
 from cryptography.fernet import MultiFernet, Fernet
 from sqlalchemy import (
@@ -17,13 +23,19 @@ from sqlalchemy import (
     LargeBinary,
     TypeDecorator,
     create_engine,
+    and_,
     bindparam,
     select,
     event,
+    inspect,
 )
 from sqlalchemy.pool import StaticPool
 
-from .tls import new_keypair
+from .tls import KeypairPool
+
+
+# The user owning all unclaimed clusters in the cluster pool
+CLUSTER_POOL_USER = "dask-gateway-pool"
 
 
 def timestamp():
@@ -125,9 +137,13 @@ clusters = Table(
     Column("id", Integer, primary_key=True, autoincrement=True),
     Column("name", Unicode(255), nullable=False, unique=True),
     Column(
-        "user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+        "user_id",
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
     ),
-    Column("status", IntEnum(ClusterStatus), nullable=False),
+    Column("status", IntEnum(ClusterStatus), nullable=False, index=True),
     Column("state", JSON, nullable=False),
     Column("token", BINARY(140), nullable=False, unique=True),
     Column("scheduler_address", Unicode(255), nullable=False),
@@ -135,7 +151,7 @@ clusters = Table(
     Column("api_address", Unicode(255), nullable=False),
     Column("tls_credentials", LargeBinary, nullable=False),
     Column("start_time", Integer, nullable=False),
-    Column("stop_time", Integer, nullable=True),
+    Column("stop_time", Integer, nullable=True, index=True),
 )
 
 workers = Table(
@@ -143,8 +159,13 @@ workers = Table(
     metadata,
     Column("id", Integer, primary_key=True, autoincrement=True),
     Column("name", Unicode(255), nullable=False),
-    Column("cluster_id", ForeignKey("clusters.id", ondelete="CASCADE"), nullable=False),
-    Column("status", IntEnum(WorkerStatus), nullable=False),
+    Column(
+        "cluster_id",
+        ForeignKey("clusters.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    ),
+    Column("status", IntEnum(WorkerStatus), nullable=False, index=True),
     Column("state", JSON, nullable=False),
     Column("start_time", Integer, nullable=False),
     Column("stop_time", Integer, nullable=True),
@@ -161,17 +182,335 @@ def register_foreign_keys(engine):
         cursor.close()
 
 
+def create_missing_indexes(engine):
+    """Create any indexes missing from an existing database.
+
+    ``metadata.create_all`` only creates indexes when creating their table, so
+    databases created by older versions need them added separately. Existing
+    tables and data are left untouched.
+
+    Returns a list of the names of any created indexes.
+    """
+    inspector = inspect(engine)
+    created = []
+    for table in metadata.sorted_tables:
+        existing = {i["name"] for i in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            if index.name not in existing:
+                index.create(engine)
+                created.append(index.name)
+    return created
+
+
 def is_in_memory_db(url):
     return url in ("sqlite://", "sqlite:///:memory:")
 
 
+class DatabaseWriter(object):
+    """Serializes database writes through a single background thread.
+
+    Writes are executed in the order they're submitted, each in its own
+    transaction unless submitted with ``transaction=False``.
+
+    Parameters
+    ----------
+    engine : sqlalchemy.engine.Engine
+        The database engine to use.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(
+            target=self._run, name="dask-gateway-db-writer", daemon=True
+        )
+        self.thread.start()
+
+    def submit(self, func, future=None, transaction=True):
+        """Queue ``func(conn)`` to run in a transaction.
+
+        Returns a ``concurrent.futures.Future`` of the result. If ``future`` is
+        provided, it's used instead of creating a new one. If ``transaction``
+        is False, ``func`` is passed the engine instead, and manages its own
+        transactions.
+        """
+        if future is None:
+            future = Future()
+        self.queue.put((func, future, transaction))
+        return future
+
+    def close(self):
+        """Stop the writer thread once all queued writes are complete.
+
+        Returns a ``concurrent.futures.Future`` that completes once the thread
+        has exited.
+        """
+        future = Future()
+        self.queue.put((None, future, False))
+        return future
+
+    def _run(self):
+        while True:
+            func, future, transaction = self.queue.get()
+            if func is None:
+                future.set_result(None)
+                break
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if transaction:
+                    with self.engine.begin() as conn:
+                        result = func(conn)
+                else:
+                    result = func(self.engine)
+            except BaseException as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+
+class Insert(object):
+    """A pending insert of ``obj`` into ``table``.
+
+    ``get_values`` is called at write time, so values depending on other rows
+    (e.g. a foreign key) can be resolved after those rows are written.
+    ``on_insert`` is called with ``obj`` once the insert is committed.
+    """
+
+    __slots__ = ("table", "obj", "get_values", "on_insert")
+
+    def __init__(self, table, obj, get_values, on_insert=None):
+        self.table = table
+        self.obj = obj
+        self.get_values = get_values
+        self.on_insert = on_insert
+
+
+class Update(object):
+    """A pending update of ``obj``'s row in ``table``.
+
+    Any callable values are called at write time (see ``Insert``).
+    """
+
+    __slots__ = ("table", "obj", "values")
+
+    def __init__(self, table, obj, values):
+        self.table = table
+        self.obj = obj
+        self.values = values
+
+
+# Columns identifying a newly inserted row, used to lookup ids after a
+# multi-row insert. Tables are ordered so that rows are always written before
+# any rows that reference them.
+INSERT_KEYS = OrderedDict(
+    [(users, ("name",)), (clusters, ("name",)), (workers, ("cluster_id", "name"))]
+)
+
+# Max number of bound parameters to use in a single ``IN`` clause. Older
+# versions of sqlite are limited to 999 parameters per statement.
+MAX_IN_CLAUSE = 500
+
+
+def execute_batch(conn, ops):
+    """Execute a batch of ``Insert``/``Update`` operations.
+
+    Inserts are grouped by table into a single multi-row insert each. Updates
+    to the same row are merged (later values win), and then grouped by the
+    columns they set into a single ``executemany`` call each. Since all inserts
+    are written before any updates, per-row ordering is preserved.
+
+    Returns a list of the executed ``Insert`` operations.
+    """
+    inserts = {table: [] for table in INSERT_KEYS}
+    updates = OrderedDict()
+    for op in ops:
+        if isinstance(op, Insert):
+            inserts[op.table].append(op)
+        else:
+            key = (op.table.name, id(op.obj))
+            if key in updates:
+                updates[key].values.update(op.values)
+            else:
+                updates[key] = Update(op.table, op.obj, dict(op.values))
+
+    inserted = []
+    for table, key_cols in INSERT_KEYS.items():
+        group = inserts[table]
+        if not group:
+            continue
+        rows = [op.get_values() for op in group]
+        if len(rows) == 1:
+            ids = conn.execute(table.insert(), rows[0]).inserted_primary_key
+        else:
+            conn.execute(table.insert(), rows)
+            ids = lookup_ids(conn, table, key_cols, rows)
+        for op, row_id in zip(group, ids):
+            op.obj.id = row_id
+            inserted.append(op)
+    _execute_updates(conn, updates.values())
+    return inserted
+
+
+def _execute_updates(conn, updates):
+    groups = OrderedDict()
+    for op in updates:
+        if op.obj.id is None:
+            # Its insert failed, fail loudly rather than updating no rows
+            raise ValueError(
+                "Can't update %s %r, it was never inserted into the database"
+                % (op.table.name, getattr(op.obj, "name", op.obj))
+            )
+        values = {k: v() if callable(v) else v for k, v in op.values.items()}
+        values["_id"] = op.obj.id
+        groups.setdefault((op.table.name, tuple(sorted(op.values))), []).append(
+            (op.table, values)
+        )
+    for group in groups.values():
+        table = group[0][0]
+        conn.execute(
+            table.update().where(table.c.id == bindparam("_id")),
+            [values for _, values in group],
+        )
+
+
+def execute_batch_isolated(engine, ops, run_callback):
+    """Execute a batch of operations, isolating any failures.
+
+    The batch is first written in a single transaction. If that fails, each
+    operation is retried in its own transaction, so a single bad write doesn't
+    lose the rest of the batch. Any ``on_insert`` callbacks are passed to
+    ``run_callback`` once their transaction is committed.
+
+    Returns a dict mapping each failed operation to its error.
+    """
+
+    def write(ops):
+        try:
+            with engine.begin() as conn:
+                inserted = execute_batch(conn, ops)
+        except BaseException:
+            # The transaction is rolled back, so are any new ids
+            for op in ops:
+                if isinstance(op, Insert):
+                    op.obj.id = None
+            raise
+        for op in inserted:
+            if op.on_insert is not None:
+                run_callback(op.on_insert, op.obj)
+
+    try:
+        write(ops)
+        return {}
+    except Exception as exc:
+        if len(ops) == 1:
+            return {ops[0]: exc}
+    failed = {}
+    for op in ops:
+        try:
+            write([op])
+        except Exception as exc:
+            failed[op] = exc
+    return failed
+
+
+def lookup_ids(conn, table, key_cols, rows):
+    """Lookup the ids of newly inserted ``rows``, in order.
+
+    Rows are looked up by name within each group of the remaining key columns
+    (e.g. ``cluster_id`` for workers), so the query can use their index.
+    """
+    cols = [table.c[k] for k in key_cols]
+    group_cols = [k for k in key_cols if k != "name"]
+    groups = OrderedDict()
+    for r in rows:
+        groups.setdefault(tuple(r[k] for k in group_cols), []).append(r["name"])
+    key_to_id = {}
+    for group_key, names in groups.items():
+        where = [table.c[k] == v for k, v in zip(group_cols, group_key)]
+        for i in range(0, len(names), MAX_IN_CLAUSE):
+            res = conn.execute(
+                select([table.c.id] + cols).where(
+                    and_(table.c.name.in_(names[i : i + MAX_IN_CLAUSE]), *where)
+                )
+            )
+            for row in res:
+                key_to_id[tuple(row[1:])] = row[0]
+    return [key_to_id[tuple(r[k] for k in key_cols)] for r in rows]
+
+
+class PendingWrite(object):
+    """An awaitable handle on a (possibly incomplete) database write.
+
+    Unlike ``asyncio.wrap_future``, this doesn't require an event loop unless
+    the write is awaited before it completes. If ``op`` is provided, the
+    future is of a batch (see ``execute_batch_isolated``), and only the
+    failure of ``op`` is raised.
+    """
+
+    __slots__ = ("future", "op")
+
+    def __init__(self, future, op=None):
+        self.future = future
+        self.op = op
+
+    def done(self):
+        return self.future.done()
+
+    def result(self):
+        result = self.future.result()
+        if self.op is None:
+            return result
+        error = result.get(self.op)
+        if error is not None:
+            raise error
+
+    def __await__(self):
+        if not self.future.done():
+            yield from asyncio.wrap_future(self.future).__await__()
+        return self.result()
+
+
 class DataManager(object):
     """Holds the internal state for a single Dask Gateway.
 
-    Keeps the memory representation in-sync with the database.
+    Keeps the memory representation in-sync with the database. The in-memory
+    objects are always authoritative - updates are applied to them
+    immediately, while the corresponding database writes may complete later
+    if ``background_writes`` is enabled.
+
+    Parameters
+    ----------
+    url : str, optional
+        The database url.
+    encrypt_keys : list, optional
+        A list of keys to use to encrypt private data in the database.
+    keypair_pool : KeypairPool, optional
+        A pool of TLS credentials to use for new clusters.
+    background_writes : bool, optional
+        If True, all database writes are done in a background thread, keeping
+        them off the event loop. Otherwise writes are done inline.
+    write_batch_interval : float, optional
+        When using background writes, inserts and updates are coalesced into
+        batches, each written in a single transaction. This is the max time
+        (in seconds) to wait to fill a batch. If 0 (default), a batch holds all
+        writes made in a single event loop iteration.
+    log : logging.Logger, optional
+        A logger to use for reporting failed writes.
+    **kwargs
+        Additional arguments forwarded to ``sqlalchemy.create_engine``.
     """
 
-    def __init__(self, url="sqlite:///:memory:", encrypt_keys=(), **kwargs):
+    def __init__(
+        self,
+        url="sqlite:///:memory:",
+        encrypt_keys=(),
+        keypair_pool=None,
+        background_writes=False,
+        write_batch_interval=0,
+        log=None,
+        **kwargs
+    ):
         if url.startswith("sqlite"):
             kwargs["connect_args"] = {"check_same_thread": False}
 
@@ -189,79 +528,267 @@ class DataManager(object):
 
         self.db = engine
 
+        if keypair_pool is None:
+            keypair_pool = KeypairPool()
+        self.keypair_pool = keypair_pool
+
+        self.writer = DatabaseWriter(engine) if background_writes else None
+        self.write_batch_interval = write_batch_interval
+        self._batch = []
+        self._batch_future = None
+        self._batch_handle = None
+        self.log = log or logging.getLogger(__name__)
+
+        created = create_missing_indexes(engine)
+        if created:
+            self.log.info("Created missing database indexes: %s", ", ".join(created))
+
         self.username_to_user = {}
         self.cookie_to_user = {}
         self.token_to_cluster = {}
         self.id_to_cluster = {}
 
-    def load_database_state(self):
+    def load_database_state(self, active_only=False):
+        """Load the database state into memory.
+
+        Parameters
+        ----------
+        active_only : bool, optional
+            If True, only active clusters (and their active workers) are
+            loaded. Inactive clusters are loaded lazily as needed, see
+            ``get_cluster`` and ``load_user_history``. Otherwise all records
+            are loaded up front.
+        """
         # Load all existing users into memory
         id_to_user = {}
         for u in self.db.execute(users.select()):
             user = User(id=u.id, name=u.name, cookie=u.cookie)
+            user.history_loaded = not active_only
             self.username_to_user[user.name] = user
             self.cookie_to_user[user.cookie] = user
             id_to_user[user.id] = user
 
-        # Next load all existing clusters into memory
-        for c in self.db.execute(clusters.select()):
-            user = id_to_user[c.user_id]
-            tls_cert, tls_key = self.decode_tls_credentials(c.tls_credentials)
-            token = self.decode_token(c.token)
-            cluster = Cluster(
-                id=c.id,
-                name=c.name,
-                user=user,
-                token=token,
-                status=c.status,
-                state=c.state,
-                scheduler_address=c.scheduler_address,
-                dashboard_address=c.dashboard_address,
-                api_address=c.api_address,
-                tls_cert=tls_cert,
-                tls_key=tls_key,
-                start_time=c.start_time,
-                stop_time=c.stop_time,
+        # Next load existing clusters into memory
+        query = clusters.select()
+        if active_only:
+            query = query.where(clusters.c.status < ClusterStatus.STOPPING)
+        for c in self.db.execute(query):
+            self._add_cluster_from_row(c, id_to_user[c.user_id])
+
+        # Next load existing workers into memory
+        query = workers.select()
+        if active_only:
+            query = query.select_from(workers.join(clusters)).where(
+                (clusters.c.status < ClusterStatus.STOPPING)
+                & (workers.c.status < WorkerStatus.STOPPING)
             )
-            self.id_to_cluster[cluster.id] = cluster
-            self.token_to_cluster[cluster.token] = cluster
-            user.clusters[cluster.name] = cluster
-
-        # Next load all existing workers into memory
-        for w in self.db.execute(workers.select()):
-            cluster = self.id_to_cluster[w.cluster_id]
-            worker = Worker(
-                id=w.id,
-                name=w.name,
-                status=w.status,
-                cluster=cluster,
-                state=w.state,
-                start_time=w.start_time,
-                stop_time=w.stop_time,
-            )
-            cluster.workers[worker.name] = worker
-            if w.status == WorkerStatus.STARTING:
-                cluster.pending.add(worker.name)
+        for w in self.db.execute(query):
+            self._add_worker_from_row(w, self.id_to_cluster[w.cluster_id])
+
+    def _add_cluster_from_row(self, c, user):
+        tls_cert, tls_key = self.decode_tls_credentials(c.tls_credentials)
+        token = self.decode_token(c.token)
+        cluster = Cluster(
+            id=c.id,
+            name=c.name,
+            user=user,
+            token=token,
+            status=c.status,
+            state=c.state,
+            scheduler_address=c.scheduler_address,
+            dashboard_address=c.dashboard_address,
+            api_address=c.api_address,
+            tls_cert=tls_cert,
+            tls_key=tls_key,
+            start_time=c.start_time,
+            stop_time=c.stop_time,
+        )
+        self.id_to_cluster[cluster.id] = cluster
+        self.token_to_cluster[cluster.token] = cluster
+        user.clusters[cluster.name] = cluster
+        return cluster
+
+    def _add_worker_from_row(self, w, cluster):
+        worker = Worker(
+            id=w.id,
+            name=w.name,
+            status=w.status,
+            cluster=cluster,
+            state=w.state,
+            start_time=w.start_time,
+            stop_time=w.stop_time,
+        )
+        cluster.workers[worker.name] = worker
+        if w.status == WorkerStatus.STARTING:
+            cluster.pending.add(worker.name)
+        return worker
+
+    def _load_clusters(self, user, where):
+        """Load any unloaded clusters (and their workers) matching ``where``
+        for a user.
+
+        Returns an awaitable of a list of the newly loaded clusters."""
+
+        def load(conn):
+            cluster_rows = conn.execute(
+                clusters.select().where((clusters.c.user_id == user.id) & where)
+            ).fetchall()
+            worker_rows = []
+            ids = [c.id for c in cluster_rows]
+            for i in range(0, len(ids), MAX_IN_CLAUSE):
+                worker_rows.extend(
+                    conn.execute(
+                        workers.select().where(
+                            workers.c.cluster_id.in_(ids[i : i + MAX_IN_CLAUSE])
+                        )
+                    ).fetchall()
+                )
+            return cluster_rows, worker_rows
+
+        async def load_clusters():
+            # Reads go through the same path as writes, so they're ordered
+            # after any pending writes for this user.
+            cluster_rows, worker_rows = await self._write(load)
+            loaded = {}
+            for c in cluster_rows:
+                # Skip clusters already in memory
+                if c.name not in user.clusters:
+                    loaded[c.id] = self._add_cluster_from_row(c, user)
+            for w in worker_rows:
+                if w.cluster_id in loaded:
+                    self._add_worker_from_row(w, loaded[w.cluster_id])
+            return list(loaded.values())
+
+        return load_clusters()
+
+    async def load_user_history(self, user):
+        """Ensure all of a user's clusters are loaded into memory.
+
+        Only needed if ``load_database_state`` was called with
+        ``active_only=True``, otherwise this is a no-op."""
+        if user.history_loaded or user.id is None:
+            return
+        await self._load_clusters(user, clusters.c.status >= ClusterStatus.STOPPING)
+        user.history_loaded = True
+
+    async def get_cluster(self, user, cluster_name):
+        """Lookup a cluster for a user by name, loading it from the database
+        if needed.
+
+        Returns None if no such cluster exists."""
+        cluster = user.clusters.get(cluster_name)
+        if cluster is None and not user.history_loaded and user.id is not None:
+            await self._load_clusters(user, clusters.c.name == cluster_name)
+            cluster = user.clusters.get(cluster_name)
+        return cluster
 
-    def cleanup_expired(self, max_age_in_seconds):
+    def _write(self, func):
+        """Run ``func(conn)`` in a database transaction.
+
+        If background writes are enabled this is queued to run in the writer
+        thread (after any batched writes), otherwise it runs immediately.
+        Returns an awaitable that completes once the transaction has been
+        committed.
+        """
+        if self.writer is None:
+            with self.db.begin() as conn:
+                result = func(conn)
+            future = Future()
+            future.set_result(result)
+        else:
+            self._flush_batch()
+            future = self.writer.submit(func)
+            future.add_done_callback(self._log_write_failure)
+        return PendingWrite(future)
+
+    def _queue(self, op):
+        """Queue an ``Insert`` or ``Update`` to be written in the next batch.
+
+        Returns an awaitable that completes once the batch has been committed.
+        """
+        if self.writer is None:
+            res = self._write(partial(execute_batch, ops=[op]))
+            for ins in res.result():
+                if ins.on_insert is not None:
+                    ins.on_insert(ins.obj)
+            return res
+        if self._batch_future is None:
+            self._batch_future = Future()
+            self._batch_future.add_done_callback(self._log_batch_failures)
+            loop = asyncio.get_event_loop()
+            if self.write_batch_interval > 0:
+                self._batch_handle = loop.call_later(
+                    self.write_batch_interval, self._flush_batch
+                )
+            else:
+                self._batch_handle = loop.call_soon(self._flush_batch)
+        self._batch.append(op)
+        return PendingWrite(self._batch_future, op)
+
+    def _flush_batch(self):
+        """Submit the current batch to the writer thread"""
+        if self._batch_handle is not None:
+            self._batch_handle.cancel()
+            self._batch_handle = None
+        if self._batch_future is None:
+            return
+        ops, future = self._batch, self._batch_future
+        self._batch = []
+        self._batch_future = None
+        # Callbacks update in-memory state, so are run on the event loop
+        loop = asyncio.get_event_loop()
+        func = partial(
+            execute_batch_isolated, ops=ops, run_callback=loop.call_soon_threadsafe
+        )
+        self.writer.submit(func, future=future, transaction=False)
+
+    def _log_write_failure(self, future):
+        exc = future.exception()
+        if exc is not None:
+            self.log.error("Error while writing to the database", exc_info=exc)
+
+    def _log_batch_failures(self, future):
+        if future.exception() is not None:
+            self._log_write_failure(future)
+            return
+        for exc in future.result().values():
+            self.log.error("Error while writing to the database", exc_info=exc)
+
+    async def flush(self):
+        """Wait for all pending database writes to complete"""
+        await self._write(lambda conn: None)
+
+    async def close(self):
+        """Wait for all pending database writes, and stop the writer thread"""
+        if self.writer is not None:
+            self._flush_batch()
+            writer, self.writer = self.writer, None
+            await PendingWrite(writer.close())
+
+    async def cleanup_expired(self, max_age_in_seconds):
         cutoff = timestamp() - max_age_in_seconds * 1000
-        with self.db.begin() as conn:
+
+        def delete_expired(conn):
             to_delete = conn.execute(
                 select([clusters.c.id]).where(clusters.c.stop_time < cutoff)
             ).fetchall()
-
+            to_delete = [i for i, in to_delete]
             if to_delete:
-                to_delete = [i for i, in to_delete]
-
                 conn.execute(
                     clusters.delete().where(clusters.c.id == bindparam("id")),
                     [{"id": i} for i in to_delete],
                 )
+            return to_delete
+
+        to_delete = await self._write(delete_expired)
 
-                for i in to_delete:
-                    cluster = self.id_to_cluster.pop(i)
-                    del self.token_to_cluster[cluster.token]
-                    del cluster.user.clusters[cluster.name]
+        for i in to_delete:
+            cluster = self.id_to_cluster.pop(i, None)
+            if cluster is None:
+                # Not loaded into memory
+                continue
+            self.token_to_cluster.pop(cluster.token, None)
+            cluster.user.clusters.pop(cluster.name, None)
 
         return len(to_delete)
 
@@ -294,10 +821,12 @@ class DataManager(object):
         user = self.username_to_user.get(username)
         if user is None:
             cookie = uuid.uuid4().hex
-            res = self.db.execute(users.insert().values(name=username, cookie=cookie))
-            user = User(id=res.inserted_primary_key[0], name=username, cookie=cookie)
+            user = User(name=username, cookie=cookie)
             self.cookie_to_user[cookie] = user
             self.username_to_user[username] = user
+
+            values = {"name": username, "cookie": cookie}
+            self._queue(Insert(users, user, lambda: values))
         return user
 
     def cluster_from_token(self, token):
@@ -312,9 +841,8 @@ class DataManager(object):
 
     def create_cluster(self, user):
         """Create a new cluster for a user"""
-        cluster_name = uuid.uuid4().hex
+        cluster_name, tls_cert, tls_key = self.keypair_pool.get()
         token = uuid.uuid4().hex
-        tls_cert, tls_key = new_keypair(cluster_name)
         # Encode the tls credentials for storing in the database
         tls_credentials = self.encode_tls_credentials(tls_cert, tls_key)
         enc_token = self.encode_token(token)
@@ -329,29 +857,44 @@ class DataManager(object):
             "start_time": timestamp(),
         }
 
-        with self.db.begin() as conn:
-            res = conn.execute(
-                clusters.insert().values(
-                    user_id=user.id,
-                    tls_credentials=tls_credentials,
-                    token=enc_token,
-                    **common,
-                )
-            )
-            cluster = Cluster(
-                id=res.inserted_primary_key[0],
-                user=user,
-                token=token,
-                tls_cert=tls_cert,
-                tls_key=tls_key,
+        cluster = Cluster(
+            user=user,
+            token=token,
+            tls_cert=tls_cert,
+            tls_key=tls_key,
+            **common,
+        )
+        self.token_to_cluster[token] = cluster
+        user.clusters[cluster_name] = cluster
+
+        def get_values():
+            return dict(
+                user_id=user.id,
+                tls_credentials=tls_credentials,
+                token=enc_token,
                 **common,
             )
+
+        def on_insert(cluster):
             self.id_to_cluster[cluster.id] = cluster
-            self.token_to_cluster[token] = cluster
-            user.clusters[cluster_name] = cluster
+
+        self._queue(Insert(clusters, cluster, get_values, on_insert))
 
         return cluster
 
+    def assign_cluster(self, cluster, user):
+        """Transfer ownership of a cluster to a different user.
+
+        Returns an awaitable that completes once the change is persisted.
+        """
+        del cluster.user.clusters[cluster.name]
+        cluster.user = user
+        cluster.start_time = timestamp()
+        user.clusters[cluster.name] = cluster
+        # The user may not have been written yet, lookup its id at write time
+        values = {"user_id": lambda: user.id, "start_time": cluster.start_time}
+        return self._queue(Update(clusters, cluster, values))
+
     def create_worker(self, cluster):
         """Create a new worker for a cluster"""
         worker_name = uuid.uuid4().hex
@@ -363,31 +906,34 @@ class DataManager(object):
             "start_time": timestamp(),
         }
 
-        with self.db.begin() as conn:
-            res = conn.execute(workers.insert().values(cluster_id=cluster.id, **common))
-            worker = Worker(id=res.inserted_primary_key[0], cluster=cluster, **common)
-            cluster.pending.add(worker.name)
-            cluster.workers[worker.name] = worker
+        worker = Worker(cluster=cluster, **common)
+        cluster.pending.add(worker.name)
+        cluster.workers[worker.name] = worker
+
+        def get_values():
+            return dict(cluster_id=cluster.id, **common)
+
+        self._queue(Insert(workers, worker, get_values))
 
         return worker
 
     def update_cluster(self, cluster, **kwargs):
-        """Update a cluster's state"""
-        with self.db.begin() as conn:
-            conn.execute(
-                clusters.update().where(clusters.c.id == cluster.id).values(**kwargs)
-            )
-            for k, v in kwargs.items():
-                setattr(cluster, k, v)
+        """Update a cluster's state.
+
+        Returns an awaitable that completes once the change is persisted.
+        """
+        for k, v in kwargs.items():
+            setattr(cluster, k, v)
+        return self._queue(Update(clusters, cluster, kwargs))
 
     def update_worker(self, worker, **kwargs):
-        """Update a worker's state"""
-        with self.db.begin() as conn:
-            conn.execute(
-                workers.update().where(workers.c.id == worker.id).values(**kwargs)
-            )
-            for k, v in kwargs.items():
-                setattr(worker, k, v)
+        """Update a worker's state.
+
+        Returns an awaitable that completes once the change is persisted.
+        """
+        for k, v in kwargs.items():
+            setattr(worker, k, v)
+        return self._queue(Update(workers, worker, kwargs))
 
 
 class User(object):
@@ -396,6 +942,8 @@ class User(object):
         self.name = name
         self.cookie = cookie
         self.clusters = {}
+        # Whether all clusters (including inactive) have been loaded
+        self.history_loaded = True
 
 
 class ClusterInfo(object):
@@ -447,9 +995,14 @@ class Cluster(object):
 
         self.pending = set()
         self.workers = {}
+        # Adaptive scaling settings, if enabled. Kept in memory only.
+        self.adaptive = None
+        # The latest requested number of workers not yet applied, and the task
+        # applying requested scales
+        self.scale_target = None
+        self._scale_future = None
 
         loop = asyncio.get_running_loop()
-        self.lock = asyncio.Lock(loop=loop)
         self._start_future = loop.create_future()
         self._connect_future = loop.create_future()
         if status >= ClusterStatus.RUNNING:
@@ -475,6 +1028,25 @@ class Cluster(object):
         )
 
 
+class Adaptive(object):
+    """Adaptive scaling settings and state for a cluster"""
+
+    def __init__(self, minimum=0, maximum=None):
+        self.minimum = minimum
+        self.maximum = maximum
+        # The number of consecutive checks that recommended fewer workers
+        self.scale_down_count = 0
+        # When the cluster was last scaled adaptively (event loop time)
+        self.last_scaled = None
+
+    def clamp(self, n):
+        """Bound a number of workers by ``minimum`` and ``maximum``"""
+        n = max(n, self.minimum)
+        if self.maximum is not None:
+            n = min(n, self.maximum)
+        return n
+
+
 class Worker(object):
     def __init__(
         self,
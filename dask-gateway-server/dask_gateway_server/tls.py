@@ -1,29 +1,69 @@
+import asyncio
+import logging
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric import rsa, ec, ed25519
 from cryptography.x509.oid import NameOID
 
 
-def new_keypair(sni):
+KEY_TYPES = ("rsa-2048", "ecdsa-p256", "ed25519")
+
+
+def new_private_key(key_type="rsa-2048"):
+    """Create a new private key of the given type.
+
+    Parameters
+    ----------
+    key_type : {'rsa-2048', 'ecdsa-p256', 'ed25519'}, optional
+        The key algorithm to use.
+
+    Returns
+    -------
+    key : PrivateKey
+    hash_algorithm : HashAlgorithm or None
+        The hash algorithm to use when signing with this key.
+    """
+    if key_type == "rsa-2048":
+        key = rsa.generate_private_key(
+            public_exponent=65537, key_size=2048, backend=default_backend()
+        )
+        return key, hashes.SHA256()
+    elif key_type == "ecdsa-p256":
+        key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+        return key, hashes.SHA256()
+    elif key_type == "ed25519":
+        # Ed25519 signatures include their own hashing
+        return ed25519.Ed25519PrivateKey.generate(), None
+    raise ValueError(
+        "Unknown key_type %r, expected one of %s" % (key_type, ", ".join(KEY_TYPES))
+    )
+
+
+def new_keypair(sni, key_type="rsa-2048", validity_days=365):
     """Create a new self-signed certificate & key pair with the given SNI.
 
     Parameters
     ----------
     sni : str
         The SNI name to use.
+    key_type : {'rsa-2048', 'ecdsa-p256', 'ed25519'}, optional
+        The key algorithm to use.
+    validity_days : float, optional
+        The number of days the certificate is valid for.
 
     Returns
     -------
     cert_bytes : bytes
     key_bytes :  bytes
     """
-    key = rsa.generate_private_key(
-        public_exponent=65537, key_size=2048, backend=default_backend()
-    )
+    key, hash_algorithm = new_private_key(key_type)
     key_bytes = key.private_bytes(
         encoding=serialization.Encoding.PEM,
         format=serialization.PrivateFormat.PKCS8,
@@ -50,10 +90,117 @@ def new_keypair(sni):
         .public_key(key.public_key())
         .serial_number(x509.random_serial_number())
         .not_valid_before(now)
-        .not_valid_after(now + timedelta(days=365))
-        .sign(key, hashes.SHA256(), default_backend())
+        .not_valid_after(now + timedelta(days=validity_days))
+        .sign(key, hash_algorithm, default_backend())
     )
 
     cert_bytes = cert.public_bytes(serialization.Encoding.PEM)
 
     return cert_bytes, key_bytes
+
+
+class KeypairPool(object):
+    """A pool of pre-generated TLS credentials.
+
+    Generating a new keypair is expensive, and would block the event loop if
+    done inline. The pool keeps up to ``size`` keypairs ready, refilling in
+    the background using a thread pool. Since each certificate is tied to its
+    SNI name, each entry also includes a new (unique) name to use for the
+    cluster.
+
+    Parameters
+    ----------
+    size : int, optional
+        The target number of keypairs to keep in the pool. If 0, keypairs are
+        always generated inline.
+    workers : int, optional
+        The max number of keypairs to generate concurrently when refilling.
+    key_type : str, optional
+        The key algorithm to use, see ``new_keypair``.
+    validity_days : float, optional
+        The number of days each certificate is valid for.
+    log : logging.Logger, optional
+        A logger to use for reporting failures to refill the pool.
+    """
+
+    # Delay (in seconds) before retrying after a failure to refill the pool,
+    # doubled after each consecutive failure up to ``max_retry_delay``.
+    retry_delay = 1
+    max_retry_delay = 60
+
+    def __init__(
+        self, size=0, workers=1, key_type="rsa-2048", validity_days=365, log=None
+    ):
+        self.size = size
+        self.workers = workers
+        self.key_type = key_type
+        self.validity_days = validity_days
+        self.log = log or logging.getLogger(__name__)
+        self.keypairs = deque()
+        self.hits = 0
+        self.misses = 0
+        self._wakeup = None
+
+    def __len__(self):
+        return len(self.keypairs)
+
+    def new_entry(self):
+        sni = uuid.uuid4().hex
+        cert_bytes, key_bytes = new_keypair(
+            sni, key_type=self.key_type, validity_days=self.validity_days
+        )
+        return sni, cert_bytes, key_bytes
+
+    def get(self):
+        """Get a new ``(sni, cert_bytes, key_bytes)`` triple.
+
+        Takes an entry from the pool if available, otherwise falls back to
+        generating one inline.
+        """
+        if self.keypairs:
+            self.hits += 1
+            out = self.keypairs.popleft()
+        else:
+            self.misses += 1
+            out = self.new_entry()
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return out
+
+    async def run(self):
+        """Keep the pool filled until cancelled"""
+        if not self.size:
+            return
+        loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        delay = self.retry_delay
+        try:
+            while True:
+                while len(self.keypairs) < self.size:
+                    n = min(self.workers, self.size - len(self.keypairs))
+                    tasks = [
+                        loop.run_in_executor(executor, self.new_entry)
+                        for _ in range(n)
+                    ]
+                    results = await asyncio.gather(*tasks, return_exceptions=True)
+                    errors = [r for r in results if isinstance(r, Exception)]
+                    self.keypairs.extend(
+                        r for r in results if not isinstance(r, Exception)
+                    )
+                    if errors:
+                        self.log.warning(
+                            "Failed to generate TLS credentials for the keypair "
+                            "pool, retrying in %.1f seconds",
+                            delay,
+                            exc_info=errors[0],
+                        )
+                        await asyncio.sleep(delay)
+                        delay = min(delay * 2, self.max_retry_delay)
+                    else:
+                        delay = self.retry_delay
+                self._wakeup.clear()
+                await self._wakeup.wait()
+        finally:
+            self._wakeup = None
+            executor.shutdown(wait=False)
@@ -39,6 +39,29 @@ class TaskPool(object):
             pass
 
 
+class LatencyStats(object):
+    """Running statistics for a series of latencies (in seconds)"""
+
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, latency):
+        self.count += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def __repr__(self):
+        return "count=%d, mean=%.3fs, max=%.3fs" % (self.count, self.mean, self.max)
+
+
 def random_port():
     """Get a single random port."""
     with socket.socket() as sock:
@@ -75,11 +75,12 @@ class clean(_clean):
         _clean.run(self)
 
 
-install_requires = ["cryptography", "tornado", "traitlets", "sqlalchemy"]
+install_requires = ["cryptography >= 2.8", "tornado", "traitlets", "sqlalchemy"]
 
 extras_require = {
     "kerberos": ["pykerberos"],
     "kubernetes": ["kubernetes >= 9"],
+    "kubernetes-async": ["kubernetes >= 9", "kubernetes_asyncio"],
     "yarn": ["skein >= 0.7.3"],
 }
 
@@ -447,6 +447,44 @@ class Gateway(object):
         """
         return self.sync(self._scale_cluster, cluster_name, n, **kwargs)
 
+    async def _adapt_cluster(
+        self, cluster_name, minimum=None, maximum=None, active=True
+    ):
+        url = "%s/gateway/api/clusters/%s/adapt" % (self.address, cluster_name)
+        req = HTTPRequest(
+            url=url,
+            method="PUT",
+            body=json.dumps({"minimum": minimum, "maximum": maximum, "active": active}),
+            headers=HTTPHeaders({"Content-type": "application/json"}),
+        )
+        try:
+            await self._fetch(req)
+        except HTTPError as exc:
+            if exc.code == 409:
+                raise Exception("Cluster %r is not running" % cluster_name)
+            raise
+
+    def adapt_cluster(
+        self, cluster_name, minimum=None, maximum=None, active=True, **kwargs
+    ):
+        """Configure adaptive scaling for a cluster.
+
+        Parameters
+        ----------
+        cluster_name : str
+            The cluster name.
+        minimum : int, optional
+            The minimum number of workers to scale to. Defaults to 0.
+        maximum : int, optional
+            The maximum number of workers to scale to. Defaults to no maximum.
+        active : bool, optional
+            If ``False``, adaptive scaling is disabled for this cluster.
+            Defaults to ``True``.
+        """
+        return self.sync(
+            self._adapt_cluster, cluster_name, minimum, maximum, active, **kwargs
+        )
+
 
 _widget_status_template = """
 <div>
@@ -543,6 +581,8 @@ class GatewayCluster(object):
     def scale(self, n, **kwargs):
         """Scale the cluster to ``n`` workers.
 
+        This disables adaptive scaling, if enabled.
+
         Parameters
         ----------
         n : int
@@ -550,6 +590,25 @@ class GatewayCluster(object):
         """
         return self._gateway.scale_cluster(self.name, n, **kwargs)
 
+    def adapt(self, minimum=None, maximum=None, active=True, **kwargs):
+        """Configure adaptive scaling for the cluster.
+
+        The gateway scales the cluster between ``minimum`` and ``maximum``
+        workers based on the cluster's current load.
+
+        Parameters
+        ----------
+        minimum : int, optional
+            The minimum number of workers to scale to. Defaults to 0.
+        maximum : int, optional
+            The maximum number of workers to scale to. Defaults to no maximum.
+        active : bool, optional
+            If ``False``, adaptive scaling is disabled. Defaults to ``True``.
+        """
+        return self._gateway.adapt_cluster(
+            self.name, minimum=minimum, maximum=maximum, active=active, **kwargs
+        )
+
     def _widget_status(self):
         if self._internal_client is None:
             return None
@@ -5,14 +5,17 @@ import json
 import logging
 import os
 import sys
+import time
+from collections import OrderedDict
+from functools import partial
 from urllib.parse import urlparse, quote
 
 from tornado import gen, web
-from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest, HTTPError
 from tornado.ioloop import IOLoop, TimeoutError
 from distributed import Scheduler, Worker, Nanny
 from distributed.security import Security
-from distributed.utils import ignoring
+from distributed.utils import ignoring, mp_context
 from distributed.cli.utils import install_signal_handlers
 
 from distributed.proctitle import (
@@ -71,11 +74,38 @@ class StatusHandler(BaseHandler):
         self.set_status(201)
 
 
+class WorkersHandler(BaseHandler):
+    @web.authenticated
+    async def get(self):
+        try:
+            since = int(self.get_query_argument("since", 0))
+        except ValueError:
+            raise web.HTTPError(405)
+        result = self.gateway_service.workers(since=since)
+        self.write(result)
+
+
+class AdaptiveHandler(BaseHandler):
+    @web.authenticated
+    async def get(self):
+        try:
+            target_duration = float(self.get_query_argument("target_duration", 5))
+        except ValueError:
+            raise web.HTTPError(405)
+        result = self.gateway_service.adaptive(target_duration=target_duration)
+        self.write(result)
+
+
 class GatewaySchedulerService(object):
     def __init__(self, scheduler, io_loop=None, plugin=None):
         self.scheduler = scheduler
         self.loop = io_loop or scheduler.loop
-        routes = [("/api/scale_down", ScaleDownHandler), ("/api/status", StatusHandler)]
+        routes = [
+            ("/api/scale_down", ScaleDownHandler),
+            ("/api/status", StatusHandler),
+            ("/api/workers", WorkersHandler),
+            ("/api/adaptive", AdaptiveHandler),
+        ]
         self.app = web.Application(
             routes, gateway_service=self, auth_token=plugin.gateway.token
         )
@@ -120,11 +150,69 @@ class GatewaySchedulerService(object):
         ]
         return {"workers": workers}
 
+    def workers(self, since=0):
+        """Get the current set of workers, or changes since a version.
+
+        If ``since`` is provided, only workers added or removed after that
+        version are included. If the changes since that version are no longer
+        available, or ``since`` is from a different scheduler process, the
+        full set of workers is returned instead (with ``full`` set to True).
+        """
+        plugin = self.plugin
+        full = since <= 0 or since < plugin.min_version or since > plugin.version
+        workers = [
+            worker_summary(ws)
+            for ws in plugin.workers.values()
+            if full or plugin.worker_versions.get(ws.name, 0) > since
+        ]
+        if full:
+            removed = []
+        else:
+            removed = [n for n, v in plugin.removed.items() if v > since]
+        return {
+            "version": plugin.version,
+            "full": full,
+            "workers": workers,
+            "removed": removed,
+        }
+
+    def adaptive(self, target_duration=5):
+        """Get the current load on the cluster, for adaptive scaling.
+
+        ``target`` is the number of workers the scheduler recommends, based
+        on the task backlog, occupancy, and memory use (see
+        ``Scheduler.adaptive_target``).
+        """
+        s = self.scheduler
+        workers = [ws for ws in s.workers.values() if ws.status != "closed"]
+        return {
+            "target": s.adaptive_target(target_duration=target_duration),
+            "workers": len(workers),
+            "tasks": len(s.tasks),
+            "unrunnable": len(s.unrunnable),
+            "occupancy": s.total_occupancy,
+            "memory": sum(ws.nbytes for ws in workers),
+            "memory_limit": sum(ws.memory_limit or 0 for ws in workers),
+        }
+
+
+def worker_summary(ws):
+    metrics = getattr(ws, "metrics", None) or {}
+    return {
+        "name": ws.name,
+        "address": ws.address,
+        "status": ws.status,
+        "nthreads": getattr(ws, "nthreads", None) or getattr(ws, "ncores", None),
+        "memory_limit": ws.memory_limit,
+        "memory": metrics.get("memory"),
+        "cpu": metrics.get("cpu"),
+    }
+
 
 class GatewaySchedulerPlugin(SchedulerPlugin):
     """A plugin to notify the gateway when workers are added or removed"""
 
-    def __init__(self, gateway, loop):
+    def __init__(self, gateway, loop, notify_interval=0.1):
         self.gateway = gateway
         # A mapping from name to WorkerState. All workers have a specified
         # unique name that will be consistent between worker restarts. The
@@ -135,6 +223,36 @@ class GatewaySchedulerPlugin(SchedulerPlugin):
         self.shutdown_requested = set()
         self.timeouts = {}
         self.loop = loop
+        # Worker changes are versioned, so the gateway can request only what
+        # changed since it last checked. Maps worker name to the version it
+        # was last added at, and removed workers to the version they were
+        # removed at. Only the most recent ``max_removed`` removals are kept,
+        # requests for changes older than this get the full set of workers.
+        # Versions start at the current time, so cursors from before a
+        # scheduler restart are older than ``min_version``.
+        self.version = self.min_version = int(time.time() * 1000)
+        self.worker_versions = {}
+        self.removed = OrderedDict()
+        self.max_removed = 10000
+        # Worker notifications waiting to be sent to the gateway, as a mapping
+        # from name to (WorkerState, added).
+        self.notify_interval = notify_interval
+        self.pending_notifications = OrderedDict()
+        self._notify_handle = None
+        self._notifying = False
+
+    def _record_added(self, name):
+        self.version += 1
+        self.worker_versions[name] = self.version
+        self.removed.pop(name, None)
+
+    def _record_removed(self, name):
+        self.version += 1
+        self.worker_versions.pop(name, None)
+        self.removed.pop(name, None)
+        self.removed[name] = self.version
+        while len(self.removed) > self.max_removed:
+            _, self.min_version = self.removed.popitem(last=False)
 
     def add_worker(self, scheduler, worker):
         ws = scheduler.workers[worker]
@@ -144,11 +262,15 @@ class GatewaySchedulerPlugin(SchedulerPlugin):
             # Existing timeout running for this worker, cancel it
             self.loop.remove_timeout(timeout)
         self.workers[worker] = ws
-        self.loop.add_callback(self.gateway.notify_worker_added, ws)
+        self._record_added(ws.name)
+        self.queue_notification(ws, added=True)
 
     def remove_worker(self, scheduler, worker):
         ws = self.workers.pop(worker)
         logger.debug("Worker removed [address: %r, name: %r]", ws.address, ws.name)
+        if not any(w.name == ws.name for w in self.workers.values()):
+            # Only record if the worker hasn't already reconnected
+            self._record_removed(ws.name)
 
         try:
             self.shutdown_requested.remove(ws.address)
@@ -161,19 +283,65 @@ class GatewaySchedulerPlugin(SchedulerPlugin):
         # Start a timer to notify the gateway that the worker is permanently
         # gone. This allows for short-lived communication failures, while
         # still detecting worker failures.
-        async def callback():
+        def callback():
             logger.debug("Notifying worker %s removed", ws.name)
-            await self.gateway.notify_worker_removed(ws)
+            self.queue_notification(ws, added=False)
             self.timeouts.pop(ws.name, None)
 
         self.timeouts[ws.name] = self.loop.call_later(5, callback)
 
+    def queue_notification(self, ws, added=True):
+        """Queue a notification that a worker was added or removed.
+
+        Notifications are batched over ``notify_interval`` seconds, and sent
+        to the gateway in a single request. Only the most recent notification
+        for each worker is sent."""
+        self.pending_notifications.pop(ws.name, None)
+        self.pending_notifications[ws.name] = (ws, added)
+        if self._notify_handle is None and not self._notifying:
+            self._notify_handle = self.loop.call_later(
+                self.notify_interval, self.flush_notifications
+            )
+
+    async def flush_notifications(self):
+        """Send all pending notifications to the gateway"""
+        if self._notify_handle is not None:
+            self.loop.remove_timeout(self._notify_handle)
+            self._notify_handle = None
+        if not self.pending_notifications:
+            return
+        pending = self.pending_notifications
+        self.pending_notifications = OrderedDict()
+        added = [ws for ws, a in pending.values() if a]
+        removed = [ws for ws, a in pending.values() if not a]
+        logger.debug(
+            "Notifying gateway of %d workers added and %d workers removed",
+            len(added),
+            len(removed),
+        )
+        # Only one request is in flight at a time, so notifications are
+        # received in order
+        self._notifying = True
+        try:
+            await self.gateway.notify_workers_changed(added, removed)
+        except Exception as exc:
+            logger.error("Failed to notify gateway of worker changes", exc_info=exc)
+        finally:
+            self._notifying = False
+            if self.pending_notifications:
+                self._notify_handle = self.loop.call_later(
+                    self.notify_interval, self.flush_notifications
+                )
+
 
 class GatewayClient(object):
     def __init__(self, cluster_name, api_token, api_url):
         self.cluster_name = cluster_name
         self.token = api_token
         self.api_url = api_url
+        # Whether the gateway supports bulk worker notifications. Set to False
+        # on first failure.
+        self.supports_bulk = True
 
     async def send_addresses(self, scheduler, dashboard, api):
         client = AsyncHTTPClient()
@@ -237,6 +405,42 @@ class GatewayClient(object):
         )
         await client.fetch(req)
 
+    async def notify_workers_changed(self, added, removed):
+        """Notify the gateway of many workers added or removed at once.
+
+        Falls back to notifying for each worker individually if the gateway
+        doesn't support bulk notifications."""
+        if self.supports_bulk:
+            client = AsyncHTTPClient()
+            body = json.dumps(
+                {
+                    "added": [{"name": ws.name, "address": ws.address} for ws in added],
+                    "removed": [ws.name for ws in removed],
+                }
+            )
+            url = "%s/clusters/%s/workers/" % (self.api_url, self.cluster_name)
+            req = HTTPRequest(
+                url,
+                method="POST",
+                headers={
+                    "Authorization": "token %s" % self.token,
+                    "Content-type": "application/json",
+                },
+                body=body,
+            )
+            try:
+                await client.fetch(req)
+                return
+            except HTTPError as exc:
+                if exc.code not in (404, 405):
+                    raise
+                logger.debug("Gateway doesn't support bulk worker notifications")
+                self.supports_bulk = False
+
+        tasks = [self.notify_worker_added(ws) for ws in added]
+        tasks.extend(self.notify_worker_removed(ws) for ws in removed)
+        await gen.multi(tasks)
+
 
 scheduler_parser = argparse.ArgumentParser(
     prog="dask-gateway-scheduler", description="Start a dask-gateway scheduler"
@@ -348,6 +552,11 @@ worker_parser.add_argument(
     "--memory-limit", default="auto", help="The maximum amount of memory to allow"
 )
 worker_parser.add_argument("--name", default=None, help="The worker name")
+worker_parser.add_argument(
+    "--parked",
+    action="store_true",
+    help="Wait for the gateway to assign this worker to a cluster before starting",
+)
 
 
 async def start_worker(
@@ -358,12 +567,14 @@ async def start_worker(
     memory_limit="auto",
     local_dir="",
     nanny=True,
+    env=None,
 ):
     loop = IOLoop.current()
 
     scheduler = await gateway.get_scheduler_address()
 
-    typ = Nanny if nanny else Worker
+    # The nanny passes ``env`` on to the worker process it starts
+    typ = partial(Nanny, env=env) if nanny else Worker
 
     worker = typ(
         scheduler,
@@ -386,9 +597,56 @@ async def start_worker(
     return worker
 
 
+def wait_for_assignment():
+    """Wait for a parked worker to be assigned to a cluster.
+
+    The assignment is a single line of JSON on stdin, with the environment
+    variables the worker would otherwise have been started with (``env``),
+    and optionally a working directory (``cwd``) and log file (``log_path``)
+    to switch to. Returns the assigned environment, or None if stdin is
+    closed before an assignment.
+    """
+    # The nanny starts the worker process from a forkserver. Starting it now
+    # means distributed is already imported there once assigned. Forked
+    # processes get their working directory from the nanny at start, and the
+    # assigned environment is passed through explicitly.
+    if mp_context.get_start_method() == "forkserver":
+        from multiprocessing import forkserver
+
+        forkserver.ensure_running()
+
+    line = sys.stdin.readline()
+    if not line:
+        return None
+    msg = json.loads(line)
+    os.environ.update(msg["env"])
+    if msg.get("cwd"):
+        os.chdir(msg["cwd"])
+    if msg.get("log_path"):
+        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL
+        fd = os.open(msg["log_path"], flags, 0o755)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(fd, sys.stdout.fileno())
+        os.dup2(fd, sys.stderr.fileno())
+        os.close(fd)
+    return msg["env"]
+
+
 def worker(argv=None):
     args = worker_parser.parse_args(argv)
 
+    env = None
+    if args.parked:
+        # Everything is imported already, so all that's left once assigned is
+        # connecting to the scheduler
+        try:
+            env = wait_for_assignment()
+        except KeyboardInterrupt:
+            return
+        if env is None:
+            return
+
     worker_name = args.name or getenv("DASK_GATEWAY_WORKER_NAME")
     nthreads = args.nthreads
     memory_limit = args.memory_limit
@@ -403,7 +661,7 @@ def worker(argv=None):
 
     async def run():
         worker = await start_worker(
-            gateway, security, worker_name, nthreads, memory_limit
+            gateway, security, worker_name, nthreads, memory_limit, env=env
         )
         while worker.status != "closed":
             await gen.sleep(0.2)
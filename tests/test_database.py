@@ -1,11 +1,14 @@
 import base64
+import threading
 import time
 from collections import defaultdict
 
 import pytest
 from cryptography.fernet import Fernet
+from sqlalchemy import event, inspect
 
 from dask_gateway_server import objects
+from dask_gateway_server.tls import KeypairPool
 
 
 def check_consistency(db):
@@ -90,7 +93,7 @@ async def test_cleanup_expired_clusters(monkeypatch):
 
     # 2 clusters are expired
     max_age = now - cutoff
-    n = db.cleanup_expired(max_age)
+    n = await db.cleanup_expired(max_age)
     assert n == 2
 
     check_consistency(db)
@@ -100,7 +103,7 @@ async def test_cleanup_expired_clusters(monkeypatch):
 
     # Running again expires no clusters
     max_age = now - cutoff
-    n = db.cleanup_expired(max_age)
+    n = await db.cleanup_expired(max_age)
     assert n == 0
 
     check_consistency(db)
@@ -148,6 +151,371 @@ async def test_encryption(tmpdir):
     assert c2.token == c.token
 
 
+@pytest.mark.asyncio
+async def test_create_cluster_uses_keypair_pool():
+    pool = KeypairPool(size=1)
+    pool.keypairs.append(pool.new_entry())
+    name, cert, key = pool.keypairs[0]
+
+    db = objects.DataManager(keypair_pool=pool)
+    db.load_database_state()
+    alice = db.get_or_create_user("alice")
+
+    # Credentials are taken from the pool
+    c = db.create_cluster(alice)
+    assert c.name == name
+    assert c.tls_cert == cert
+    assert c.tls_key == key
+    assert pool.hits == 1
+
+    # Empty pool falls back to generating new credentials
+    c2 = db.create_cluster(alice)
+    assert c2.name != name
+    assert c2.tls_cert and c2.tls_key
+    assert pool.misses == 1
+
+    check_consistency(db)
+
+
+@pytest.mark.asyncio
+async def test_background_writes(tmpdir):
+    db_url = "sqlite:///%s" % tmpdir.join("dask_gateway.sqlite")
+    encrypt_keys = [Fernet.generate_key()]
+    db = objects.DataManager(
+        url=db_url, encrypt_keys=encrypt_keys, background_writes=True
+    )
+    db.load_database_state()
+    assert db.writer is not None
+
+    alice = db.get_or_create_user("alice")
+    c = db.create_cluster(alice)
+    w = db.create_worker(c)
+
+    # In-memory state is updated immediately
+    db.update_cluster(c, status=objects.ClusterStatus.RUNNING, state={"a": 1})
+    assert c.status == objects.ClusterStatus.RUNNING
+    assert c.state == {"a": 1}
+
+    # Writes can be awaited individually
+    await db.update_worker(w, status=objects.WorkerStatus.RUNNING)
+    assert c.id is not None
+    assert w.id is not None
+
+    db.update_worker(
+        w, status=objects.WorkerStatus.STOPPED, stop_time=objects.timestamp()
+    )
+    await db.flush()
+    check_consistency(db)
+
+    # Pending writes are persisted on close
+    db.update_cluster(
+        c, status=objects.ClusterStatus.STOPPED, stop_time=objects.timestamp()
+    )
+    await db.close()
+    assert db.writer is None
+
+    db2 = objects.DataManager(url=db_url, encrypt_keys=encrypt_keys)
+    db2.load_database_state()
+    c2 = db2.id_to_cluster[c.id]
+    assert c2.status == objects.ClusterStatus.STOPPED
+    assert c2.state == {"a": 1}
+    w2 = c2.workers[w.name]
+    assert w2.status == objects.WorkerStatus.STOPPED
+    assert w2.stop_time == w.stop_time
+
+    # Expired clusters are cleaned up through the writer as well
+    db3 = objects.DataManager(
+        url=db_url, encrypt_keys=encrypt_keys, background_writes=True
+    )
+    db3.load_database_state()
+    assert await db3.cleanup_expired(-1) == 1
+    assert not db3.id_to_cluster
+    check_consistency(db3)
+    await db3.close()
+
+
+@pytest.mark.asyncio
+async def test_background_writes_errors_logged(caplog):
+    db = objects.DataManager(background_writes=True)
+    db.load_database_state()
+
+    def bad_write(conn):
+        raise ValueError("Oh no")
+
+    with pytest.raises(ValueError):
+        await db._write(bad_write)
+    assert "Error while writing to the database" in caplog.text
+
+    # Writer keeps processing after a failure
+    alice = db.get_or_create_user("alice")
+    await db.flush()
+    assert alice.id is not None
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_background_writes_callbacks_on_loop():
+    db = objects.DataManager(background_writes=True)
+    db.load_database_state()
+    alice = db.get_or_create_user("alice")
+
+    threads = []
+    obj = objects.Cluster(name="c", user=alice, status=objects.ClusterStatus.STARTING)
+
+    def get_values():
+        return {
+            "name": "c",
+            "user_id": alice.id,
+            "status": objects.ClusterStatus.STARTING,
+            "state": {},
+            "token": b"token",
+            "scheduler_address": "",
+            "dashboard_address": "",
+            "api_address": "",
+            "tls_credentials": b"",
+            "start_time": objects.timestamp(),
+        }
+
+    def on_insert(cluster):
+        threads.append(threading.current_thread())
+
+    # Insert callbacks are run on the event loop, before the write completes
+    await db._queue(objects.Insert(objects.clusters, obj, get_values, on_insert))
+    assert threads == [threading.current_thread()]
+    assert obj.id is not None
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_background_write_failures_isolated(caplog):
+    db = objects.DataManager(background_writes=True)
+    db.load_database_state()
+    alice = db.get_or_create_user("alice")
+
+    def fail():
+        raise ValueError("Oh no")
+
+    # A failing write doesn't prevent the rest of its batch being written
+    c1 = db.create_cluster(alice)
+    bad = objects.Cluster(name="bad", user=alice, status=objects.ClusterStatus.STARTING)
+    res = db._queue(objects.Insert(objects.clusters, bad, fail))
+    c2 = db.create_cluster(alice)
+    w = db.create_worker(c2)
+    ok = db.update_worker(w, status=objects.WorkerStatus.RUNNING)
+    # Only the failed write's caller sees the error
+    with pytest.raises(ValueError, match="Oh no"):
+        await res
+    await ok
+    assert bad.id is None
+    assert all(o.id is not None for o in [c1, c2, w])
+    check_consistency(db)
+
+    # Updates to rows that were never inserted fail loudly
+    with pytest.raises(ValueError, match="never inserted"):
+        await db.update_cluster(bad, status=objects.ClusterStatus.RUNNING)
+    assert "Error while writing to the database" in caplog.text
+    await db.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("background_writes", [False, True])
+async def test_write_coalescing(tmpdir, background_writes):
+    db_url = "sqlite:///%s" % tmpdir.join("dask_gateway.sqlite")
+    encrypt_keys = [Fernet.generate_key()]
+    db = objects.DataManager(
+        url=db_url, encrypt_keys=encrypt_keys, background_writes=background_writes
+    )
+    db.load_database_state()
+
+    commits = 0
+
+    @event.listens_for(db.db, "commit")
+    def count_commits(conn):
+        nonlocal commits
+        commits += 1
+
+    n_workers = 1000
+    alice = db.get_or_create_user("alice")
+    c = db.create_cluster(alice)
+    db.update_cluster(c, state={"step": 1})
+    db.update_cluster(c, state={"step": 2}, status=objects.ClusterStatus.RUNNING)
+    ws = [db.create_worker(c) for _ in range(n_workers)]
+    for w in ws:
+        db.update_worker(w, state={"name": w.name})
+    await db.flush()
+    for w in ws:
+        db.update_worker(w, status=objects.WorkerStatus.STARTED)
+    for w in ws:
+        db.update_worker(w, status=objects.WorkerStatus.RUNNING)
+    await db.flush()
+
+    if background_writes:
+        # 2 batches, plus 2 flushes
+        assert commits <= 4
+    else:
+        assert commits >= 3 * n_workers
+
+    assert len({w.id for w in ws}) == n_workers
+    check_consistency(db)
+    await db.close()
+
+    # All writes persisted, with the latest values winning
+    db2 = objects.DataManager(url=db_url, encrypt_keys=encrypt_keys)
+    db2.load_database_state()
+    c2 = db2.id_to_cluster[c.id]
+    assert c2.state == {"step": 2}
+    assert c2.status == objects.ClusterStatus.RUNNING
+    assert len(c2.workers) == n_workers
+    for w in ws:
+        w2 = c2.workers[w.name]
+        assert w2.id == w.id
+        assert w2.status == objects.WorkerStatus.RUNNING
+        assert w2.state == {"name": w.name}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("background_writes", [False, True])
+async def test_assign_cluster(tmpdir, background_writes):
+    db_url = "sqlite:///%s" % tmpdir.join("dask_gateway.sqlite")
+    encrypt_keys = [Fernet.generate_key()]
+    db = objects.DataManager(
+        url=db_url, encrypt_keys=encrypt_keys, background_writes=background_writes
+    )
+    db.load_database_state()
+
+    alice = db.get_or_create_user("alice")
+    c = db.create_cluster(alice)
+    await db.flush()
+
+    # The new user isn't written yet when the assignment is queued
+    bob = db.get_or_create_user("bob")
+    db.assign_cluster(c, bob)
+    assert c.user is bob
+    assert bob.clusters == {c.name: c}
+    assert not alice.clusters
+    await db.flush()
+    check_consistency(db)
+    await db.close()
+
+    db2 = objects.DataManager(url=db_url, encrypt_keys=encrypt_keys)
+    db2.load_database_state()
+    c2 = db2.id_to_cluster[c.id]
+    assert c2.user.name == "bob"
+    assert c2.start_time == c.start_time
+
+
+@pytest.mark.asyncio
+async def test_lazy_load(tmpdir):
+    db_url = "sqlite:///%s" % tmpdir.join("dask_gateway.sqlite")
+    encrypt_keys = [Fernet.generate_key()]
+    db = objects.DataManager(url=db_url, encrypt_keys=encrypt_keys)
+    db.load_database_state()
+
+    alice = db.get_or_create_user("alice")
+    bob = db.get_or_create_user("bob")
+
+    def add_cluster(user, stop=True):
+        c = db.create_cluster(user)
+        w1 = db.create_worker(c)
+        w2 = db.create_worker(c)
+        db.update_worker(
+            w1, status=objects.WorkerStatus.STOPPED, stop_time=objects.timestamp()
+        )
+        if stop:
+            db.update_worker(
+                w2, status=objects.WorkerStatus.STOPPED, stop_time=objects.timestamp()
+            )
+            db.update_cluster(
+                c, status=objects.ClusterStatus.STOPPED, stop_time=objects.timestamp()
+            )
+        return c
+
+    a_active = add_cluster(alice, stop=False)
+    a_stopped = [add_cluster(alice) for _ in range(3)]
+    b_stopped = add_cluster(bob)
+
+    db2 = objects.DataManager(url=db_url, encrypt_keys=encrypt_keys)
+    db2.load_database_state(active_only=True)
+
+    # Only active clusters and workers are loaded
+    assert set(db2.id_to_cluster) == {a_active.id}
+    alice2 = db2.username_to_user["alice"]
+    bob2 = db2.username_to_user["bob"]
+    assert set(alice2.clusters) == {a_active.name}
+    assert len(alice2.clusters[a_active.name].workers) == 1
+    assert not alice2.history_loaded
+
+    # Clusters can be loaded by name on demand
+    c = await db2.get_cluster(bob2, b_stopped.name)
+    assert c.id == b_stopped.id
+    assert c.status == objects.ClusterStatus.STOPPED
+    assert len(c.workers) == 2
+    assert await db2.get_cluster(bob2, "missing") is None
+
+    # Loading a user's history loads all their clusters
+    await db2.load_user_history(alice2)
+    assert alice2.history_loaded
+    assert set(alice2.clusters) == {a_active.name} | {c.name for c in a_stopped}
+    # Active cluster isn't reloaded
+    assert len(alice2.clusters[a_active.name].workers) == 1
+
+    # Cleanup handles clusters that aren't loaded into memory
+    db3 = objects.DataManager(url=db_url, encrypt_keys=encrypt_keys)
+    db3.load_database_state(active_only=True)
+    assert await db3.cleanup_expired(-1) == 4
+    assert set(db3.id_to_cluster) == {a_active.id}
+    await db3.load_user_history(db3.username_to_user["alice"])
+    assert set(db3.id_to_cluster) == {a_active.id}
+
+
+@pytest.mark.asyncio
+async def test_create_missing_indexes(tmpdir):
+    db_url = "sqlite:///%s" % tmpdir.join("dask_gateway.sqlite")
+    encrypt_keys = [Fernet.generate_key()]
+    db = objects.DataManager(url=db_url, encrypt_keys=encrypt_keys)
+    db.load_database_state()
+    alice = db.get_or_create_user("alice")
+    c = db.create_cluster(alice)
+    db.create_worker(c)
+
+    expected = {i.name for t in objects.metadata.sorted_tables for i in t.indexes}
+    assert expected == {
+        "ix_clusters_user_id",
+        "ix_clusters_status",
+        "ix_clusters_stop_time",
+        "ix_workers_cluster_id",
+        "ix_workers_status",
+    }
+
+    # Simulate a database created before indexes were added
+    for name in expected:
+        db.db.execute("DROP INDEX %s" % name)
+    db.db.dispose()
+
+    db2 = objects.DataManager(url=db_url, encrypt_keys=encrypt_keys)
+    db2.load_database_state()
+
+    # Indexes are recreated, and existing data is preserved
+    indexes = {
+        i["name"]
+        for t in ["users", "clusters", "workers"]
+        for i in inspect(db2.db).get_indexes(t)
+    }
+    assert expected.issubset(indexes)
+    assert set(db2.id_to_cluster) == {c.id}
+    assert len(db2.id_to_cluster[c.id].workers) == 1
+    check_consistency(db2)
+
+    # No-op if all indexes exist
+    assert objects.create_missing_indexes(db2.db) == []
+
+    # Cleanup queries use the index
+    plan = db2.db.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM clusters WHERE stop_time < 1"
+    ).fetchall()
+    assert "ix_clusters_stop_time" in str(plan)
+
+
 def test_normalize_encrypt_key():
     key = Fernet.generate_key()
     # b64 bytes
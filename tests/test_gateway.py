@@ -1,15 +1,21 @@
 import asyncio
+import json
+import logging
 import os
 import signal
 
 import pytest
 from cryptography.fernet import Fernet
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from tornado.ioloop import IOLoop
 
 from dask_gateway import Gateway
+from dask_gateway.dask_cli import GatewaySchedulerPlugin
 from dask_gateway_server.app import DaskGateway
 from dask_gateway_server.managers import ClusterManager
 from dask_gateway_server.managers.inprocess import InProcessClusterManager
-from dask_gateway_server.utils import random_port
+from dask_gateway_server.objects import ClusterStatus, WorkerStatus
+from dask_gateway_server.utils import TaskPool, random_port, cancel_task
 
 from .utils import LocalTestingClusterManager, temp_gateway
 
@@ -325,6 +331,202 @@ async def test_failing_worker_start(tmpdir, fail_stage):
             await cluster.shutdown()
 
 
+class BulkClusterManager(InProcessClusterManager):
+    supports_bulk_start = True
+    supports_bulk_stop = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bulk_starts = []
+        self.bulk_stops = []
+
+    async def start_workers(self, worker_names, cluster_info, cluster_state):
+        self.bulk_starts.append(list(worker_names))
+        states = {}
+        for name in worker_names:
+            async for state in self.start_worker(name, cluster_info, cluster_state):
+                states[name] = state
+        yield states
+
+    async def stop_workers(self, worker_states, cluster_info, cluster_state):
+        self.bulk_stops.append(list(worker_states))
+        for name, state in worker_states.items():
+            await self.stop_worker(name, state, cluster_info, cluster_state)
+        return {}
+
+
+@pytest.mark.asyncio
+async def test_bulk_worker_start_stop(tmpdir):
+    async with temp_gateway(
+        cluster_manager_class=BulkClusterManager,
+        temp_dir=str(tmpdir.join("dask-gateway")),
+    ) as gateway_proc:
+
+        manager = gateway_proc.cluster_manager
+
+        async with Gateway(
+            address=gateway_proc.public_url, asynchronous=True
+        ) as gateway:
+
+            cluster = await gateway.new_cluster()
+
+            # Scaling by more than one worker uses a single bulk start
+            await cluster.scale(3)
+            c = next(
+                c for c in gateway_proc.db.active_clusters() if c.name == cluster.name
+            )
+            timeout = 10
+            while len(c.active_workers) < 3 or c.pending:
+                await asyncio.sleep(0.1)
+                timeout -= 0.1
+                assert timeout > 0, "Operation timed out"
+            assert len(manager.bulk_starts) == 1
+            assert set(manager.bulk_starts[0]) == set(c.workers)
+
+            with cluster.get_client(set_as_default=False) as client:
+                res = await client.submit(lambda x: x + 1, 1)
+                assert res == 2
+
+            # Scaling by a single worker uses `start_worker`
+            await cluster.scale(4)
+            timeout = 10
+            while len(c.active_workers) < 4 or c.pending:
+                await asyncio.sleep(0.1)
+                timeout -= 0.1
+                assert timeout > 0, "Operation timed out"
+            assert len(manager.bulk_starts) == 1
+
+            # Shutdown stops all workers with a single bulk stop
+            workers = list(c.workers.values())
+            await cluster.shutdown()
+            timeout = 10
+            while c.status != ClusterStatus.STOPPED:
+                await asyncio.sleep(0.1)
+                timeout -= 0.1
+                assert timeout > 0, "Operation timed out"
+            assert len(manager.bulk_stops) == 1
+            assert set(manager.bulk_stops[0]) == {w.name for w in workers}
+            assert all(w.status == WorkerStatus.STOPPED for w in workers)
+
+
+class OrphanCleanupClusterManager(InProcessClusterManager):
+    orphan_cleanup_period = 0.05
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.active_clusters = None
+
+    async def cleanup_orphans(self, active_clusters):
+        self.active_clusters = active_clusters
+        return 0
+
+
+@pytest.mark.asyncio
+async def test_orphan_cleanup(tmpdir):
+    async with temp_gateway(
+        cluster_manager_class=OrphanCleanupClusterManager,
+        temp_dir=str(tmpdir.join("dask-gateway")),
+    ) as gateway_proc:
+
+        manager = gateway_proc.cluster_manager
+
+        async with Gateway(
+            address=gateway_proc.public_url, asynchronous=True
+        ) as gateway:
+
+            cluster = await gateway.new_cluster()
+            timeout = 10
+            while not manager.active_clusters:
+                await asyncio.sleep(0.1)
+                timeout -= 0.1
+                assert timeout > 0, "Operation timed out"
+            assert manager.active_clusters == {cluster.name}
+
+            await cluster.shutdown()
+            timeout = 10
+            while manager.active_clusters:
+                await asyncio.sleep(0.1)
+                timeout -= 0.1
+                assert timeout > 0, "Operation timed out"
+
+
+class PooledClusterManager(InProcessClusterManager):
+    cluster_pool_size = 2
+
+
+def pooled_clusters(gateway_proc):
+    """The names of all ready clusters in the pool"""
+    return {
+        c.name
+        for c in gateway_proc.cluster_pool_user.clusters.values()
+        if c.status == ClusterStatus.RUNNING and c._start_future.done()
+    }
+
+
+async def wait_for_pool(gateway_proc, check):
+    timeout = 10
+    while not check(pooled_clusters(gateway_proc)):
+        await asyncio.sleep(0.1)
+        timeout -= 0.1
+        assert timeout > 0, "Operation timed out"
+
+
+@pytest.mark.asyncio
+async def test_cluster_pool(tmpdir):
+    async with temp_gateway(
+        cluster_manager_class=PooledClusterManager,
+        temp_dir=str(tmpdir.join("dask-gateway")),
+    ) as gateway_proc:
+
+        await wait_for_pool(gateway_proc, lambda p: len(p) == 2)
+        pooled = pooled_clusters(gateway_proc)
+
+        async with Gateway(
+            address=gateway_proc.public_url, asynchronous=True
+        ) as gateway:
+
+            # New clusters are claimed from the pool
+            cluster = await gateway.new_cluster()
+            assert cluster.name in pooled
+            assert gateway_proc.cluster_claim_latency.count == 1
+            assert gateway_proc.cluster_cold_start_latency.count == 0
+            clusters = await gateway.list_clusters()
+            assert [c.name for c in clusters] == [cluster.name]
+
+            # The pool is refilled
+            await wait_for_pool(
+                gateway_proc, lambda p: len(p) == 2 and cluster.name not in p
+            )
+
+            # The claimed cluster works as normal
+            await cluster.scale(1)
+            with cluster.get_client(set_as_default=False) as client:
+                res = await client.submit(lambda x: x + 1, 1)
+                assert res == 2
+
+            await cluster.shutdown()
+
+        # Idle clusters are replaced
+        pooled = pooled_clusters(gateway_proc)
+        gateway_proc.cluster_manager.cluster_pool_idle_timeout = 0.01
+        gateway_proc.cluster_pool_wakeup.set()
+        await wait_for_pool(gateway_proc, lambda p: p and not p.intersection(pooled))
+
+        # Stopped pooled clusters are removed by the database cleanup
+        user = gateway_proc.cluster_pool_user
+        stopped = [user.clusters[name] for name in pooled]
+        timeout = 10
+        while not all(c.status == ClusterStatus.STOPPED for c in stopped):
+            await asyncio.sleep(0.1)
+            timeout -= 0.1
+            assert timeout > 0, "Operation timed out"
+        assert await gateway_proc.db.cleanup_expired(-1) >= len(stopped)
+        for c in stopped:
+            assert c.name not in user.clusters
+            assert c.id not in gateway_proc.db.id_to_cluster
+            assert c.token not in gateway_proc.db.token_to_cluster
+
+
 @pytest.mark.asyncio
 async def test_successful_cluster(tmpdir):
     async with temp_gateway(
@@ -352,6 +554,305 @@ async def test_successful_cluster(tmpdir):
             await cluster.shutdown()
 
 
+@pytest.mark.asyncio
+async def test_scheduler_workers_endpoint(tmpdir):
+    async with temp_gateway(
+        cluster_manager_class=InProcessClusterManager,
+        temp_dir=str(tmpdir.join("dask-gateway")),
+    ) as gateway_proc:
+
+        async with Gateway(
+            address=gateway_proc.public_url, asynchronous=True
+        ) as gateway:
+
+            cluster = await gateway.new_cluster()
+            await cluster.scale(2)
+
+            c = next(
+                c for c in gateway_proc.db.active_clusters() if c.name == cluster.name
+            )
+
+            # Wait for workers to connect
+            timeout = 10
+            while len(c.workers) < 2 or c.pending:
+                await asyncio.sleep(0.1)
+                timeout -= 0.1
+                assert timeout > 0, "Operation timed out"
+
+            async def get_workers(since=0):
+                req = HTTPRequest(
+                    "%s/api/workers?since=%d" % (c.api_address, since),
+                    headers={"Authorization": "token %s" % c.token},
+                )
+                resp = await AsyncHTTPClient().fetch(req)
+                return json.loads(resp.body.decode())
+
+            # Full listing
+            msg = await get_workers()
+            assert msg["full"]
+            assert {w["name"] for w in msg["workers"]} == set(c.workers)
+            assert not msg["removed"]
+            for w in msg["workers"]:
+                assert w["address"]
+                assert w["nthreads"] == 1
+            version = msg["version"]
+
+            # No changes since last version
+            msg = await get_workers(version)
+            assert not msg["full"]
+            assert msg["version"] == version
+            assert not msg["workers"]
+            assert not msg["removed"]
+
+            # Removals are reported incrementally
+            await cluster.scale(1)
+            msg = await get_workers(version)
+            assert not msg["full"]
+            assert msg["version"] > version
+            assert not msg["workers"]
+            assert len(msg["removed"]) == 1
+
+            # Versions from a different scheduler get a full listing
+            msg = await get_workers(msg["version"] + 1)
+            assert msg["full"]
+            assert len(msg["workers"]) == 1
+
+            # The gateway uses the endpoint to reconcile workers
+            workers = await gateway_proc.get_cluster_workers(c)
+            assert set(workers) == {w.name for w in c.active_workers}
+
+            await cluster.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_scale_requests_coalesced(tmpdir):
+    async with temp_gateway(
+        cluster_manager_class=InProcessClusterManager,
+        temp_dir=str(tmpdir.join("dask-gateway")),
+    ) as gateway_proc:
+
+        async with Gateway(
+            address=gateway_proc.public_url, asynchronous=True
+        ) as gateway:
+
+            cluster = await gateway.new_cluster()
+            c = next(
+                c for c in gateway_proc.db.active_clusters() if c.name == cluster.name
+            )
+
+            # Record every scaling operation applied to the backend
+            ops = []
+
+            def record(method):
+                async def inner(cluster, n):
+                    ops.append((method.__name__, n))
+                    await method(cluster, n)
+
+                return inner
+
+            gateway_proc.scale_up = record(gateway_proc.scale_up)
+            gateway_proc.scale_down = record(gateway_proc.scale_down)
+
+            # Many concurrent requests apply only the latest total
+            await asyncio.gather(*(gateway_proc.scale(c, i % 5) for i in range(100)))
+            assert ops == [("scale_up", 4)]
+            await wait_for_workers(c, 4)
+            while c.pending:
+                await asyncio.sleep(0.1)
+
+            # Requests made while a scale is in progress are coalesced too.
+            # Scaling down needs a request to the scheduler, which doesn't
+            # block new requests.
+            del ops[:]
+            tasks = [asyncio.ensure_future(gateway_proc.scale(c, 1))]
+            await asyncio.sleep(gateway_proc.scale_debounce + 0.01)
+            assert ops == [("scale_down", 3)]
+            tasks.extend(gateway_proc.scale(c, i % 5) for i in range(100))
+            await asyncio.gather(*tasks)
+            assert ops == [("scale_down", 3), ("scale_up", 3)]
+            await wait_for_workers(c, 4)
+
+            await cluster.shutdown()
+
+
+async def wait_for_workers(cluster, n):
+    timeout = 10
+    while len(cluster.active_workers) != n:
+        await asyncio.sleep(0.1)
+        timeout -= 0.1
+        assert timeout > 0, "Operation timed out"
+
+
+@pytest.mark.asyncio
+async def test_adaptive_scaling(tmpdir):
+    async with temp_gateway(
+        cluster_manager_class=InProcessClusterManager,
+        temp_dir=str(tmpdir.join("dask-gateway")),
+        adaptive_period=1000,
+        adaptive_wait_count=3,
+        adaptive_cooldown=0,
+    ) as gateway_proc:
+
+        async with Gateway(
+            address=gateway_proc.public_url, asynchronous=True
+        ) as gateway:
+
+            cluster = await gateway.new_cluster()
+            c = next(
+                c for c in gateway_proc.db.active_clusters() if c.name == cluster.name
+            )
+
+            # The scheduler reports its load
+            load = await gateway_proc.get_cluster_load(c)
+            assert load["target"] == 0
+            assert load["workers"] == 0
+
+            # Invalid ranges are rejected
+            with pytest.raises(Exception):
+                await cluster.adapt(minimum=2, maximum=1)
+            assert c.adaptive is None
+
+            # Enabling scales to within the bounds
+            await cluster.adapt(minimum=1, maximum=3)
+            await wait_for_workers(c, 1)
+
+            # Checks are driven manually from here, with a fake load
+            target = 0
+            real_get_cluster_load = gateway_proc.get_cluster_load
+
+            async def get_cluster_load(cluster):
+                return {"target": target, "tasks": 0, "occupancy": 0, "memory": 0}
+
+            gateway_proc.get_cluster_load = get_cluster_load
+
+            # Scale up happens immediately, up to the maximum
+            target = 10
+            await gateway_proc.adapt(c)
+            assert len(c.active_workers) == 3
+
+            # Scale down only happens after several consecutive checks
+            target = 2
+            await gateway_proc.adapt(c)
+            await gateway_proc.adapt(c)
+            target = 3
+            await gateway_proc.adapt(c)
+            target = 2
+            await gateway_proc.adapt(c)
+            await gateway_proc.adapt(c)
+            assert len(c.active_workers) == 3
+            await gateway_proc.adapt(c)
+            await wait_for_workers(c, 2)
+
+            # No scale down during the cooldown
+            gateway_proc.adaptive_cooldown = 1000
+            target = 3
+            await gateway_proc.adapt(c)
+            assert len(c.active_workers) == 3
+            target = 0
+            for _ in range(5):
+                await gateway_proc.adapt(c)
+            assert len(c.active_workers) == 3
+            gateway_proc.adaptive_cooldown = 0
+
+            # The background task checks all adaptive clusters
+            await cancel_task(gateway_proc.adaptive_task)
+            gateway_proc.adaptive_period = 0.01
+            gateway_proc.get_cluster_load = real_get_cluster_load
+            await cluster.adapt(minimum=1, maximum=3)
+            await wait_for_workers(c, 1)
+            assert c.adaptive is not None
+
+            # Failures scaling a cluster don't stop the background task
+            async def scale(cluster, n):
+                raise ValueError("Oh no")
+
+            real_scale = gateway_proc.scale
+            gateway_proc.scale = scale
+            gateway_proc.get_cluster_load = get_cluster_load
+            target = 2
+            await asyncio.sleep(0.1)
+            assert not gateway_proc.adaptive_task.done()
+            gateway_proc.scale = real_scale
+            gateway_proc.get_cluster_load = real_get_cluster_load
+
+            # Load on the cluster scales it up
+            gateway_proc.adaptive_target_duration = 0.1
+            with cluster.get_client(set_as_default=False) as client:
+                futs = client.map(lambda x: __import__("time").sleep(0.2), range(20))
+                await wait_for_workers(c, 3)
+                await client.gather(futs)
+
+            # Manual scaling disables adaptive scaling
+            await cluster.scale(1)
+            assert c.adaptive is None
+            assert cluster.name not in gateway_proc.adaptive_clusters
+
+            await cluster.shutdown()
+
+
+class MockWorkerState(object):
+    def __init__(self, name):
+        self.name = name
+        self.address = "tcp://%s:1234" % name
+
+
+class MockScheduler(object):
+    def __init__(self):
+        self.workers = {}
+
+    def add_worker(self, plugin, name):
+        ws = MockWorkerState(name)
+        self.workers[ws.address] = ws
+        plugin.add_worker(self, ws.address)
+        return ws
+
+    def remove_worker(self, plugin, ws):
+        del self.workers[ws.address]
+        plugin.remove_worker(self, ws.address)
+
+
+class RecordingGatewayClient(object):
+    def __init__(self):
+        self.calls = []
+
+    async def notify_workers_changed(self, added, removed):
+        self.calls.append(([ws.name for ws in added], [ws.name for ws in removed]))
+
+
+@pytest.mark.asyncio
+async def test_scheduler_plugin_batches_notifications():
+    gateway = RecordingGatewayClient()
+    plugin = GatewaySchedulerPlugin(gateway, IOLoop.current(), notify_interval=0.05)
+    scheduler = MockScheduler()
+
+    workers = [scheduler.add_worker(plugin, "worker-%d" % i) for i in range(500)]
+
+    timeout = 5
+    while not gateway.calls:
+        await asyncio.sleep(0.01)
+        timeout -= 0.01
+        assert timeout > 0, "Operation timed out"
+
+    # All adds are sent in a single request
+    assert len(gateway.calls) == 1
+    added, removed = gateway.calls[0]
+    assert added == [ws.name for ws in workers]
+    assert removed == []
+
+    # Only the latest notification for each worker is sent
+    plugin.queue_notification(workers[0], added=False)
+    plugin.queue_notification(workers[1], added=False)
+    plugin.queue_notification(workers[1], added=True)
+    await plugin.flush_notifications()
+    assert gateway.calls[-1] == (["worker-1"], ["worker-0"])
+
+    # Removals requested by the gateway aren't notified
+    plugin.shutdown_requested.add(workers[2].address)
+    scheduler.remove_worker(plugin, workers[2])
+    assert not plugin.timeouts
+    assert not plugin.pending_notifications
+
+
 @pytest.mark.asyncio
 async def test_gateway_stop_clusters_on_shutdown(tmpdir):
     async with temp_gateway(
@@ -377,7 +878,8 @@ async def test_gateway_stop_clusters_on_shutdown(tmpdir):
 
 
 @pytest.mark.asyncio
-async def test_gateway_resume_clusters_after_shutdown(tmpdir):
+@pytest.mark.parametrize("in_background", [False, True])
+async def test_gateway_resume_clusters_after_shutdown(tmpdir, in_background):
     temp_dir = str(tmpdir.join("dask-gateway"))
     os.mkdir(temp_dir, mode=0o700)
 
@@ -431,8 +933,15 @@ async def test_gateway_resume_clusters_after_shutdown(tmpdir):
         private_url=gateway_proc.private_url,
         public_url=gateway_proc.public_url,
         check_cluster_timeout=2,
+        check_cluster_concurrency=1,
+        check_clusters_in_background=in_background,
     ) as gateway_proc:
 
+        if in_background:
+            # Gateway starts before clusters are checked
+            tasks = [c._start_future for c in gateway_proc.db.active_clusters()]
+            await asyncio.gather(*tasks, return_exceptions=True)
+
         active_clusters = list(gateway_proc.db.active_clusters())
         assert len(active_clusters) == 1
 
@@ -453,3 +962,73 @@ async def test_gateway_resume_clusters_after_shutdown(tmpdir):
                 assert res == 2
 
             await cluster.shutdown()
+
+
+class MockCluster(object):
+    def __init__(self, name):
+        self.name = name
+        self.status = ClusterStatus.RUNNING
+        self.active_workers = []
+
+    def is_active(self):
+        return self.status < ClusterStatus.STOPPING
+
+
+@pytest.mark.asyncio
+async def test_check_clusters_concurrency(caplog):
+    gateway = DaskGateway(check_cluster_concurrency=3)
+    gateway.task_pool = TaskPool()
+    gateway.log = logging.getLogger("test_check_clusters")
+
+    active = 0
+    max_active = 0
+
+    async def check_cluster(cluster):
+        nonlocal active, max_active
+        active += 1
+        max_active = max(active, max_active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return cluster.name != "4"
+
+    gateway.check_cluster = check_cluster
+
+    clusters = [MockCluster(str(i)) for i in range(7)]
+    with caplog.at_level(logging.INFO, logger="test_check_clusters"):
+        results = await asyncio.gather(*gateway.check_clusters(clusters))
+
+    assert results == [True] * 4 + [False] + [True] * 2
+    assert max_active == 3
+    assert "Checked 3/7 clusters, 3 active so far" in caplog.text
+    assert "Checked 6/7 clusters, 5 active so far" in caplog.text
+    assert "All clusters have been checked, there are 6 active clusters" in (
+        caplog.text
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("running", [False, True])
+async def test_check_cluster_stopped_during_check(running):
+    gateway = DaskGateway()
+    calls = []
+    cluster = MockCluster("1")
+
+    async def get_cluster_workers(cluster):
+        # Cluster is stopped while the check is in progress
+        cluster.status = ClusterStatus.STOPPING
+        if not running:
+            raise ValueError("Scheduler unavailable")
+        return []
+
+    async def add_cluster_to_proxies(cluster):
+        calls.append("add_cluster_to_proxies")
+
+    async def stop_cluster(cluster, failed=False):
+        calls.append("stop_cluster")
+
+    gateway.get_cluster_workers = get_cluster_workers
+    gateway.add_cluster_to_proxies = add_cluster_to_proxies
+    gateway.stop_cluster = stop_cluster
+
+    assert not await gateway.check_cluster(cluster)
+    assert calls == []
@@ -0,0 +1,310 @@
+import asyncio
+import json
+import os
+import pwd
+import subprocess
+import sys
+import time
+
+import pytest
+
+from dask_gateway_server.managers.jobqueue import launcher
+from dask_gateway_server.managers.jobqueue.base import (
+    FileRateLimiter,
+    JobQueueClusterManager,
+    LauncherProcess,
+    parse_stop_errors,
+)
+from dask_gateway_server.managers.jobqueue.pbs import PBSClusterManager
+from dask_gateway_server.managers.jobqueue.slurm import SlurmClusterManager
+from dask_gateway_server.objects import ClusterInfo
+
+
+ENV = {"PATH": os.environ.get("PATH", "")}
+
+
+def test_launcher_oneshot(tmpdir):
+    staging_dir = str(tmpdir.join("staging"))
+    msg = {
+        "action": "start",
+        "cmd": ["cat"],
+        "env": ENV,
+        "stdin": "hello",
+        "staging_dir": staging_dir,
+        "files": {"script.sh": "echo hi"},
+    }
+    out = subprocess.check_output(
+        [sys.executable, launcher.__file__], input=json.dumps(msg).encode()
+    )
+    res = json.loads(out)
+    assert res["ok"]
+    assert res["returncode"] == 0
+    assert res["stdout"] == "hello"
+    with open(os.path.join(staging_dir, "script.sh")) as f:
+        assert f.read() == "echo hi"
+
+
+@pytest.mark.asyncio
+async def test_launcher_daemon(tmpdir):
+    proc = LauncherProcess([sys.executable, launcher.__file__, "--daemon"])
+    await proc.start()
+    try:
+        staging_dir = str(tmpdir.join("staging"))
+        res = await proc.request(
+            {
+                "action": "start",
+                "cmd": ["echo", "started"],
+                "env": ENV,
+                "staging_dir": staging_dir,
+                "files": {"script.sh": "echo hi"},
+            }
+        )
+        assert res["ok"]
+        assert res["stdout"] == "started\n"
+        assert os.path.exists(os.path.join(staging_dir, "script.sh"))
+
+        # Errors are reported without killing the daemon
+        res = await proc.request({"action": "unknown"})
+        assert not res["ok"]
+        assert proc.running
+
+        res = await proc.request(
+            {
+                "action": "stop",
+                "cmd": ["echo", "stopped"],
+                "env": ENV,
+                "staging_dir": staging_dir,
+            }
+        )
+        assert res["ok"]
+        assert res["stdout"] == "stopped\n"
+        assert not os.path.exists(staging_dir)
+
+        # Stop commands still run if the staging directory is already gone
+        res = await proc.request(
+            {
+                "action": "stop",
+                "cmd": ["echo", "stopped"],
+                "env": ENV,
+                "staging_dir": staging_dir,
+            }
+        )
+        assert res["ok"]
+        assert res["stdout"] == "stopped\n"
+    finally:
+        await proc.close()
+    assert not proc.running
+
+
+@pytest.mark.asyncio
+async def test_launcher_daemon_interrupted(tmpdir):
+    proc = LauncherProcess([sys.executable, launcher.__file__, "--daemon"])
+    await proc.start()
+    try:
+        req = {
+            "action": "start",
+            "cmd": ["sleep", "1"],
+            "env": ENV,
+            "staging_dir": str(tmpdir.join("staging")),
+            "files": {},
+        }
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(proc.request(req), 0.1)
+        # The response for the cancelled request is never read by a later one
+        assert not proc.running
+    finally:
+        await proc.close()
+
+
+@pytest.mark.asyncio
+async def test_launcher_daemon_exits():
+    code = "import sys; sys.stderr.write('sudo: a password is required'); sys.exit(1)"
+    proc = LauncherProcess([sys.executable, "-c", code])
+    await proc.start()
+    with pytest.raises(Exception) as exc:
+        await proc.request({"action": "unknown"})
+    assert "exited unexpectedly" in str(exc.value)
+    assert "a password is required" in str(exc.value)
+    assert not proc.running
+
+
+def test_parse_stop_errors():
+    stderr = (
+        "scancel: error: Kill job error on job id 12_1: Invalid job id specified\n"
+        "scancel: error: Kill job error on job id 12_2: Job/step already "
+        "completing or completed\n"
+        "qdel: Unknown Job Id 13[0].pbs\n"
+    )
+    errors = parse_stop_errors(["12_1", "12_2", "12_3", "13[0].pbs", "1"], stderr)
+    assert set(errors) == {"12_1", "13[0].pbs"}
+    assert "Invalid job id" in errors["12_1"]
+
+
+class BatchedCancelManager(JobQueueClusterManager):
+    supports_bulk_stop = True
+    cancel_command = "cancel"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = []
+
+    def get_bulk_stop_cmd_env(self, job_ids):
+        return [self.cancel_command] + list(job_ids), {}
+
+    async def do_as_user(self, user, action, **kwargs):
+        job_ids = kwargs["cmd"][1:]
+        self.calls.append(job_ids)
+        if "bad" in job_ids:
+            return 1, "", "cancel: error: could not cancel job bad\n"
+        return 0, "", ""
+
+
+@pytest.mark.asyncio
+async def test_stop_workers_batched():
+    manager = BatchedCancelManager(max_cancel_batch_size=3)
+    info = ClusterInfo(
+        username="alice",
+        cluster_name="cluster",
+        api_token="token",
+        tls_cert=b"",
+        tls_key=b"",
+    )
+    states = {"w%d" % i: {"job_id": str(i)} for i in range(7)}
+    states["w-bad"] = {"job_id": "bad"}
+    states["w-none"] = {}
+
+    errors = await manager.stop_workers(states, info, {})
+
+    # Jobs are cancelled in batches, workers without jobs are skipped
+    assert manager.calls == [["0", "1", "2"], ["3", "4", "5"], ["6", "bad"]]
+    # Only the failing job is reported
+    assert list(errors) == ["w-bad"]
+    assert "bad" in str(errors["w-bad"])
+
+
+def test_slurm_parse_job_states():
+    manager = SlurmClusterManager()
+    stdout = "1|R\n2|PD\n3_0|CG\n3_1|F\n\nmalformed line\n"
+    running, failed = manager.parse_job_states(stdout)
+    assert running == ["1", "3_0"]
+    assert failed == ["3_1"]
+
+
+def test_pbs_parse_job_states():
+    manager = PBSClusterManager()
+    stdout = json.dumps(
+        {
+            "pbs_version": "19.1.3",
+            "Jobs": {
+                "1.pbs": {"job_state": "R"},
+                "2.pbs": {"job_state": "Q"},
+                "3[0].pbs": {"job_state": "R"},
+                "3[1].pbs": {"job_state": "F"},
+            },
+        }
+    )
+    running, failed = manager.parse_job_states(stdout)
+    assert running == ["1.pbs", "3[0].pbs"]
+    assert failed == ["3[1].pbs"]
+    # No output, no jobs
+    assert manager.parse_job_states("") == ([], [])
+
+
+class FakeStatusManager(JobQueueClusterManager):
+    """Reports the jobs in ``self.running`` as running, all others pending"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.running = set()
+        self.checks = 0
+
+    def get_status_cmd_env(self, job_ids):
+        self.checks += 1
+        out = "\n".join(j for j in job_ids if j in self.running)
+        return [sys.executable, "-c", "print(%r)" % out], {}
+
+    def parse_job_states(self, stdout):
+        return stdout.split(), []
+
+
+@pytest.mark.asyncio
+async def test_job_state_tracker_backoff():
+    manager = FakeStatusManager(
+        status_poll_interval=0.01, status_poll_max_interval=5, status_poll_backoff=1
+    )
+    try:
+        fut = manager.is_job_running("1")
+        assert manager.get_status_poll_interval() == 0.01
+
+        # Polling backs off while the job remains pending
+        await asyncio.sleep(0.5)
+        checks = manager.checks
+        assert checks > 1
+        assert manager.get_status_poll_interval() >= 0.5
+        await asyncio.sleep(0.2)
+        assert manager.checks - checks <= 1
+        assert not fut.done()
+
+        # Backoff also scales with the number of pending jobs
+        interval = manager.get_status_poll_interval()
+        futs = [manager.is_job_running(str(i)) for i in range(2, 100)]
+        t = manager.job_track_times["1"]
+        manager.job_track_times.update(dict.fromkeys(map(str, range(2, 100)), t))
+        assert manager.get_status_poll_interval() > interval
+
+        # New jobs reset the interval and wake up the tracker
+        manager.running.update(["1", "100"])
+        fut2 = manager.is_job_running("100")
+        assert await asyncio.wait_for(fut2, 1)
+        assert await asyncio.wait_for(fut, 1)
+        assert not any(f.done() for f in futs)
+    finally:
+        await manager.task_pool.close()
+
+
+@pytest.mark.asyncio
+async def test_file_rate_limiter(tmpdir):
+    path = str(tmpdir.join("ratelimit"))
+    limiters = [FileRateLimiter(path, 0.1) for _ in range(3)]
+
+    start = time.time()
+    await asyncio.gather(*(r.acquire() for r in limiters))
+    # All share the same limit, so acquires are spaced out
+    assert time.time() - start >= 0.2
+
+    # Malformed files are ignored
+    with open(path, "w") as f:
+        f.write("not a number")
+    await asyncio.wait_for(limiters[0].acquire(), 1)
+
+
+@pytest.mark.parametrize("cls", [SlurmClusterManager, PBSClusterManager])
+def test_submit_template(cls):
+    manager = cls(environment={"FOO": "bar"}, account="myaccount")
+    info = ClusterInfo(
+        username=pwd.getpwuid(os.getuid()).pw_name,
+        cluster_name="cluster",
+        api_token="token",
+        tls_cert=b"",
+        tls_key=b"",
+    )
+    for name in ["worker-1", "worker-2"]:
+        expected = manager.get_submit_cmd_env_stdin(info, worker_name=name)
+        assert manager.get_worker_submit_cmd_env_stdin(info, name) == expected
+    # Template is built once per cluster
+    assert list(manager.submit_templates) == ["cluster"]
+
+
+@pytest.mark.asyncio
+async def test_submit_template_evicted_on_stop():
+    manager = BatchedCancelManager()
+    manager.submit_templates = {"cluster": object(), "other": object()}
+    info = ClusterInfo(
+        username="alice",
+        cluster_name="cluster",
+        api_token="token",
+        tls_cert=b"",
+        tls_key=b"",
+    )
+    await manager.stop_cluster(info, {})
+    assert list(manager.submit_templates) == ["other"]
@@ -0,0 +1,368 @@
+import asyncio
+import logging
+import queue
+
+import pytest
+
+pytest.importorskip("kubernetes")
+
+import kubernetes.client
+from kubernetes.client.models import (
+    V1ListMeta,
+    V1ObjectMeta,
+    V1Pod,
+    V1PodList,
+    V1PodStatus,
+    V1SecretList,
+)
+from kubernetes.client.rest import ApiException
+
+from dask_gateway_server.managers.kubernetes import (
+    AsyncKubeAPI,
+    KubeClusterManager,
+    PodInformer,
+    serialize_kube_object,
+)
+from dask_gateway_server.objects import ClusterInfo
+from dask_gateway_server.utils import cancel_task
+
+
+class FakeKubeAPI(kubernetes.client.CoreV1Api):
+    """A stand-in for the kubernetes api server, storing pods in memory"""
+
+    def __init__(self):
+        self.pods = {}
+        self.secrets = {}
+        self.events = queue.Queue()
+        self.resource_version = 0
+        self.list_calls = 0
+        self.delete_calls = 0
+
+    def _update(self, event_type, name, phase, labels=None):
+        self.resource_version += 1
+        pod = V1Pod(
+            metadata=V1ObjectMeta(
+                name=name,
+                labels=labels,
+                resource_version=str(self.resource_version),
+            ),
+            status=V1PodStatus(phase=phase),
+        )
+        if event_type == "DELETED":
+            self.pods.pop(name, None)
+        else:
+            self.pods[name] = pod
+        self.events.put({"type": event_type, "object": pod})
+
+    def set_phase(self, name, phase, labels=None):
+        if name in self.pods:
+            self._update("MODIFIED", name, phase, self.pods[name].metadata.labels)
+        else:
+            self._update("ADDED", name, phase, labels)
+
+    def delete_pod(self, name):
+        pod = self.pods[name]
+        self._update("DELETED", name, pod.status.phase, pod.metadata.labels)
+
+    def expire_watch(self):
+        self.events.put({"type": "ERROR", "object": None})
+
+    def list_namespaced_pod(self, namespace, label_selector=None, **kwargs):
+        self.list_calls += 1
+        # Events before the list are included in the list result
+        while not self.events.empty():
+            self.events.get()
+        return V1PodList(
+            items=[p for p in self.pods.values() if matches(p, label_selector)],
+            metadata=V1ListMeta(resource_version=str(self.resource_version)),
+        )
+
+    def create_namespaced_pod(self, namespace, pod):
+        if isinstance(pod, dict):
+            metadata = pod["metadata"]
+            self.set_phase(metadata["name"], "Pending", metadata["labels"])
+        else:
+            self.set_phase(pod.metadata.name, "Pending", pod.metadata.labels)
+
+    def delete_collection_namespaced_pod(self, namespace, label_selector=None):
+        self.delete_calls += 1
+        for pod in list(self.pods.values()):
+            if matches(pod, label_selector):
+                self.delete_pod(pod.metadata.name)
+
+    def create_namespaced_secret(self, namespace, secret):
+        self.secrets[secret.metadata.name] = secret
+
+    def delete_namespaced_secret(self, name, namespace):
+        if name not in self.secrets:
+            raise ApiException(status=404)
+        del self.secrets[name]
+
+    def list_namespaced_secret(self, namespace, label_selector=None):
+        return V1SecretList(
+            items=[s for s in self.secrets.values() if matches(s, label_selector)]
+        )
+
+
+def matches(obj, label_selector):
+    labels = obj.metadata.labels or {}
+    for term in label_selector.split(","):
+        k, v = term.split("=")
+        if labels.get(k) != v:
+            return False
+    return True
+
+
+class FakeWatch(object):
+    def __init__(self, api):
+        self.api = api
+        self.stopped = False
+
+    def stream(self, func, *args, **kwargs):
+        assert func == self.api.list_namespaced_pod
+        assert kwargs["resource_version"] is not None
+        while not self.stopped:
+            try:
+                yield self.api.events.get(timeout=0.01)
+            except queue.Empty:
+                pass
+
+    def stop(self):
+        self.stopped = True
+
+
+LABELS = {"app.kubernetes.io/name": "dask-gateway"}
+
+
+def new_informer(api):
+    return PodInformer(
+        api,
+        "default",
+        "app.kubernetes.io/name=dask-gateway",
+        logging.getLogger("test"),
+        watch_factory=lambda: FakeWatch(api),
+    )
+
+
+@pytest.mark.asyncio
+async def test_pod_informer():
+    api = FakeKubeAPI()
+    api.set_phase("running", "Running", LABELS)
+    api.set_phase("pending", "Pending", LABELS)
+
+    informer = new_informer(api)
+    task = asyncio.ensure_future(informer.run())
+    try:
+        # Already running pods return immediately
+        assert await asyncio.wait_for(informer.wait_for_pod("running"), 1) == "Running"
+
+        # Waiters are notified on phase transitions
+        waiter = asyncio.ensure_future(informer.wait_for_pod("pending"))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        api.set_phase("pending", "Running")
+        assert await asyncio.wait_for(waiter, 1) == "Running"
+
+        # Failed and deleted pods are reported
+        api.set_phase("failing", "Pending", LABELS)
+        waiter = asyncio.ensure_future(informer.wait_for_pod("failing"))
+        api.set_phase("failing", "Failed")
+        assert await asyncio.wait_for(waiter, 1) == "Failed"
+
+        api.set_phase("deleted", "Pending", LABELS)
+        waiter = asyncio.ensure_future(informer.wait_for_pod("deleted"))
+        await asyncio.sleep(0.05)
+        api.delete_pod("deleted")
+        assert await asyncio.wait_for(waiter, 1) == "Deleted"
+        assert "deleted" not in informer.pods
+
+        # Cancelled waiters are cleaned up
+        waiter = asyncio.ensure_future(informer.wait_for_pod("other"))
+        await asyncio.sleep(0.01)
+        await cancel_task(waiter)
+        assert not informer.waiters
+    finally:
+        await cancel_task(task)
+
+
+@pytest.mark.asyncio
+async def test_pod_informer_relists_on_expired_watch():
+    api = FakeKubeAPI()
+    informer = new_informer(api)
+    task = asyncio.ensure_future(informer.run())
+    try:
+        api.set_phase("pod", "Pending", LABELS)
+        waiter = asyncio.ensure_future(informer.wait_for_pod("pod"))
+        await asyncio.sleep(0.05)
+        assert api.list_calls == 1
+
+        # Expired watches result in a relist, which sees the latest state
+        api.pods["pod"].status.phase = "Running"
+        api.expire_watch()
+        assert await asyncio.wait_for(waiter, 1) == "Running"
+        assert api.list_calls == 2
+
+        # Pods deleted between watches are removed on relist
+        api.set_phase("other", "Pending", LABELS)
+        waiter = asyncio.ensure_future(informer.wait_for_pod("other"))
+        await asyncio.sleep(0.05)
+        assert "other" in informer.pods
+        del api.pods["other"]
+        api.expire_watch()
+        assert await asyncio.wait_for(waiter, 1) == "Deleted"
+        assert "other" not in informer.pods
+        assert "pod" in informer.pods
+    finally:
+        await cancel_task(task)
+
+
+def new_cluster_info(name="cluster"):
+    return ClusterInfo(
+        username="alice",
+        cluster_name=name,
+        api_token="token",
+        tls_cert=b"cert",
+        tls_key=b"key",
+    )
+
+
+def test_worker_pod_template():
+    manager = KubeClusterManager(
+        kube_client=FakeKubeAPI(),
+        namespace="default",
+        image_pull_secrets=["my-secret"],
+        environment={"FOO": "bar"},
+    )
+    info = new_cluster_info()
+
+    for name in ["worker-1", "worker-2"]:
+        sol = serialize_kube_object(manager.make_pod_spec(info, "secret", name))
+        res = manager.make_worker_pod(info, "secret", name)
+        assert res == sol
+
+    # The template itself is never modified
+    template = manager.worker_pod_templates["cluster"]
+    assert template.pod["metadata"]["labels"]["worker-name"] == template.PLACEHOLDER
+
+
+@pytest.mark.asyncio
+async def test_worker_pod_template_evicted_on_stop():
+    api = FakeKubeAPI()
+    manager = KubeClusterManager(kube_client=api, namespace="default")
+    manager.wait_for_pod_running = lambda name: asyncio.sleep(0)
+    info = new_cluster_info()
+
+    async for state in manager.start_cluster(info):
+        pass
+    async for _ in manager.start_worker("worker-1", info, state):
+        pass
+    assert "cluster" in manager.worker_pod_templates
+    assert api.pods["dask-gateway-worker-worker-1"].metadata.labels == {
+        **manager.common_labels,
+        "app.kubernetes.io/component": "dask-gateway-worker",
+        "cluster-name": "cluster",
+        "worker-name": "worker-1",
+    }
+
+    await manager.stop_cluster(info, state)
+    assert "cluster" not in manager.worker_pod_templates
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_kube_start_worker_waits_for_pod():
+    api = FakeKubeAPI()
+    manager = KubeClusterManager(kube_client=api, namespace="default")
+    manager._pod_informer = new_informer(api)
+    task = asyncio.ensure_future(manager._pod_informer.run())
+    info = new_cluster_info()
+    try:
+        # Worker start completes once the pod is running
+        gen = manager.start_worker("worker-1", info, {"secret_name": "secret"})
+        state = await gen.__anext__()
+        pod_name = state["pod_name"]
+        finish = asyncio.ensure_future(gen.__anext__())
+        await asyncio.sleep(0.05)
+        assert not finish.done()
+        api.set_phase(pod_name, "Running")
+        with pytest.raises(StopAsyncIteration):
+            await asyncio.wait_for(finish, 1)
+
+        # Worker start fails if the pod fails
+        gen = manager.start_worker("worker-2", info, {"secret_name": "secret"})
+        state = await gen.__anext__()
+        api.set_phase(state["pod_name"], "Failed")
+        with pytest.raises(Exception) as exc:
+            await asyncio.wait_for(gen.__anext__(), 1)
+        assert "Failed" in str(exc.value)
+    finally:
+        await cancel_task(task)
+
+
+class FakeAsyncKubeAPI(object):
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.pods = []
+
+    async def create_namespaced_pod(self, namespace, pod):
+        self.active += 1
+        self.max_active = max(self.active, self.max_active)
+        await asyncio.sleep(0.01)
+        self.pods.append(pod)
+        self.active -= 1
+
+
+@pytest.mark.asyncio
+async def test_async_kube_api_concurrency_limit():
+    api = AsyncKubeAPI("default", max_concurrent_requests=5)
+    # Skip loading configuration, use a fake client
+    api.kube_client = FakeAsyncKubeAPI()
+
+    pods = [V1Pod(metadata=V1ObjectMeta(name="pod-%d" % i)) for i in range(20)]
+    await asyncio.gather(*(api.create_pod(p) for p in pods))
+
+    assert api.kube_client.max_active == 5
+    # Models are serialized before being passed to the async client
+    assert {p["metadata"]["name"] for p in api.kube_client.pods} == {
+        "pod-%d" % i for i in range(20)
+    }
+
+
+@pytest.mark.asyncio
+async def test_kube_bulk_shutdown_and_orphan_cleanup():
+    api = FakeKubeAPI()
+    manager = KubeClusterManager(kube_client=api, namespace="default")
+    # Don't wait on the informer, pods never start running here
+    manager.wait_for_pod_running = lambda name: asyncio.sleep(0)
+
+    states = {}
+    for name in ["cluster-1", "cluster-2", "cluster-3"]:
+        info = new_cluster_info(name)
+        async for state in manager.start_cluster(info):
+            states[name] = state
+        for i in range(3):
+            worker_name = "%s-%d" % (name, i)
+            async for _ in manager.start_worker(worker_name, info, states[name]):
+                pass
+    assert len(api.pods) == 12
+    assert len(api.secrets) == 3
+
+    # Stopping a cluster deletes all its pods in one call
+    await manager.stop_cluster(new_cluster_info("cluster-1"), states["cluster-1"])
+    assert api.delete_calls == 1
+    assert len(api.pods) == 8
+    assert len(api.secrets) == 2
+
+    # Resources for clusters that aren't active are removed
+    n = await manager.cleanup_orphans({"cluster-2"})
+    assert n == 2
+    assert {p.metadata.labels["cluster-name"] for p in api.pods.values()} == {
+        "cluster-2"
+    }
+    assert list(api.secrets) == ["dask-gateway-tls-cluster-2"]
+
+    # Nothing to cleanup
+    assert await manager.cleanup_orphans({"cluster-2"}) == 0
+
+    await manager.close()
@@ -1,6 +1,11 @@
+import asyncio
+import os
+
+import pytest
+
 from dask_gateway_server.managers.local import is_running
 
-from .utils import ClusterManagerTests, LocalTestingClusterManager
+from .utils import ClusterManagerTests, LocalTestingClusterManager, gateway_test
 
 
 class TestLocalClusterManager(ClusterManagerTests):
@@ -28,3 +33,57 @@ class TestLocalClusterManager(ClusterManagerTests):
 
     def num_start_worker_stages(self):
         return 1
+
+
+class TestLocalClusterManagerWorkerPool(TestLocalClusterManager):
+    def new_manager(self, **kwargs):
+        return LocalTestingClusterManager(worker_pool_size=2, **kwargs)
+
+    @pytest.mark.asyncio
+    @gateway_test
+    async def test_worker_pool(self, gateway, manager):
+        cluster = gateway.new_cluster()
+        async for state in manager.start_cluster(cluster.info):
+            cluster.state = state
+        await asyncio.wait_for(cluster._connect_future, manager.cluster_connect_timeout)
+
+        # Parked workers are started with the cluster
+        await manager.worker_pool_task
+        parked = [p.pid for p in manager.worker_pool]
+        assert len(parked) == 2
+
+        # Workers are assigned from the pool, which is refilled
+        workers = [gateway.new_worker(cluster.name) for _ in range(3)]
+        for w in workers:
+            async for state in manager.start_worker(
+                w.name, cluster.info, cluster.state
+            ):
+                w.state = state
+        assert [w.state["pid"] for w in workers[:2]] == parked
+        assert workers[2].state["pid"] not in parked
+        await asyncio.gather(
+            *(
+                asyncio.wait_for(w._connect_future, manager.worker_connect_timeout)
+                for w in workers
+            )
+        )
+        await manager.worker_pool_task
+        assert len(manager.worker_pool) == 2
+
+        # Assigned workers log to the cluster's logs directory
+        logsdir = manager.get_logs_directory(
+            manager.get_working_directory(cluster.info)
+        )
+        assert os.path.exists(os.path.join(logsdir, "worker-%s.log" % workers[0].name))
+
+        for w in workers:
+            await manager.stop_worker(w.name, w.state, cluster.info, cluster.state)
+            assert self.worker_is_stopped(manager, cluster.info, cluster.state, w.state)
+            gateway.mark_worker_stopped(cluster.name, w.name)
+        await manager.stop_cluster(cluster.info, cluster.state)
+        gateway.mark_cluster_stopped(cluster.name)
+
+        # Unassigned parked workers exit on close
+        pool = list(manager.worker_pool)
+        await manager.close()
+        assert all(p.returncode is not None for p in pool)
@@ -0,0 +1,138 @@
+import asyncio
+import datetime
+import ssl
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa, ec, ed25519
+
+from dask_gateway_server.tls import KeypairPool, new_keypair
+from dask_gateway_server.utils import cancel_task
+
+
+def get_dns_names(cert_bytes):
+    cert = x509.load_pem_x509_certificate(cert_bytes, default_backend())
+    ext = cert.extensions.get_extension_for_class(x509.SubjectAlternativeName)
+    return ext.value.get_values_for_type(x509.DNSName)
+
+
+@pytest.mark.parametrize(
+    "key_type, key_cls",
+    [
+        ("rsa-2048", rsa.RSAPrivateKey),
+        ("ecdsa-p256", ec.EllipticCurvePrivateKey),
+        ("ed25519", ed25519.Ed25519PrivateKey),
+    ],
+)
+def test_new_keypair(tmpdir, key_type, key_cls):
+    cert_bytes, key_bytes = new_keypair(
+        "mycluster", key_type=key_type, validity_days=10
+    )
+
+    key = serialization.load_pem_private_key(key_bytes, None, default_backend())
+    assert isinstance(key, key_cls)
+
+    cert = x509.load_pem_x509_certificate(cert_bytes, default_backend())
+    assert "mycluster" in get_dns_names(cert_bytes)
+    assert cert.not_valid_after - cert.not_valid_before == datetime.timedelta(days=10)
+
+    # Credentials are usable by python's ssl module
+    cert_path = str(tmpdir.join("dask.crt"))
+    key_path = str(tmpdir.join("dask.pem"))
+    with open(cert_path, "wb") as f:
+        f.write(cert_bytes)
+    with open(key_path, "wb") as f:
+        f.write(key_bytes)
+    ctx = ssl.create_default_context(purpose=ssl.Purpose.SERVER_AUTH, cafile=cert_path)
+    ctx.load_cert_chain(cert_path, key_path)
+
+
+def test_new_keypair_invalid_key_type():
+    with pytest.raises(ValueError) as exc:
+        new_keypair("mycluster", key_type="dsa")
+    assert "dsa" in str(exc.value)
+
+
+@pytest.mark.asyncio
+async def test_keypair_pool():
+    pool = KeypairPool(size=2)
+
+    # Empty pool falls back to generating inline
+    sni, cert, key = pool.get()
+    assert sni in get_dns_names(cert)
+    assert pool.misses == 1
+    assert pool.hits == 0
+
+    task = asyncio.ensure_future(pool.run())
+    try:
+        # Pool is filled in the background
+        timeout = 10
+        while len(pool) < 2:
+            await asyncio.sleep(0.05)
+            timeout -= 0.05
+            assert timeout > 0, "Operation timed out"
+
+        sni2, cert2, key2 = pool.get()
+        assert sni2 != sni
+        assert sni2 in get_dns_names(cert2)
+        assert pool.misses == 1
+        assert pool.hits == 1
+
+        # Pool is refilled after use
+        timeout = 10
+        while len(pool) < 2:
+            await asyncio.sleep(0.05)
+            timeout -= 0.05
+            assert timeout > 0, "Operation timed out"
+    finally:
+        await cancel_task(task)
+
+
+@pytest.mark.asyncio
+async def test_keypair_pool_retries_on_failure(caplog):
+    pool = KeypairPool(size=2)
+    pool.retry_delay = 0.01
+
+    n_failures = 3
+    new_entry = pool.new_entry
+
+    def flaky_new_entry():
+        nonlocal n_failures
+        if n_failures:
+            n_failures -= 1
+            raise ValueError("Oh no")
+        return new_entry()
+
+    pool.new_entry = flaky_new_entry
+
+    task = asyncio.ensure_future(pool.run())
+    try:
+        # Failures are logged, and the pool is still filled
+        timeout = 10
+        while len(pool) < 2:
+            await asyncio.sleep(0.05)
+            timeout -= 0.05
+            assert timeout > 0, "Operation timed out"
+        assert not task.done()
+        assert "Failed to generate TLS credentials" in caplog.text
+    finally:
+        await cancel_task(task)
+
+
+@pytest.mark.asyncio
+async def test_keypair_pool_disabled():
+    pool = KeypairPool(size=0)
+    # Returns immediately
+    await asyncio.wait_for(pool.run(), 1)
+    assert len(pool) == 0
+    pool.get()
+    assert pool.misses == 1
+
+
+def test_keypair_pool_key_type():
+    pool = KeypairPool(key_type="ecdsa-p256")
+    _, _, key_bytes = pool.get()
+    key = serialization.load_pem_private_key(key_bytes, None, default_backend())
+    assert isinstance(key, ec.EllipticCurvePrivateKey)
@@ -0,0 +1,363 @@
+import asyncio
+import itertools
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+skein = pytest.importorskip("skein")
+
+from dask_gateway_server.managers.yarn import YarnClusterManager
+from dask_gateway_server.objects import ClusterInfo
+from dask_gateway_server.utils import cancel_task
+
+
+class FakeSkeinClient(skein.Client):
+    """A stand-in for the skein driver, no java process is started"""
+
+    def __init__(self):
+        self.killed = []
+        self.apps = {}
+        self.list_calls = 0
+        self.report_calls = 0
+
+    def submit(self, spec):
+        app_id = "application_%d" % len(self.apps)
+        self.apps[app_id] = "SUBMITTED"
+        return app_id
+
+    def _report(self, app_id):
+        return SimpleNamespace(
+            id=app_id, state=self.apps[app_id], host="host", port=8786
+        )
+
+    def get_applications(self, states=None):
+        self.list_calls += 1
+        return [self._report(k) for k, v in self.apps.items() if v in states]
+
+    def application_report(self, app_id):
+        self.report_calls += 1
+        return self._report(app_id)
+
+    def kill_application(self, app_id, user=""):
+        self.killed.append(app_id)
+
+
+class FakeAppClient(object):
+    """A stand-in for an application master, storing containers in memory"""
+
+    def __init__(self, address, app_id, security=None):
+        self.address = address
+        self.app_id = app_id
+        self.containers = {}
+        self.get_containers_calls = 0
+        self.counter = itertools.count()
+        self.add_delay = 0
+
+    def add_container(self, service, env=None):
+        time.sleep(self.add_delay)
+        container_id = "container_%d" % next(self.counter)
+        self.containers[container_id] = "WAITING"
+        return SimpleNamespace(id=container_id)
+
+    def kill_container(self, container_id):
+        self.containers[container_id] = "KILLED"
+
+    def get_containers(self, services=None, states=None):
+        self.get_containers_calls += 1
+        return [
+            SimpleNamespace(id=k, state=v)
+            for k, v in self.containers.items()
+            if states is None or v in states
+        ]
+
+
+def new_cluster_info(name="cluster"):
+    return ClusterInfo(
+        username="alice",
+        cluster_name=name,
+        api_token="token",
+        tls_cert=b"cert",
+        tls_key=b"key",
+    )
+
+
+def new_cluster_state(name="cluster"):
+    return {"app_id": "application_%s" % name, "app_address": "%s:8786" % name}
+
+
+@pytest.mark.asyncio
+async def test_app_client_cache(monkeypatch):
+    monkeypatch.setattr(skein, "ApplicationClient", FakeAppClient)
+    manager = YarnClusterManager(
+        skein_client=FakeSkeinClient(), app_client_cache_max_size=2
+    )
+
+    def get(name):
+        return manager._get_app_client(new_cluster_info(name), new_cluster_state(name))
+
+    app1 = get("cluster-1")
+    assert app1.app_id == "application_cluster-1"
+    assert get("cluster-1") is app1
+
+    # Least recently used client is evicted
+    app2 = get("cluster-2")
+    assert get("cluster-1") is app1
+    get("cluster-3")
+    assert list(manager.app_client_cache) == ["cluster-1", "cluster-3"]
+    assert get("cluster-2") is not app2
+
+    # Stopping a cluster evicts its client
+    await manager.stop_cluster(new_cluster_info("cluster-1"), new_cluster_state())
+    assert "cluster-1" not in manager.app_client_cache
+    assert manager.skein_client.killed == ["application_cluster"]
+
+
+@pytest.mark.asyncio
+async def test_container_state_tracker(monkeypatch):
+    monkeypatch.setattr(skein, "ApplicationClient", FakeAppClient)
+    manager = YarnClusterManager(
+        skein_client=FakeSkeinClient(), container_status_poll_interval=0.01
+    )
+    info = new_cluster_info()
+    state = new_cluster_state()
+    app = manager._get_app_client(info, state)
+
+    gens = [manager.start_worker("worker-%d" % i, info, state) for i in range(3)]
+    ids = [(await g.__anext__())["container_id"] for g in gens]
+    finish = [asyncio.ensure_future(g.__anext__()) for g in gens]
+    await asyncio.sleep(0.05)
+    assert not any(f.done() for f in finish)
+    # A single tracker polls for all pending containers
+    assert len(manager.container_trackers) == 1
+    calls = app.get_containers_calls
+    await asyncio.sleep(0.05)
+    assert app.get_containers_calls - calls < 10
+
+    # Running containers complete startup
+    app.containers[ids[0]] = "RUNNING"
+    with pytest.raises(StopAsyncIteration):
+        await asyncio.wait_for(finish[0], 1)
+
+    # Failed containers fail quickly
+    app.containers[ids[1]] = "FAILED"
+    with pytest.raises(Exception) as exc:
+        await asyncio.wait_for(finish[1], 1)
+    assert ids[1] in str(exc.value)
+
+    # The tracker exits once no containers are pending
+    app.containers[ids[2]] = "RUNNING"
+    with pytest.raises(StopAsyncIteration):
+        await asyncio.wait_for(finish[2], 1)
+    await asyncio.sleep(0.05)
+    assert not manager.container_trackers
+
+    # Bulk starts wait on all containers at once
+    gen = manager.start_workers(["worker-3", "worker-4"], info, state)
+    states = await gen.__anext__()
+    finish = asyncio.ensure_future(gen.__anext__())
+    app.containers[states["worker-3"]["container_id"]] = "RUNNING"
+    app.containers[states["worker-4"]["container_id"]] = "KILLED"
+    failed = await asyncio.wait_for(finish, 1)
+    assert list(failed) == ["worker-4"]
+    assert isinstance(failed["worker-4"], Exception)
+    with pytest.raises(StopAsyncIteration):
+        await gen.__anext__()
+
+    # Stopping the cluster stops the tracker, failing any pending workers
+    gen = manager.start_worker("worker-5", info, state)
+    await gen.__anext__()
+    finish = asyncio.ensure_future(gen.__anext__())
+    await asyncio.sleep(0.02)
+    tracker = manager.container_trackers["cluster"]
+    await manager.stop_cluster(info, state)
+    assert tracker.done()
+    assert not manager.container_trackers
+    with pytest.raises(Exception, match="failed"):
+        await asyncio.wait_for(finish, 1)
+
+
+@pytest.mark.asyncio
+async def test_start_workers_in_chunks(monkeypatch):
+    monkeypatch.setattr(skein, "ApplicationClient", FakeAppClient)
+    manager = YarnClusterManager(
+        skein_client=FakeSkeinClient(),
+        container_status_poll_interval=0.01,
+        worker_start_concurrency=2,
+    )
+    info = new_cluster_info()
+    state = new_cluster_state()
+    app = manager._get_app_client(info, state)
+
+    # Containers are requested concurrently, and saved a chunk at a time
+    active = max_active = 0
+    lock = threading.Lock()
+    add_container = app.add_container
+
+    def counting_add_container(*args, **kwargs):
+        nonlocal active, max_active
+        with lock:
+            active += 1
+            max_active = max(active, max_active)
+        try:
+            return add_container(*args, **kwargs)
+        finally:
+            with lock:
+                active -= 1
+
+    app.add_delay = 0.05
+    monkeypatch.setattr(app, "add_container", counting_add_container)
+    names = ["worker-%d" % i for i in range(5)]
+    gen = manager.start_workers(names, info, state)
+    chunks = [await gen.__anext__() for _ in range(3)]
+    assert [list(c) for c in chunks] == [names[:2], names[2:4], names[4:]]
+    assert max_active == 2
+    for c in chunks:
+        for s in c.values():
+            app.containers[s["container_id"]] = "RUNNING"
+    with pytest.raises(StopAsyncIteration):
+        await asyncio.wait_for(gen.__anext__(), 1)
+
+    # If interrupted, containers that weren't yet saved are stopped
+    app.containers.clear()
+    gen = manager.start_workers(names, info, state)
+    first = asyncio.ensure_future(gen.__anext__())
+    await asyncio.sleep(0.01)
+    await cancel_task(first)
+    timeout = 1
+    while not app.containers or any(s != "KILLED" for s in app.containers.values()):
+        await asyncio.sleep(0.05)
+        timeout -= 0.05
+        assert timeout > 0, "Operation timed out"
+    assert len(app.containers) == 2
+
+    await manager.stop_cluster(info, state)
+
+
+@pytest.mark.asyncio
+async def test_app_state_tracker(tmpdir):
+    client = FakeSkeinClient()
+    manager = YarnClusterManager(
+        skein_client=client, app_status_poll_interval=0.01, temp_dir=str(tmpdir)
+    )
+
+    gens = [manager.start_cluster(new_cluster_info("c-%d" % i)) for i in range(3)]
+    ids = [(await g.__anext__())["app_id"] for g in gens]
+    finish = [asyncio.ensure_future(g.__anext__()) for g in gens]
+    await asyncio.sleep(0.05)
+    assert not any(f.done() for f in finish)
+    # Starting applications are polled together, without individual reports
+    assert 0 < client.list_calls < 10
+    assert client.report_calls == 0
+
+    # Running applications complete startup
+    client.apps[ids[0]] = "RUNNING"
+    state = await asyncio.wait_for(finish[0], 1)
+    assert state == {"app_id": ids[0], "app_address": "host:8786"}
+
+    # Completed applications fail
+    client.apps[ids[1]] = "FAILED"
+    with pytest.raises(Exception, match="failed to start"):
+        await asyncio.wait_for(finish[1], 1)
+    assert client.report_calls > 0
+
+    client.apps[ids[2]] = "RUNNING"
+    await asyncio.wait_for(finish[2], 1)
+
+    # No polling once nothing is starting
+    await asyncio.sleep(0.02)
+    calls = client.list_calls
+    await asyncio.sleep(0.05)
+    assert client.list_calls == calls
+    await cancel_task(manager.app_tracker)
+
+
+FAKE_HDFS = """#!{python}
+# A fake `hdfs dfs`, storing files in a local directory
+import os, shutil, sys
+
+root = {root!r}
+args = sys.argv[2:]
+cmd = args.pop(0)
+args = [a for a in args if a not in ("-p", "-f")]
+paths = [os.path.join(root, a[len("hdfs:///"):]) for a in args if a.startswith("hdfs")]
+
+if cmd == "-stat":
+    st = os.stat(paths[0])
+    print(st.st_size, int(st.st_mtime * 1000))
+elif cmd == "-mkdir":
+    os.makedirs(paths[0], exist_ok=True)
+elif cmd == "-put":
+    with open(os.path.join(root, "puts.log"), "a") as f:
+        f.write(args[0] + "\\n")
+    shutil.copy(args[0], paths[0])
+elif cmd == "-mv":
+    if os.path.exists(paths[1]):
+        sys.exit(1)
+    os.rename(paths[0], paths[1])
+elif cmd == "-rm":
+    os.remove(paths[0])
+"""
+
+
+@pytest.mark.asyncio
+async def test_staging_cache(tmpdir):
+    root = tmpdir.mkdir("hdfs")
+    hdfs = tmpdir.join("hdfs.py")
+    hdfs.write(FAKE_HDFS.format(python=sys.executable, root=str(root)))
+    os.chmod(str(hdfs), 0o755)
+
+    def n_uploads():
+        puts = root.join("puts.log")
+        return len(puts.readlines()) if puts.exists() else 0
+
+    env = tmpdir.join("environment.tar.gz")
+    env.write_binary(b"environment")
+    config = tmpdir.join("config.yaml")
+    config.write("config")
+    localize_files = {
+        "environment": str(env),
+        "config": {"source": str(config), "type": "file"},
+        "remote": "hdfs:///path/to/remote.zip",
+    }
+
+    def new_manager(hdfs_command=str(hdfs)):
+        return YarnClusterManager(
+            skein_client=FakeSkeinClient(),
+            localize_files=localize_files,
+            staging_cache_directory="/staging",
+            hdfs_command=hdfs_command,
+        )
+
+    manager = new_manager()
+    files = await manager.get_localize_files()
+    assert n_uploads() == 2
+    environment = files["environment"]
+    assert environment.source.startswith("hdfs:///staging/")
+    assert environment.source.endswith("/environment.tar.gz")
+    assert str(environment.visibility).upper() == "PUBLIC"
+    assert environment.size == len(b"environment")
+    assert files["config"].source.endswith("/config.yaml")
+    # Remote files are left alone
+    assert files["remote"] == "hdfs:///path/to/remote.zip"
+
+    # Files are only uploaded once, even across restarts
+    files2 = await manager.get_localize_files()
+    assert files2["environment"] is environment
+    files3 = await new_manager().get_localize_files()
+    assert files3["environment"].source == environment.source
+    assert n_uploads() == 2
+
+    # Changed files are uploaded again
+    env.write_binary(b"new environment")
+    files4 = await manager.get_localize_files()
+    assert files4["environment"].source != environment.source
+    assert n_uploads() == 3
+
+    # Files are uploaded with the application if caching fails
+    manager = new_manager(hdfs_command="false")
+    files5 = await manager.get_localize_files()
+    assert files5["environment"] == str(env)
@@ -48,6 +48,11 @@ class LocalTestingClusterManager(UnsafeLocalClusterManager):
         _PIDS.add(pid)
         return pid
 
+    async def start_parked_worker(self):
+        proc = await super().start_parked_worker()
+        _PIDS.add(proc.pid)
+        return proc
+
     async def stop_process(self, pid):
         await super().stop_process(pid)
         _PIDS.discard(pid)
@@ -151,6 +156,15 @@ class ClusterWorkersHandler(BaseHandler):
         self.assert_token_matches(cluster_name)
         self.gateway.mark_worker_stopped(cluster_name, worker_name)
 
+    async def post(self, cluster_name, worker_name):
+        assert not worker_name
+        self.assert_token_matches(cluster_name)
+        for msg in self.json_data["added"]:
+            self.gateway.mark_worker_started(cluster_name, msg["name"])
+        for name in self.json_data["removed"]:
+            self.gateway.mark_worker_stopped(cluster_name, name)
+        self.write({"unknown": []})
+
 
 def gateway_test(func):
     async def inner(self, tmpdir):
@@ -181,6 +195,7 @@ def gateway_test(func):
                 await self.cleanup_cluster(
                     manager, cluster.info, cluster.state, worker_states
                 )
+            await manager.close()
             await manager.task_pool.close()
 
         # Only raise if test didn't fail earlier
@@ -321,6 +336,62 @@ class ClusterManagerTests(object):
         assert self.cluster_is_stopped(manager, cluster.info, cluster.state)
         gateway.mark_cluster_stopped(cluster.name)
 
+    @pytest.mark.asyncio
+    @gateway_test
+    async def test_start_stop_workers_bulk(self, gateway, manager):
+        if not manager.supports_bulk_start:
+            pytest.skip("Bulk start not supported")
+
+        # Create a new cluster
+        cluster = gateway.new_cluster()
+
+        # Start the cluster
+        async for state in manager.start_cluster(cluster.info):
+            cluster.state = state
+
+        # Wait for connection
+        await asyncio.wait_for(cluster._connect_future, manager.cluster_connect_timeout)
+        assert self.cluster_is_running(manager, cluster.info, cluster.state)
+
+        # Create and start new workers
+        workers = [gateway.new_worker(cluster.name) for _ in range(3)]
+        async for states in manager.start_workers(
+            [w.name for w in workers], cluster.info, cluster.state
+        ):
+            for name, state in states.items():
+                assert not isinstance(state, Exception)
+                cluster.workers[name].state = state
+
+        for worker in workers:
+            # Wait for worker to connect
+            await asyncio.wait_for(
+                worker._connect_future, manager.worker_connect_timeout
+            )
+            assert self.worker_is_running(
+                manager, cluster.info, cluster.state, worker.state
+            )
+
+        # Stop the workers
+        if manager.supports_bulk_stop:
+            errors = await manager.stop_workers(
+                {w.name: w.state for w in workers}, cluster.info, cluster.state
+            )
+            assert not errors
+        for worker in workers:
+            if not manager.supports_bulk_stop:
+                await manager.stop_worker(
+                    worker.name, worker.state, cluster.info, cluster.state
+                )
+            assert self.worker_is_stopped(
+                manager, cluster.info, cluster.state, worker.state
+            )
+            gateway.mark_worker_stopped(cluster.name, worker.name)
+
+        # Stop the cluster
+        await manager.stop_cluster(cluster.info, cluster.state)
+        assert self.cluster_is_stopped(manager, cluster.info, cluster.state)
+        gateway.mark_cluster_stopped(cluster.name)
+
     async def check_cancel_during_worker_startup(self, gateway, manager, fail_stage):
         # Create a new cluster
         cluster = gateway.new_cluster()